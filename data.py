@@ -5,11 +5,202 @@ import numpy     as _n
 import os        as _os
 import mcphysics as _mp
 import glob      as _glob
+import mmap      as _mmap
+import collections as _collections
+import concurrent.futures as _futures
+import json      as _json
+import calendar  as _calendar
+import sys       as _sys
+import threading as _threading
+import itertools as _itertools
 
 
 
 
-def load_chn(path=None, **kwargs):
+# Layout of the fixed 32-byte Maestro CHN header, decoded in one pass:
+# type, unit number, segment number, ascii seconds, real time (20 ms ticks),
+# live time (20 ms ticks), start date, start time, channel offset, channel count.
+_CHN_HEADER = _struct.Struct('<hhh2sii8s4shh')
+
+# The counts (little-endian uint32) start right after the header.
+_CHN_COUNTS_OFFSET = _CHN_HEADER.size
+
+def _decode_chn_start(start_date, start_time, ascii_seconds):
+    """
+    Converts the raw CHN start date, time, and seconds strings into the
+    start_time dictionary stored in the databox header.
+    """
+    # Get the date in a nice format
+    if "1" == start_date[7]: century = 20
+    else:                    century = 19
+    start_RFC2822 = "%s %s %02d%s %s:%s:%s" % (start_date[0:2], start_date[2:5], century, start_date[5:7], start_time[0:2], start_time[2:4], ascii_seconds)
+    s = _t.strptime(start_RFC2822,"%d %b %Y %H:%M:%S")
+    return dict(
+        year     = s.tm_year,
+        month    = s.tm_mon,
+        day      = s.tm_mday,
+        hour     = s.tm_hour,
+        minute   = s.tm_min,
+        second   = s.tm_sec,
+        year_day = s.tm_yday)
+
+def _decode_chn_header(buffer):
+    """
+    Decodes the fixed header at the start of the supplied CHN buffer (bytes,
+    mmap, or anything else supporting the buffer protocol), returning a
+    dictionary with start_time, real_time, live_time, channel_offset and
+    channel_count.
+    """
+    [type, unitnumber, segment_number, ascii_seconds,
+     real_time_20ms, live_time_20ms, start_date, start_time,
+     channel_offset, channel_count] = _CHN_HEADER.unpack_from(buffer, 0)
+
+    return dict(
+        start_time     = _decode_chn_start(start_date.decode(), start_time.decode(), ascii_seconds.decode()),
+        real_time      = 0.02*real_time_20ms,
+        live_time      = 0.02*live_time_20ms,
+        channel_offset = channel_offset,
+        channel_count  = channel_count)
+
+def _decode_chn_counts(buffer, channel_count):
+    """
+    Returns a (read-only, zero-copy) little-endian uint32 view of the counts
+    block in the supplied CHN buffer.
+    """
+    return _n.frombuffer(buffer, dtype='<u4', count=channel_count, offset=_CHN_COUNTS_OFFSET)
+
+def _chn_trailer_offset(channel_count):
+    """
+    Returns the byte offset of the trailer following the counts.
+    """
+    return _CHN_COUNTS_OFFSET+4*channel_count
+
+def _decode_chn_description(buffer, offset):
+    """
+    Returns the "Sample description" string from the trailer starting at the
+    specified byte offset of the supplied buffer.
+    """
+    # Get the size of the "Sample description" string
+    info_size = buffer[offset+320]
+
+    # Extract "Sample description" string
+    return bytes(buffer[offset+321:offset+321+info_size]).decode()
+
+class chn_map():
+    """
+    Read-only, memory-mapped view of a Maestro CHN file. Nothing beyond the
+    32-byte header is read until it is accessed, so slicing a few channel
+    ranges out of many large files only touches the pages that are needed.
+
+    The counts are available as a read-only numpy view self.counts (also
+    self[1] or self['Counts'], mimicking the databox from load_chn()), and
+    the header values via self.h(key) or self.headers. The trailer (sample
+    description) is only decoded when asked for.
+
+    Each map keeps the file open until self.close() is called (or the object
+    is garbage collected). It can also be used in a "with" statement.
+
+    Parameters
+    ----------
+    path
+        Path to the CHN file.
+
+    Optional keyword arguments (e.g., delimiter=',') are remembered and sent
+    to spinmob.data.databox() by self.to_databox().
+    """
+    def __init__(self, path, **kwargs):
+
+        self.path = path
+        self._databox_kwargs = kwargs
+
+        # Map the whole file (read-only)
+        with open(path, mode='rb') as fh: self._mmap = _mmap.mmap(fh.fileno(), 0, access=_mmap.ACCESS_READ)
+
+        # Lazy header info
+        self._header      = None
+        self._description = None
+
+        # Only the channel count is needed to set up the counts view
+        self.channel_count = _CHN_HEADER.unpack_from(self._mmap, 0)[-1]
+        self.counts = _decode_chn_counts(self._mmap, self.channel_count)
+
+    def __enter__(self): return self
+    def __exit__(self, *a): self.close()
+
+    def __len__(self): return 2
+
+    def __getitem__(self, n):
+        if   n in [0, 'Channel']: return _n.arange(self.channel_count)
+        elif n in [1, 'Counts']:  return self.counts
+        else: raise IndexError('chn_map only has columns 0 (Channel) and 1 (Counts).')
+
+    def __repr__(self):
+        return '<chn_map '+repr(self.path)+', '+str(self.channel_count)+' channels>'
+
+    @property
+    def description(self):
+        """
+        Sample description string, decoded from the trailer on first access.
+        """
+        if self._description is None: self._description = _decode_chn_description(self._mmap, _chn_trailer_offset(self.channel_count))
+        return self._description
+
+    @property
+    def headers(self):
+        """
+        Dictionary of all header values, matching the databox header from
+        load_chn(). Accessing this decodes the trailer.
+        """
+        h = dict(description=self.description)
+        h.update(self._get_header())
+        return h
+
+    def _get_header(self):
+        """
+        Decodes (once) and returns the header values that do not require
+        the trailer.
+        """
+        if self._header is None:
+            h = _decode_chn_header(self._mmap)
+            self._header = dict(
+                start_time = h['start_time'],
+                real_time  = h['real_time'],
+                live_time  = h['live_time'],
+                path       = self.path)
+        return self._header
+
+    def h(self, key):
+        """
+        Returns the specified header value (e.g. 'live_time'). Only the
+        'description' requires decoding the trailer.
+        """
+        if key == 'description': return self.description
+        return self._get_header()[key]
+
+    def close(self):
+        """
+        Releases the counts view and unmaps the file.
+        """
+        self.counts = None
+        try: self._mmap.close()
+
+        # Someone still holds a view of the counts. The map will be released
+        # when they let go of it.
+        except BufferError: pass
+
+    def to_databox(self, **kwargs):
+        """
+        Returns a (fully loaded) databox identical to that of load_chn().
+
+        Optional keyword arguments are sent to spinmob.data.databox(), along
+        with (and overriding) any supplied when creating this chn_map.
+        """
+        k = dict(self._databox_kwargs)
+        k.update(kwargs)
+        return _chn_databox(self.counts.astype(int), self.headers, **k)
+
+
+def load_chn(path=None, mmap=False, **kwargs):
     """
     Loads a Maestro CHN file at the specified path. Will return a databox with all
     the information.
@@ -19,69 +210,190 @@ def load_chn(path=None, **kwargs):
     path=None
         If None, a dialog will pop up. Otherwise specify a valid path (string).
 
+    mmap=False
+        If True, return a read-only, memory-mapped chn_map object instead of
+        a databox. Its counts are a numpy view backed by the file, and the
+        header / trailer are only decoded when accessed.
+
     Optional keyword arguments, e.g., delimeter=',', are sent to spinmob.data.databox()
+    (for mmap=True, when chn_map.to_databox() is called).
     """
     if path==None: path = _s.dialogs.load(filters="*.Chn")
     if path==None: return
 
-    # Create a databox
-    d = _s.data.databox(**kwargs)
+    # Memory-mapped mode
+    if mmap: return chn_map(path, **kwargs)
 
-    # Open the file
-    fh = open(path,mode="rb")
+    return _chn_databox(*_read_chn(path), **kwargs)
 
+def _read_chn(path):
+    """
+    Reads and decodes the CHN file at the specified path, returning an
+    integer array of counts and a dictionary of header values.
+    """
     # Read the buffer
-    buffer = fh.read()
-
-    # Unpack
-    [type, unitnumber, segment_number] = _struct.unpack("hhh",buffer[0:6])
-    ascii_seconds = buffer[6:8].decode()
-    [real_time_20ms, live_time_20ms] = _struct.unpack("ii",buffer[8:16])
-    start_date = buffer[16:24].decode()
-    start_time = buffer[24:28].decode()
-    [channel_offset, channel_count] = _struct.unpack("hh",buffer[28:32])
-
-    # Get the counts data
-    spectrum = _n.zeros(channel_count,dtype=int)
-    for i in range(channel_count): [spectrum[i]] = _struct.unpack("I",buffer[32+4*i:36+4*i])
+    with open(path,mode="rb") as fh: buffer = fh.read()
 
-    # Get the byte offset of the data
-    offset = 36+4*(channel_count-1)
+    # Unpack the header in one go
+    h = _decode_chn_header(buffer)
+    channel_count = h['channel_count']
 
-    # Get the size of the "Sample description" string
-    info_size = int.from_bytes( buffer[offset+320:offset+321], "big" )
+    # Get the counts data as a single typed view over the buffer
+    spectrum = _decode_chn_counts(buffer, channel_count)
 
-    # Extract "Sample description" string
-    info = buffer[offset+321:offset+321+info_size].decode()
+    return spectrum.astype(int), dict(
+        description = _decode_chn_description(buffer, _chn_trailer_offset(channel_count)),
+        start_time  = h['start_time'],
+        real_time   = h['real_time'],
+        live_time   = h['live_time'],
+        path        = path,)
 
-    d['Channel'] = range(channel_count)
-    d['Counts']  = spectrum
+def _read_chn_or_exception(path):
+    """
+    Returns _read_chn(path), or the exception raised trying. Used by the
+    worker pools, so that one bad file does not take down the others.
+    """
+    try:                   return _read_chn(path)
+    except Exception as e: return e
 
-    # Get the date in a nice format
-    if "1" == start_date[7]: century = 20
-    else:                    century = 19
-    start_RFC2822 = "%s %s %02d%s %s:%s:%s" % (start_date[0:2], start_date[2:5], century, start_date[5:7], start_time[0:2], start_time[2:4], ascii_seconds)
-    s = _t.strptime(start_RFC2822,"%d %b %Y %H:%M:%S")
-    start = dict(
-        year     = s.tm_year,
-        month    = s.tm_mon,
-        day      = s.tm_mday,
-        hour     = s.tm_hour,
-        minute   = s.tm_min,
-        second   = s.tm_sec,
-        year_day = s.tm_yday)
+def _chn_databox(counts, headers, **kwargs):
+    """
+    Assembles the load_chn() databox from the supplied counts and header
+    dictionary. Optional keyword arguments are sent to spinmob.data.databox().
+    """
+    d = _s.data.databox(**kwargs)
+    d['Channel'] = range(len(counts))
+    d['Counts']  = counts
 
     # Header info
-    d.path=path
-    d.h(description = info,
-        start_time  = start,
-        real_time   = 0.02*real_time_20ms,
-        live_time   = 0.02*live_time_20ms,
-        path        = path,)
+    d.path = headers['path']
+    d.h(**headers)
 
     return d
 
-def load_chns(paths=None, combine=False, **kwargs):
+def _imap(function, items, workers, processes=False):
+    """
+    Generator yielding (item, function(item)) for each of the supplied items,
+    in order, computed by a pool of worker threads (or processes if
+    processes=True). At most 2*workers items are in flight at once, so
+    memory stays bounded no matter how many items there are.
+    """
+    if processes: Pool = _futures.ProcessPoolExecutor
+    else:         Pool = _futures.ThreadPoolExecutor
+
+    with Pool(workers) as pool:
+        pending = _collections.deque()
+        items   = iter(items)
+
+        while True:
+
+            # Top up the queue of jobs
+            for item in items:
+                pending.append((item, pool.submit(function, item)))
+                if len(pending) >= 2*workers: break
+
+            if len(pending) == 0: return
+
+            # Hand back the oldest one
+            item, future = pending.popleft()
+            yield item, future.result()
+
+def _iload_chns(paths, workers=None, processes=False, mmap=False, **kwargs):
+    """
+    Generator yielding (path, result) for each of the supplied paths, in
+    order, where result is the output of load_chn(path) or the exception
+    raised while loading it.
+
+    If workers > 1, the files are read and decoded by a pool of threads
+    (or processes if processes=True). At most 2*workers files are in flight
+    at once, so memory stays bounded no matter how many paths there are.
+    """
+    # Serial (and memory-mapped, which has nothing to decode up front)
+    if mmap or not workers or workers <= 1:
+        for path in paths:
+            try:                   yield path, load_chn(path, mmap=mmap, **kwargs)
+            except Exception as e: yield path, e
+        return
+
+    for path, r in _imap(_read_chn_or_exception, paths, workers, processes):
+        if isinstance(r, Exception): yield path, r
+        else:                        yield path, _chn_databox(*r, **kwargs)
+
+def _start_time_key(start):
+    """
+    Returns a sortable tuple from a CHN start_time header dictionary.
+    """
+    return (start['year'], start['month'], start['day'], start['hour'], start['minute'], start['second'])
+
+class chn_accumulator():
+    """
+    Running sum of CHN spectra that uses constant memory: each added spectrum
+    (a databox from load_chn() or a chn_map) is summed into a single int64
+    counts array and can then be dropped.
+
+    Also sums the live and real times, and keeps track of the earliest and
+    latest start times (self.start_time_first and self.start_time_last).
+    self.headers holds the header of the first spectrum added, and
+    self.files counts how many have been added.
+    """
+    def __init__(self):
+
+        self.counts           = None
+        self.headers          = None
+        self.live_time        = 0
+        self.real_time        = 0
+        self.start_time_first = None
+        self.start_time_last  = None
+        self.files            = 0
+
+    def add(self, d):
+        """
+        Adds the counts and times of the supplied databox (or chn_map) d.
+        Returns self. Raises a ValueError (and adds nothing) if d does not have
+        the same number of channels as the spectra already added.
+        """
+        # First spectrum sets the shape and header
+        if self.counts is None:
+            self.counts  = _n.array(d[1], dtype=_n.int64)
+            self.headers = dict(d.headers)
+
+        elif len(d[1]) != len(self.counts):
+            raise ValueError('Cannot add '+str(len(d[1]))+' channels to '+str(len(self.counts))+' channels ('+str(d.h('path'))+').')
+
+        else: self.counts += d[1]
+
+        self.live_time += d.h('live_time')
+        self.real_time += d.h('real_time')
+
+        # Earliest and latest start times
+        start = d.h('start_time')
+        if self.start_time_first is None or _start_time_key(start) < _start_time_key(self.start_time_first): self.start_time_first = start
+        if self.start_time_last  is None or _start_time_key(start) > _start_time_key(self.start_time_last):  self.start_time_last  = start
+
+        self.files += 1
+        return self
+
+    def to_databox(self, **kwargs):
+        """
+        Returns a databox of the summed counts. The header is that of the
+        first spectrum, with the summed real_time and live_time, the
+        earliest start_time, and additional start_time_last and files entries.
+
+        Optional keyword arguments are sent to spinmob.data.databox()
+        """
+        if self.counts is None: return
+
+        h = dict(self.headers)
+        h.update(
+            start_time      = self.start_time_first,
+            start_time_last = self.start_time_last,
+            real_time       = self.real_time,
+            live_time       = self.live_time,
+            files           = self.files)
+
+        return _chn_databox(self.counts, h, **kwargs)
+
+def load_chns(paths=None, combine=False, workers=None, processes=False, errors=None, **kwargs):
     """
     Loads multiple chn files, returning a list of databoxes.
 
@@ -93,25 +405,67 @@ def load_chns(paths=None, combine=False, **kwargs):
 
     combine=False : bool
         If True, the counts from all files will be summed into a single databox, rather
-        than returning a list of databoxes. The header of the returned databox
-        will be the header of the first file in the list.
-
-    Optional keyword arguments (e.g., delimiter=',') are sent to load_chn()
+        than returning a list of databoxes. The files are added to a
+        chn_accumulator one at a time and dropped, so memory does not grow
+        with the number of files. The header of the returned databox will be
+        the header of the first file in the list, but with the summed
+        real_time and live_time, the earliest start_time, the latest
+        start_time_last, and the number of files.
+
+    workers=None : int
+        If larger than 1, decode the files in a pool of this many threads
+        (see processes). Results are returned in the same order as paths,
+        and at most 2*workers files are held in flight at a time.
+
+    processes=False : bool
+        If True, use a pool of processes rather than threads when workers > 1.
+        On Windows, this requires the calling script to be protected with
+        if __name__ == '__main__'.
+
+    errors=None : list
+        If None (and workers is not larger than 1), the first file that fails
+        to load raises its exception, as for load_chn(). If a list is supplied,
+        or the files are decoded in parallel, bad files are instead skipped
+        with an error printed, and (path, exception) pairs are appended to
+        errors (if supplied).
+
+    Optional keyword arguments (e.g., delimiter=',' or mmap=True) are sent to load_chn()
     """
     if paths==None: paths=_s.dialogs.load_multiple(filters='*.Chn')
     if paths==None: return
 
+    # Memory-mapped or not; the rest of kwargs go to the databoxes
+    mmap = kwargs.pop('mmap', False)
+
+    # Only skip bad files if asked to, or if we're decoding in parallel
+    skip = errors is not None or (workers is not None and workers > 1)
+
     ds = []
-    for path in paths: ds.append(load_chn(path, **kwargs))
+    a  = chn_accumulator()
+    for path, d in _iload_chns(paths, workers, processes, mmap, **kwargs):
+
+        # Add it to the running sum and let it go. A channel count mismatch
+        # is treated like any other bad file.
+        if combine and not isinstance(d, Exception):
+            m = d
+            try:                    a.add(m)
+            except ValueError as e: d = e
+            finally:
+                if isinstance(m, chn_map): m.close()
+
+        # Report and skip bad files
+        if isinstance(d, Exception):
+            if not skip: raise d
+            print('ERROR: Could not load '+str(path)+': '+repr(d))
+            if errors is not None: errors.append((path, d))
+
+        elif not combine: ds.append(d)
 
     # If we're not combining
     if not combine: return ds
 
     # Otherwise, make a master databox.
-    dm = ds.pop(0)
-    for d in ds: dm[1] += d[1]
-
-    return dm
+    return a.to_databox(**kwargs)
 
 def plot_chns(xscript='d[0]', yscript='d[1]', eyscript='sqrt(d[1])', marker='+', linestyle='', xlabel='Channel', ylabel='Counts', paths=None, combine=False, **kwargs):
     """
@@ -170,7 +524,7 @@ def load_chns_directory(path=None, **kwargs):
     path=None : str
         Optional directory. If None, a dialog will pop up to ask for a directory.
 
-    Additional keyword arguments are sent to load_chns()
+    Additional keyword arguments (e.g., workers=4) are sent to load_chns()
 
     Returns
     -------
@@ -207,6 +561,942 @@ def plot_chns_directory(path=None, **kwargs):
     return plot_chns(paths=paths, **kwargs)
 
 
+def scan_chn(path):
+    """
+    Reads only the header and sample description of a Maestro CHN file,
+    without touching the counts. Returns a dictionary with the same header
+    values as load_chn() (description, start_time, real_time, live_time,
+    path), plus channel_count.
+
+    Parameters
+    ----------
+    path
+        Path to the CHN file.
+    """
+    with open(path, mode='rb') as fh:
+
+        # Fixed header
+        h = _decode_chn_header(fh.read(_CHN_HEADER.size))
+
+        # Jump over the counts to the trailer
+        fh.seek(_chn_trailer_offset(h['channel_count']))
+        trailer = fh.read()
+
+    return dict(
+        description   = _decode_chn_description(trailer, 0),
+        start_time    = h['start_time'],
+        real_time     = h['real_time'],
+        live_time     = h['live_time'],
+        path          = path,
+        channel_count = h['channel_count'])
+
+class chn_index():
+    """
+    Header-only index of the *.Chn files in a directory, stored in a sidecar
+    file within that directory. Each entry is keyed by file name, and is
+    only re-read (with scan_chn()) when the file's size or modification
+    time changes, so repeat scans of large directories are cheap.
+
+    Once updated, query() answers questions like "all runs on 2026-09-12
+    with live_time > 300 s" from the index alone. If the directory is
+    read-only, the index is kept in memory only (see save()).
+
+    Parameters
+    ----------
+    path=None : str
+        Directory containing the Chn files. If None, a dialog will pop up.
+
+    filename='chn_index.json' : str
+        Name of the sidecar file within the directory.
+
+    update=True : bool
+        Whether to run self.update() immediately.
+    """
+    def __init__(self, path=None, filename='chn_index.json', update=True):
+
+        if path is None: path = _s.dialogs.select_directory('Select a directory containing Chn files!')
+        if path is None: return
+
+        self.path     = path
+        self.filename = filename
+        self.entries  = dict()
+        self._columns = None
+
+        # Load the previous index if there is one.
+        p = _os.path.join(path, filename)
+        if _os.path.exists(p):
+            try:
+                with open(p) as fh: self.entries = _json.load(fh)['entries']
+            except Exception as e:
+                print('ERROR: Could not read '+p+', rebuilding: '+repr(e))
+
+        if update: self.update()
+
+    def __len__(self): return len(self.entries)
+
+    def update(self):
+        """
+        Scans the directory, re-reading the headers of new or changed files,
+        dropping entries for removed files, and saving the index if anything
+        changed. Returns the number of files (re)scanned.
+        """
+        # Current state of the directory
+        stats = dict()
+        for e in _os.scandir(self.path):
+            if e.name.endswith('.Chn') and e.is_file():
+                s = e.stat()
+                stats[e.name] = (s.st_size, s.st_mtime_ns)
+
+        # Drop the removed files
+        removed = [k for k in self.entries if not k in stats]
+        for k in removed: self.entries.pop(k)
+
+        # Re-read anything new or changed
+        scanned = 0
+        for name in sorted(stats):
+            size, mtime_ns = stats[name]
+            e = self.entries.get(name)
+            if e is not None and e['size'] == size and e['mtime_ns'] == mtime_ns: continue
+
+            try: h = scan_chn(_os.path.join(self.path, name))
+            except Exception as x:
+                print('ERROR: Could not scan '+name+': '+repr(x))
+                self.entries.pop(name, None)
+                continue
+
+            h.pop('path')
+            h.update(size=size, mtime_ns=mtime_ns)
+            self.entries[name] = h
+            scanned += 1
+
+        # Save if anything changed
+        if scanned or len(removed):
+            self._columns = None
+            self.save()
+
+        return scanned
+
+    def save(self):
+        """
+        Writes the index to the sidecar file, returning True on success. If
+        the file cannot be written (e.g., a read-only directory), a warning is
+        printed and False is returned; the in-memory index is still usable.
+        """
+        p = _os.path.join(self.path, self.filename)
+
+        # Write to a temporary file and swap it in, so an interrupted save
+        # never leaves a broken index.
+        try:
+            with open(p+'.tmp', 'w') as fh: _json.dump(dict(entries=self.entries), fh)
+            _os.replace(p+'.tmp', p)
+
+        except OSError as e:
+            print('WARNING: Could not save '+p+'; keeping the index in memory only: '+repr(e))
+            try:    _os.remove(p+'.tmp')
+            except OSError: pass
+            return False
+
+        return True
+
+    def _get_columns(self):
+        """
+        Returns (and caches) numpy arrays of the indexed values for
+        vectorized queries.
+        """
+        if self._columns is None:
+            names = sorted(self.entries)
+            es    = [self.entries[k] for k in names]
+            self._columns = dict(
+                name        = _n.array(names, dtype=object),
+                date        = _n.array([_start_time_key(e['start_time'])[0:3] for e in es], dtype=int).reshape(len(es),3),
+                start       = _n.array([_t.mktime(_start_time_key(e['start_time'])+(0,0,-1)) for e in es]),
+                live_time   = _n.array([e['live_time'] for e in es]),
+                real_time   = _n.array([e['real_time'] for e in es]),
+                description = _n.array([e['description'] for e in es], dtype=object))
+        return self._columns
+
+    def query(self, date=None, after=None, before=None,
+              min_live_time=None, max_live_time=None,
+              min_real_time=None, max_real_time=None,
+              description=None):
+        """
+        Returns a sorted list of paths to the indexed files matching all the
+        specified criteria. This does not touch the Chn files.
+
+        Parameters
+        ----------
+        date=None : str
+            Start date of the run, e.g. '2026-09-12'.
+        after=None, before=None : str
+            Start time bounds, e.g. '2026-09-12 18:00:00' or '2026-09-12'.
+        min_live_time=None, max_live_time=None : float
+            Live time bounds (seconds).
+        min_real_time=None, max_real_time=None : float
+            Real time bounds (seconds).
+        description=None : str
+            Only match files whose sample description contains this string.
+        """
+        c = self._get_columns()
+        keep = _n.ones(len(c['name']), dtype=bool)
+
+        if date is not None:
+            keep &= (c['date'] == [int(x) for x in date.split('-')]).all(axis=1)
+        if after  is not None: keep &= c['start'] >= _parse_date_time(after)
+        if before is not None: keep &= c['start'] <  _parse_date_time(before)
+
+        if min_live_time is not None: keep &= c['live_time'] >= min_live_time
+        if max_live_time is not None: keep &= c['live_time'] <= max_live_time
+        if min_real_time is not None: keep &= c['real_time'] >= min_real_time
+        if max_real_time is not None: keep &= c['real_time'] <= max_real_time
+
+        if description is not None:
+            keep &= _n.array([description in x for x in c['description']], dtype=bool)
+
+        return [_os.path.join(self.path, k) for k in c['name'][keep]]
+
+def _parse_date_time(s):
+    """
+    Converts 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' to local epoch seconds.
+    """
+    if len(s.strip()) <= 10: return _t.mktime(_t.strptime(s.strip(), '%Y-%m-%d'))
+    else:                    return _t.mktime(_t.strptime(s.strip(), '%Y-%m-%d %H:%M:%S'))
+
+
+def _start_time_to_seconds(start):
+    """
+    Converts a CHN start_time header dictionary to integer seconds since the
+    epoch, treating the (naive) time as UTC so the round trip is exact.
+    """
+    return _calendar.timegm(_start_time_key(start)+(0,0,0))
+
+def _start_time_from_seconds(seconds):
+    """
+    Inverse of _start_time_to_seconds().
+    """
+    s = _t.gmtime(int(seconds))
+    return dict(
+        year     = s.tm_year,
+        month    = s.tm_mon,
+        day      = s.tm_mday,
+        hour     = s.tm_hour,
+        minute   = s.tm_min,
+        second   = s.tm_sec,
+        year_day = s.tm_yday)
+
+class chn_archive():
+    """
+    Columnar binary archive of many CHN spectra having the same number of
+    channels, stored in a directory:
+
+        archive.json      Format info and channel count.
+        counts.bin        One contiguous (rows, channels) array of little-endian uint32.
+        real_time.bin     One float64 per row.
+        live_time.bin     One float64 per row.
+        start_time.bin    One int64 per row (seconds since epoch, UTC).
+        description.txt   One line per row.
+        path.txt          One line per row (original file path).
+
+    Every file is only ever appended to, so adding new runs never rewrites
+    the archive. The counts are exposed as a read-only numpy memmap
+    (self.counts), so any row or channel range can be accessed without
+    reading the rest, and self[n] returns row n as a load_chn() databox.
+
+    Parameters
+    ----------
+    path : str
+        Archive directory. It is created if it does not exist.
+    """
+    _numeric_columns = dict(real_time='<f8', live_time='<f8', start_time='<i8')
+    _text_columns    = ['description', 'path']
+
+    def __init__(self, path):
+
+        self.path     = path
+        self.channels = None
+
+        # Text column lines read so far, and the byte offset reached in each file
+        self._text        = dict([(k, []) for k in self._text_columns])
+        self._text_offset = dict([(k, 0)  for k in self._text_columns])
+
+        if not _os.path.exists(path): _os.makedirs(path)
+
+        # Existing archive
+        p = self._file('archive.json')
+        if _os.path.exists(p):
+            with open(p) as fh: self.channels = _json.load(fh)['channels']
+
+        self._reload()
+
+    def _file(self, name):
+        return _os.path.join(self.path, name)
+
+    def _size(self, name):
+        p = self._file(name)
+        if _os.path.exists(p): return _os.path.getsize(p)
+        else:                  return 0
+
+    def _read_text(self, k):
+        """
+        Reads any new complete lines of text column k, picking up from where
+        the last read left off. The file is read in binary so that only '\n'
+        ends a row (a '\r' in a description or path does not).
+        """
+        p = self._file(k+'.txt')
+        size = self._size(k+'.txt')
+
+        # Shrunk or gone: start over
+        if size < self._text_offset[k]:
+            self._text[k]        = []
+            self._text_offset[k] = 0
+
+        if size == self._text_offset[k]: return
+
+        with open(p, 'rb') as fh:
+            fh.seek(self._text_offset[k])
+            b = fh.read()
+
+        # Only complete lines
+        n = b.rfind(b'\n')+1
+        if n:
+            self._text[k] += b[0:n].decode('utf-8').split('\n')[0:-1]
+            self._text_offset[k] += n
+
+    def _reload(self):
+        """
+        Re-maps the counts and reads any new rows of the (small) header columns.
+        """
+        # Text columns
+        for k in self._text_columns: self._read_text(k)
+
+        # Number of complete rows (an interrupted append may leave a partial
+        # row in some of the files; it is ignored and dropped on the next append).
+        if self.channels is None: rows = 0
+        else:
+            rows = [self._size('counts.bin')//(4*self.channels)]
+            for k in self._numeric_columns: rows.append(self._size(k+'.bin')//8)
+            for k in self._text_columns:    rows.append(len(self._text[k]))
+            rows = min(rows)
+        self.rows = rows
+
+        # Numeric columns and counts
+        self.columns = dict()
+        for k in self._text_columns: self.columns[k] = self._text[k][0:rows]
+        for k in self._numeric_columns:
+            if rows: self.columns[k] = _n.memmap(self._file(k+'.bin'), dtype=self._numeric_columns[k], mode='r', shape=(rows,))
+            else:    self.columns[k] = _n.zeros(0, dtype=self._numeric_columns[k])
+
+        if rows: self.counts = _n.memmap(self._file('counts.bin'), dtype='<u4', mode='r', shape=(rows, self.channels))
+        else:    self.counts = _n.zeros((0, self.channels or 0), dtype='<u4')
+
+    def __len__(self): return self.rows
+
+    def __getitem__(self, n):
+        """
+        Returns row n as a databox, exactly as load_chn() would.
+        """
+        if n < 0: n += self.rows
+        if n < 0 or n >= self.rows: raise IndexError('Row '+str(n)+' is not in the archive ('+str(self.rows)+' rows).')
+        return _chn_databox(self.counts[n].astype(int), self.headers(n))
+
+    def headers(self, n):
+        """
+        Returns the load_chn() header dictionary for row n.
+        """
+        return dict(
+            description = self.columns['description'][n],
+            start_time  = _start_time_from_seconds(self.columns['start_time'][n]),
+            real_time   = float(self.columns['real_time'][n]),
+            live_time   = float(self.columns['live_time'][n]),
+            path        = self.columns['path'][n])
+
+    def append(self, ds, workers=None):
+        """
+        Appends spectra to the end of the archive without rewriting it.
+
+        Parameters
+        ----------
+        ds
+            Databoxes from load_chn() or chn_map objects, or paths to CHN
+            files, which will be streamed in one at a time. Any iterable
+            (e.g., a generator) is fine.
+        workers=None
+            Number of workers used to decode paths (see load_chns()).
+
+        Returns
+        -------
+        self
+        """
+        # Paths to load, or data already in hand (peeking at the first one).
+        ds    = iter(ds)
+        first = next(ds, None)
+        if first is None: return self
+        ds = _itertools.chain([first], ds)
+
+        if isinstance(first, str): ds = _iload_chns(ds, workers)
+        else:                      ds = ((None, d) for d in ds)
+
+        # Drop any partial rows from an interrupted append.
+        self._truncate()
+
+        fc = None
+        fn = dict()
+        ft = dict()
+        try:
+            for path, d in ds:
+
+                if isinstance(d, Exception):
+                    print('ERROR: Could not load '+str(path)+': '+repr(d))
+                    continue
+
+                # First spectrum in a new archive sets the channel count
+                if self.channels is None:
+                    self.channels = len(d[1])
+                    with open(self._file('archive.json'), 'w') as fh:
+                        _json.dump(dict(format='mcphysics.data.chn_archive', version=1, channels=self.channels), fh)
+
+                if len(d[1]) != self.channels:
+                    print('ERROR: Skipping '+str(d.h('path'))+', which has '+str(len(d[1]))+' channels, not '+str(self.channels)+'.')
+                    continue
+
+                # Open the files on the first one
+                if fc is None:
+                    fc = open(self._file('counts.bin'), 'ab')
+                    for k in self._numeric_columns: fn[k] = open(self._file(k+'.bin'), 'ab')
+                    for k in self._text_columns:    ft[k] = open(self._file(k+'.txt'), 'a', encoding='utf-8', newline='\n')
+
+                # Counts first, so the text columns (which decide the row count) come last
+                fc.write(_n.asarray(d[1], dtype='<u4').tobytes())
+                fn['real_time'] .write(_n.array(d.h('real_time'), dtype='<f8').tobytes())
+                fn['live_time'] .write(_n.array(d.h('live_time'), dtype='<f8').tobytes())
+                fn['start_time'].write(_n.array(_start_time_to_seconds(d.h('start_time')), dtype='<i8').tobytes())
+                ft['description'].write(d.h('description').replace('\n',' ')+'\n')
+                ft['path']       .write(str(d.h('path')).replace('\n',' ')+'\n')
+
+                if isinstance(d, chn_map): d.close()
+
+        finally:
+            if fc is not None:
+                fc.close()
+                for f in list(fn.values())+list(ft.values()): f.close()
+
+        self._reload()
+        return self
+
+    def _truncate(self):
+        """
+        Trims every file to the current number of complete rows.
+        """
+        if self.channels is None: return
+
+        # Release our maps before touching the files
+        self.counts = None
+        self.columns = dict()
+
+        n = self.rows
+        with open(self._file('counts.bin'), 'ab') as fh: fh.truncate(4*self.channels*n)
+        for k in self._numeric_columns:
+            with open(self._file(k+'.bin'), 'ab') as fh: fh.truncate(8*n)
+        for k in self._text_columns:
+
+            # Extra rows, or a partial line at the end
+            if len(self._text[k]) > n or self._size(k+'.txt') > self._text_offset[k]:
+                b = ''.join([x+'\n' for x in self._text[k][0:n]]).encode('utf-8')
+                with open(self._file(k+'.txt'), 'wb') as fh: fh.write(b)
+                self._text[k]        = self._text[k][0:n]
+                self._text_offset[k] = len(b)
+
+        self._reload()
+
+
+class chn_watcher():
+    """
+    Incrementally ingests a directory of *.Chn files that is still growing,
+    e.g., while an MCA writes a new file every few minutes during a long run.
+
+    Each call to self.update() polls the directory (plain modification times;
+    no OS-specific file notification) and decodes only the new files,
+    adding them to a running combined spectrum (self.accumulator, a
+    chn_accumulator) and a rate-versus-time series (see self.rates()). The
+    decoding cost of a refresh is therefore proportional to the number of
+    new files. If an already-ingested file changes or disappears, only its
+    old contribution is subtracted (and the new one added once it settles),
+    so a copy of each file's counts is kept (self.contributions).
+
+    Files whose channel count does not match the others are skipped, with
+    the exception recorded in self.errors (keyed by file name) until the
+    file changes.
+
+    Parameters
+    ----------
+    path=None : str
+        Directory to watch. If None, a dialog will pop up.
+
+    roi=None : list
+        Optional [n1, n2] channel range (n2 excluded) for the counts in the
+        rate series. None means all channels.
+
+    settle=1.0 : float
+        Files modified less than this many seconds ago are left for the next
+        update, since they may still be being written.
+
+    update=True : bool
+        Whether to run self.update() immediately.
+    """
+    def __init__(self, path=None, roi=None, settle=1.0, update=True):
+
+        if path is None: path = _s.dialogs.select_directory('Select a directory containing Chn files!')
+        if path is None: return
+
+        self.path   = path
+        self.roi    = roi
+        self.settle = settle
+
+        self._reset()
+        if update: self.update()
+
+    def _reset(self):
+        """
+        Forgets everything ingested so far.
+        """
+        self.accumulator   = chn_accumulator()
+        self.files         = dict()
+        self.contributions = dict()
+        self.errors        = dict()
+        self._series       = dict(path=[], start=[], real_time=[], live_time=[], counts=[])
+
+    def _remove(self, name):
+        """
+        Subtracts the contribution of the named file from the running sum and
+        rate series, and forgets it.
+        """
+        self.files.pop(name)
+        self.errors.pop(name, None)
+        c = self.contributions.pop(name, None)
+        if c is None: return
+
+        # Rate series
+        i = self._series['path'].index(c['path'])
+        for k in self._series: self._series[k].pop(i)
+
+        # Nothing left
+        a = self.accumulator
+        if len(self.contributions) == 0:
+            self.accumulator = chn_accumulator()
+            return
+
+        a.counts   -= c['counts']
+        a.files    -= 1
+        a.live_time = sum(self._series['live_time'])
+        a.real_time = sum(self._series['real_time'])
+        a.start_time_first = _start_time_from_seconds(min(self._series['start']))
+        a.start_time_last  = _start_time_from_seconds(max(self._series['start']))
+
+        # Header came from the removed file
+        if a.headers.get('path') == c['path']:
+            a.headers = dict(next(iter(self.contributions.values()))['headers'])
+
+    def update(self):
+        """
+        Ingests any new (or changed) Chn files, returning how many were added.
+        """
+        now = _t.time()
+
+        # Poll the directory
+        stats = dict()
+        for e in _os.scandir(self.path):
+            if e.name.endswith('.Chn') and e.is_file():
+                s = e.stat()
+                stats[e.name] = (s.st_size, s.st_mtime_ns)
+
+        # Take back anything we already have that changed or disappeared;
+        # changed files are then re-read below like new ones.
+        for name in list(self.files):
+            if stats.get(name) != self.files[name]:
+                print('NOTE: '+name+' changed or was removed; updating.')
+                self._remove(name)
+
+        # Decode only the new ones
+        added = 0
+        for name in sorted(stats):
+            if name in self.files: continue
+
+            # Might still be being written
+            if now - stats[name][1]*1e-9 < self.settle: continue
+
+            path = _os.path.join(self.path, name)
+            try: m = chn_map(path)
+
+            # Try again next time
+            except Exception as x:
+                print('ERROR: Could not load '+path+': '+repr(x))
+                continue
+
+            with m:
+
+                # Wrong number of channels: note it and leave it until it changes
+                try: self.accumulator.add(m)
+                except ValueError as x:
+                    print('ERROR: Skipping '+path+': '+str(x))
+                    self.errors[name] = x
+                    self.files[name]  = stats[name]
+                    continue
+
+                self.contributions[name] = dict(path=path, counts=_n.array(m.counts), headers=dict(m.headers))
+
+                if self.roi is None: counts = int(m.counts.sum(dtype=_n.int64))
+                else:                counts = int(m.counts[self.roi[0]:self.roi[1]].sum(dtype=_n.int64))
+
+                self._series['path']     .append(path)
+                self._series['start']    .append(_start_time_to_seconds(m.h('start_time')))
+                self._series['real_time'].append(m.h('real_time'))
+                self._series['live_time'].append(m.h('live_time'))
+                self._series['counts']   .append(counts)
+
+            self.files[name] = stats[name]
+            added += 1
+
+        return added
+
+    def watch(self, interval=5.0, iterations=None, callback=None):
+        """
+        Calls self.update() every interval seconds, and callback(self) after
+        each update that found new files. Runs forever if iterations is None
+        (stop with ctrl-c).
+        """
+        n = 0
+        while iterations is None or n < iterations:
+            if self.update() and callback: callback(self)
+            n += 1
+            if iterations is None or n < iterations: _t.sleep(interval)
+
+    def combined(self, **kwargs):
+        """
+        Returns a databox of the combined spectrum so far (see
+        chn_accumulator.to_databox()). Optional keyword arguments are sent to
+        spinmob.data.databox()
+        """
+        return self.accumulator.to_databox(**kwargs)
+
+    def rates(self):
+        """
+        Returns a databox of the rate versus time series, sorted by start
+        time, with columns 't' (start time in seconds relative to the first
+        file), 'live_time', 'counts', 'rate' (counts per live second) and
+        'rate_error' (Poisson).
+        """
+        d = _s.data.databox()
+        if len(self._series['start']) == 0: return d
+
+        i = _n.argsort(self._series['start'], kind='stable')
+        start = _n.array(self._series['start'])[i]
+        live  = _n.array(self._series['live_time'])[i]
+        N     = _n.array(self._series['counts'])[i]
+
+        d['t']          = start - start[0]
+        d['live_time']  = live
+        d['counts']     = N
+        d['rate']       = N/live
+        d['rate_error'] = N**0.5/live
+        d.h(start_time = _start_time_from_seconds(start[0]),
+            roi        = self.roi,
+            paths      = [self._series['path'][n] for n in i])
+        return d
+
+
+def stack_chns(ds):
+    """
+    Stacks a list of spectra (databoxes from load_chns() or chn_map objects)
+    into a single 2D counts array, returning (counts, live_time, real_time),
+    where live_time and real_time are 1D arrays with one value per spectrum.
+    """
+    counts = _n.empty((len(ds), len(ds[0][1])), dtype=_n.int64) if len(ds) else _n.zeros((0,0), dtype=_n.int64)
+    for n in range(len(ds)): counts[n] = ds[n][1]
+    live_time = _n.array([d.h('live_time') for d in ds])
+    real_time = _n.array([d.h('real_time') for d in ds])
+    return counts, live_time, real_time
+
+def _calibration_to_position(energies, coefficients, C):
+    """
+    Inverts the (increasing) polynomial calibrations E = c0 + c1*n + ...,
+    one per row of coefficients, returning for every spectrum the fractional
+    position of each of the supplied energies along the channel edges
+    (0 at the bottom of channel 0, C at the top of channel C-1, clipped).
+    """
+    c = _n.asarray(coefficients, dtype=float)
+    e = _n.asarray(energies,     dtype=float)[None,:]
+
+    def polyval(n, c):
+        y = _n.zeros(n.shape) + c[:,-1:]
+        for k in range(c.shape[1]-2, -1, -1): y = y*n + c[:,k:k+1]
+        return y
+
+    # Linear is exact
+    if c.shape[1] <= 2: n = (e - c[:,0:1]) / c[:,1:2]
+
+    # Otherwise, Newton's method starting from the straight line through the ends
+    else:
+        ends = polyval(_n.array([[-0.5, C-0.5]]), c)
+        n = -0.5 + C*(e - ends[:,0:1])/(ends[:,1:2] - ends[:,0:1])
+        n = _n.clip(n, -0.5, C-0.5)
+        dc = c[:,1:]*_n.arange(1, c.shape[1])
+        for iteration in range(50):
+            step = (polyval(n, c) - e) / polyval(n, dc)
+            n -= step
+            _n.clip(n, -0.5, C-0.5, out=n)
+            if _n.abs(step).max() < 1e-9: break
+
+    return _n.clip(n+0.5, 0, C)
+
+def calibrate_spectra(counts, live_time=None, coefficients=None, edges=None, rebin=1, dtype=_n.float64, chunk=None, out=None):
+    """
+    Applies energy calibration, live-time normalization and rebinning to a
+    whole stack of spectra in vectorized passes (a chunk of spectra at a
+    time, so there is no per-spectrum Python overhead and the temporary
+    memory stays bounded). Poisson uncertainties are propagated.
+
+    Parameters
+    ----------
+    counts
+        2D array of counts, one spectrum per row, e.g., from stack_chns()
+        or chn_archive.counts. A list of databoxes / chn_maps is also
+        accepted, in which case live_time defaults to their headers.
+
+    live_time=None
+        Optional 1D array of live times, one per spectrum. If supplied, the
+        results are count rates (counts per live second).
+
+    coefficients=None
+        Optional polynomial energy calibration E = c0 + c1*n + c2*n**2 + ...,
+        where n is the channel number (channel n spans n-0.5 to n+0.5).
+        Either a 1D array [c0, c1, ...] shared by all spectra, or a 2D array
+        with one row of coefficients per spectrum. The calibration must be
+        increasing over the spectrum.
+
+    edges=None
+        Optional 1D array of common energy bin edges. Requires coefficients.
+        Each spectrum's counts are redistributed onto these bins, assuming
+        they are uniformly spread within each channel. If None, the channels
+        are kept (see rebin).
+
+    rebin=1
+        When edges is None, sum this many neighboring channels per bin. Any
+        leftover channels at the end are dropped.
+
+    dtype=numpy.float64
+        Data type of the returned arrays.
+
+    chunk=None
+        Number of spectra processed per vectorized pass. None chooses a
+        chunk of about 130 thousand channels, which keeps the temporary
+        arrays small enough to stay in the CPU cache.
+
+    out=None
+        Optional (y, ey) arrays (e.g., numpy memmaps for very large stacks)
+        to be filled with the results.
+
+    Returns
+    -------
+    x, y, ey
+        x holds the bin centers: channel numbers, or energies if calibrated.
+        It is 2D (one row per spectrum) only if each spectrum has its own
+        calibration and edges is None. y and ey are 2D arrays of the
+        (normalized) counts and their Poisson uncertainties.
+    """
+    # Stack databoxes
+    if type(counts) in [list, tuple]:
+        if live_time is None: counts, live_time = stack_chns(counts)[0:2]
+        else:                 counts = stack_chns(counts)[0]
+
+    N, C = _n.shape(counts)
+    if live_time    is not None: live_time    = _n.broadcast_to(_n.asarray(live_time, dtype=float), (N,))
+    if coefficients is not None: coefficients = _n.asarray(coefficients, dtype=float)
+    if edges is not None:
+        if coefficients is None: raise Exception('Rebinning to energy edges requires calibration coefficients.')
+        edges = _n.asarray(edges, dtype=float)
+
+    # Output bins
+    if edges is None:
+        rebin = int(rebin)
+        M = C//rebin
+        x = _n.arange(M)*rebin + 0.5*(rebin-1)
+        if coefficients is not None: x = _n.polynomial.polynomial.polyval(x, coefficients.T)
+    else:
+        M = len(edges)-1
+        x = 0.5*(edges[1:]+edges[:-1])
+
+    # Outputs
+    if out is None: y, ey = _n.empty((N,M), dtype=dtype), _n.empty((N,M), dtype=dtype)
+    else:           y, ey = out
+
+    if chunk is None: chunk = max(1, 2**17//max(C,1))
+
+    for n1 in range(0, N, chunk):
+        n2 = min(n1+chunk, N)
+        c  = counts[n1:n2]
+        K  = n2-n1
+
+        # Just rebinning channels
+        if edges is None:
+            b = c[:, 0:M*rebin].reshape(K, M, rebin).sum(axis=2, dtype=float)
+            v = b
+
+        # Redistributing onto common energy bins
+        else:
+
+            # Fractional channel position of every target edge, for all
+            # spectra in the chunk at once.
+            if coefficients.ndim == 1: k = _n.broadcast_to(coefficients, (K, len(coefficients)))
+            else:                      k = coefficients[n1:n2]
+            position = _calibration_to_position(edges, k, C)
+
+            # Channel index and the fraction of that channel below each edge
+            i = _n.minimum(position.astype(int), C-1)
+            p = position - i
+
+            # Same, as indices into the flattened chunk, and the counts there
+            c    = _n.ravel(c)
+            flat = (i + C*_n.arange(K)[:,None]).ravel()
+            n    = c[flat].reshape(K, M+1)
+
+            # Sums over the channels from each edge's channel up to (not
+            # including) the next edge's channel, in one pass over the chunk.
+            # reduceat() returns the single channel when both edges share a
+            # channel, so those are zeroed.
+            same = i[:,:-1] == i[:,1:]
+            S = _n.add.reduceat(c, flat, dtype=float).reshape(K, M+1)[:,:-1]
+            S[same] = 0
+
+            # Counts in each bin, including the partial channels at the edges.
+            pn = p*n
+            b  = S + pn[:,1:] - pn[:,:-1]
+
+            # Poisson variance: a fraction f of a channel's n counts contributes
+            # f**2 * n rather than f * n.
+            f = p[:,1:] - p[:,:-1]
+            q = pn*(1-p)
+            v = b - _n.where(same, f*(1-f)*n[:,:-1], q[:,:-1] + q[:,1:])
+            _n.maximum(v, 0, out=v)
+
+        # Normalize and store
+        if live_time is None:
+            y [n1:n2] = b
+            ey[n1:n2] = _n.sqrt(v)
+        else:
+            t = live_time[n1:n2,None]
+            y [n1:n2] = b/t
+            ey[n1:n2] = _n.sqrt(v)/t
+
+    return x, y, ey
+
+
+class roi_integrator():
+    """
+    Integrates regions of interest (ROIs) over a whole stack of spectra.
+    The running sums of every spectrum are computed once, after which any
+    ROI integral costs two lookups per spectrum, regardless of its width,
+    and all spectra and ROIs are handled in single vectorized operations.
+
+    ROIs are specified as [n1, n2] channel ranges, including n1 and
+    excluding n2 (like python slices), e.g. [[100,120], [340,400]].
+
+    Parameters
+    ----------
+    counts
+        2D array of counts, one spectrum per row (e.g., from stack_chns() or
+        chn_archive.counts), or a list of databoxes / chn_maps, in which
+        case live_time defaults to their headers.
+
+    live_time=None
+        Optional 1D array of live times (one per spectrum), used when
+        normalize=True.
+    """
+    def __init__(self, counts, live_time=None):
+
+        if type(counts) in [list, tuple]:
+            if live_time is None: counts, live_time = stack_chns(counts)[0:2]
+            else:                 counts = stack_chns(counts)[0]
+
+        N, C = _n.shape(counts)
+
+        # Running sums, with a leading column of zeros
+        self.cumsum = _n.zeros((N, C+1), dtype=_n.int64)
+        _n.cumsum(counts, axis=1, dtype=_n.int64, out=self.cumsum[:,1:])
+
+        if live_time is None: self.live_time = None
+        else:                 self.live_time = _n.broadcast_to(_n.asarray(live_time, dtype=float), (N,))
+
+    def __len__(self): return len(self.cumsum)
+
+    def _sums(self, rois):
+        """
+        Returns the (N, R) integer sums and (R,) widths of the supplied ROIs.
+        """
+        rois = _n.asarray(rois, dtype=int).reshape(-1, 2)
+        return self.cumsum[:, rois[:,1]] - self.cumsum[:, rois[:,0]], rois[:,1]-rois[:,0]
+
+    def _normalize(self, y, ey, normalize):
+        if not normalize: return y, ey
+        if self.live_time is None: raise Exception('Normalizing requires live_time.')
+        return y/self.live_time[:,None], ey/self.live_time[:,None]
+
+    def integrate(self, rois, normalize=False):
+        """
+        Returns the (N, R) arrays of counts in each ROI for each spectrum,
+        and their Poisson uncertainties.
+
+        Parameters
+        ----------
+        rois
+            List of [n1, n2] channel ranges.
+
+        normalize=False
+            If True, divide by each spectrum's live time (giving rates).
+        """
+        y = self._sums(rois)[0]
+        return self._normalize(y, _n.sqrt(y), normalize)
+
+    def net_area(self, peaks, backgrounds, normalize=False):
+        """
+        Returns the (N, R) arrays of background-subtracted peak areas and
+        their Poisson uncertainties. The background under each peak is the
+        average counts per channel in its background windows, times the
+        width of the peak.
+
+        Parameters
+        ----------
+        peaks
+            List of [n1, n2] peak windows.
+
+        backgrounds
+            List with one entry per peak: a list of [n1, n2] background
+            windows (e.g., sidebands on either side), or a single window.
+
+        normalize=False
+            If True, divide by each spectrum's live time (giving rates).
+        """
+        # Flatten the background windows, remembering where each peak's start
+        windows = []
+        starts  = []
+        for b in backgrounds:
+            b = _n.asarray(b, dtype=int).reshape(-1, 2)
+            starts.append(len(windows))
+            windows.extend(b.tolist())
+
+        P, wp = self._sums(peaks)
+        B, wb = self._sums(windows)
+
+        # Total background counts and widths for each peak
+        B  = _n.add.reduceat(B,  starts, axis=1)
+        wb = _n.add.reduceat(wb, starts)
+
+        # Scale to the peak width
+        r = wp/wb
+        y  = P - r*B
+        ey = _n.sqrt(P + r**2*B)
+
+        return self._normalize(y, ey, normalize)
+
+
 def convert_chn_to_csv(chn_paths=None, output_dir=None):
     """
     Opens the supplied Maestro Chn files and saves them as csv
@@ -240,6 +1530,156 @@ def convert_chn_to_csv(chn_paths=None, output_dir=None):
 
     return ds
 
+def _convert_chn(path, output_path, binary=None):
+    """
+    Converts a single CHN file, returning output_path, or the exception
+    raised trying. Runs in the convert_chns() workers.
+    """
+    try:
+        d = load_chn(path, delimiter=',')
+        if binary: d.h(SPINMOB_BINARY=binary)
+        d.save_file(output_path, force_overwrite=True)
+        return output_path
+
+    except Exception as e: return e
+
+def convert_chns(paths, output_dir=None, binary=None, workers=None, processes=True, force=False, errors=None):
+    """
+    Headless, parallel version of convert_chn_to_csv(). Converts Maestro Chn
+    files to csv (or spinmob binary) databox files, skipping any that are
+    already up to date.
+
+    This can also be run from the command line, e.g.,
+
+        python -m mcphysics.data /path/to/chns -o /path/to/output -j 8
+
+    (run with -h for the options).
+
+    Parameters
+    ----------
+    paths : str or list
+        A directory (searched recursively for *.Chn files), or a list of
+        paths to Chn files and / or directories.
+
+    output_dir=None : str
+        Output directory. Directory trees are mirrored inside this directory,
+        and individually listed files are placed at its top level. If None,
+        each output file is written next to its Chn file. If two different
+        Chn files would be written to the same output file (e.g., listed
+        files with the same name from different directories), a ValueError
+        is raised before anything is converted.
+
+    binary=None : str
+        If None, save csv text files (*.csv). Otherwise, save spinmob binary
+        databox files (*.dat) with this numpy dtype, e.g. 'int64', using the
+        SPINMOB_BINARY header mechanism.
+
+    workers=None : int
+        Number of parallel workers. None means one per CPU.
+
+    processes=True : bool
+        Whether the workers are processes (True) or threads (False).
+
+    force=False : bool
+        If True, convert files even if the output is newer than the Chn file.
+
+    errors=None : list
+        Files that fail to convert are reported and skipped. If a list is
+        supplied, (path, exception) pairs are also appended to it.
+
+    Returns
+    -------
+    List of the output paths written (not including skipped files).
+    """
+    if type(paths) is str: paths = [paths]
+    if workers is None: workers = _os.cpu_count() or 1
+
+    if binary: extension = '.dat'
+    else:      extension = '.csv'
+
+    # Assemble the list of (input, output) jobs
+    jobs = []
+    for path in paths:
+
+        # Directory tree
+        if _os.path.isdir(path):
+            for root, dirs, files in _os.walk(path):
+                dirs.sort()
+                for f in sorted(files):
+                    if not f.endswith('.Chn'): continue
+                    if output_dir is None: o = root
+                    else:                  o = _os.path.join(output_dir, _os.path.relpath(root, path))
+                    jobs.append((_os.path.join(root, f), _os.path.join(o, f[:-4]+extension)))
+
+        # Single file
+        else:
+            if output_dir is None: o = _os.path.dirname(path)
+            else:                  o = output_dir
+            jobs.append((path, _os.path.join(o, _os.path.splitext(_os.path.basename(path))[0]+extension)))
+
+    # Drop repeats, and make sure no two inputs share an output
+    sources = dict()
+    unique  = []
+    for j in jobs:
+        o = _os.path.normcase(_os.path.abspath(j[1]))
+        i = _os.path.normcase(_os.path.abspath(j[0]))
+        if o in sources:
+            if sources[o] == i: continue
+            raise ValueError('convert_chns(): '+sources[o]+' and '+j[0]+' would both be written to '+j[1]+'.')
+        sources[o] = i
+        unique.append(j)
+    jobs = unique
+
+    # Skip the ones that are up to date
+    if not force:
+        jobs = [j for j in jobs if not _os.path.exists(j[1]) or _os.path.getmtime(j[1]) < _os.path.getmtime(j[0])]
+
+    # Make sure the output directories exist
+    for d in set([_os.path.dirname(j[1]) for j in jobs]):
+        if d and not _os.path.exists(d): _os.makedirs(d)
+
+    # Convert. Process workers need their own random state, since
+    # spinmob uses it to name its temporary files.
+    if workers <= 1: pool = None
+    elif processes:  pool = _futures.ProcessPoolExecutor(workers, initializer=_n.random.seed)
+    else:            pool = _futures.ThreadPoolExecutor(workers)
+
+    if pool is None: results = [_convert_chn(j[0], j[1], binary) for j in jobs]
+    else:
+        with pool: results = list(pool.map(_convert_chn, [j[0] for j in jobs], [j[1] for j in jobs], [binary]*len(jobs), chunksize=8))
+
+    # Collect the results
+    outputs = []
+    for j, r in zip(jobs, results):
+        if isinstance(r, Exception):
+            print('ERROR: Could not convert '+j[0]+': '+repr(r))
+            if errors is not None: errors.append((j[0], r))
+        else: outputs.append(r)
+
+    return outputs
+
+def _main(argv=None):
+    """
+    Command-line entry point: python -m mcphysics.data [options] paths
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='python -m mcphysics.data',
+        description='Converts Maestro Chn files (or directory trees of them) to csv or spinmob binary databox files.')
+    parser.add_argument('paths', nargs='+', help='Chn files and / or directories to search recursively.')
+    parser.add_argument('-o', '--output-dir', default=None, help='Output directory (default: next to each Chn file).')
+    parser.add_argument('-b', '--binary', default=None, metavar='DTYPE', help='Save spinmob binary files with this dtype (e.g. int64) instead of csv.')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Number of parallel workers (default: one per CPU).')
+    parser.add_argument('-f', '--force', action='store_true', help='Convert even if the output is up to date.')
+    a = parser.parse_args(argv)
+
+    t0 = _t.time()
+    errors = []
+    outputs = convert_chns(a.paths, a.output_dir, a.binary, a.workers, force=a.force, errors=errors)
+    print('Converted %d files (%d errors) in %.1f s.' % (len(outputs), len(errors), _t.time()-t0))
+
+    return 1 if len(errors) else 0
+
 
 # Only import this if imageio is installed
 def load_image(path=None):
@@ -283,3 +1723,370 @@ def load_images(paths=None):
     return arrays
 
 
+def load_image_stack(paths=None, workers=None, scratch=None):
+    """
+    Loads multiple images of the same size and type into a single,
+    preallocated array with shape (N, H, W, C) (or (N, H, W) for grayscale),
+    decoding them in parallel threads directly into their slots. This
+    avoids holding a list of separate frames and copying them all again
+    with numpy.array().
+
+    Parameters
+    ----------
+    paths=None
+        If None, a dialog will pop up. Otherwise, specify a *list* of valid
+        paths to images.
+
+    workers=None : int
+        Number of decoding threads. None means one per CPU.
+
+    scratch=None : str
+        Optional path to a scratch .npy file. If specified, the stack is
+        a numpy memmap backed by this file (which can later be re-opened with
+        numpy.load(scratch, mmap_mode='r')), rather than living in memory.
+    """
+    if not _mp._imageio: raise Exception('You need to install imageio for this function.')
+
+    if paths == None: paths = _s.dialogs.load_multiple()
+    if paths == None: return
+
+    if workers is None: workers = _os.cpu_count() or 1
+
+    # The first frame sets the shape and dtype
+    first = load_image(paths[0])
+    shape = (len(paths),) + first.shape
+
+    if scratch is None: stack = _n.empty(shape, dtype=first.dtype)
+    else:               stack = _n.lib.format.open_memmap(scratch, mode='w+', dtype=first.dtype, shape=shape)
+    stack[0] = first
+    del first
+
+    def decode(n):
+        a = load_image(paths[n])
+        if a.shape != shape[1:]: raise Exception(paths[n]+' has shape '+str(a.shape)+', not '+str(shape[1:])+'.')
+        stack[n] = a
+
+    if workers <= 1:
+        for n in range(1, len(paths)): decode(n)
+    else:
+        with _futures.ThreadPoolExecutor(workers) as pool:
+            for f in [pool.submit(decode, n) for n in range(1, len(paths))]: f.result()
+
+    return stack
+
+class image_sequence():
+    """
+    Lazy, indexable sequence of images (a list of image files or a video
+    file) for scrubbing through data sets too large to load. Frames are
+    only decoded when accessed, kept in a size-bounded least-recently-used
+    cache, and the next few frames are decoded in background threads.
+
+    Supports len(), integer indexing (e.g. s[-1]), slicing (returning a
+    stacked array, e.g. s[10:20]) and iteration. The returned frames are
+    shared with the cache, so they are read-only; copy them before modifying.
+
+    Call self.close() when finished (or use it in a "with" statement) to stop
+    the background threads and close the video file.
+
+    Parameters
+    ----------
+    paths=None
+        List of image paths, or the path to a single video file (anything
+        imageio.get_reader() can open). If None, a dialog will pop up to
+        select multiple images.
+
+    cache_size=512e6 : float
+        Maximum number of bytes of decoded frames to keep in the cache.
+
+    prefetch=4 : int
+        How many frames following each accessed frame to decode in the
+        background. 0 disables prefetching.
+
+    workers=2 : int
+        Number of background decoding threads. Video files are always
+        decoded one frame at a time.
+    """
+    def __init__(self, paths=None, cache_size=512e6, prefetch=4, workers=2):
+        if not _mp._imageio: raise Exception('You need to install imageio for this function.')
+
+        if paths == None: paths = _s.dialogs.load_multiple()
+        if paths == None: return
+
+        self.cache_size = cache_size
+        self.prefetch   = prefetch
+
+        # Video file
+        if type(paths) is str:
+            self.paths   = None
+            self._reader = _mp._imageio.get_reader(paths)
+
+            # Only some readers (e.g. ffmpeg) can count the frames exactly
+            try:                   length = self._reader.count_frames()
+            except AttributeError: length = self._reader.get_length()
+
+            # Unknown (infinite) length, e.g. some streamed formats: count
+            # them by decoding the whole file once.
+            if length == float('inf'):
+                length = 0
+                for a in self._reader.iter_data(): length += 1
+
+            self._length = int(length)
+            workers = 1
+
+        # Image files
+        else:
+            self.paths   = list(paths)
+            self._reader = None
+            self._length = len(self.paths)
+
+        self._lock        = _threading.RLock()
+        self._reader_lock = _threading.Lock()
+        self._cache       = _collections.OrderedDict()
+        self._cache_bytes = 0
+        self._pending     = dict()
+        self._pool        = _futures.ThreadPoolExecutor(max(1, workers))
+
+    def __enter__(self): return self
+    def __exit__(self, *a): self.close()
+
+    def __len__(self): return self._length
+
+    def __iter__(self):
+        for n in range(len(self)): yield self[n]
+
+    def __getitem__(self, n):
+
+        # Slices become a stacked array
+        if type(n) is slice:
+            ns = range(*n.indices(len(self)))
+            if len(ns) == 0: return _n.array([])
+            a = _n.array([self._get(m) for m in ns])
+            self._prefetch(ns[-1], ns.step)
+            return a
+
+        if n < 0: n += len(self)
+        if n < 0 or n >= len(self): raise IndexError('Frame '+str(n)+' is out of range ('+str(len(self))+' frames).')
+
+        a = self._get(n)
+        self._prefetch(n)
+        return a
+
+    def _decode(self, n):
+        """
+        Decodes frame n from disk.
+        """
+        if self._reader is None: a = load_image(self.paths[n])
+        else:
+            with self._reader_lock: a = _n.asarray(self._reader.get_data(n))
+
+        a.flags.writeable = False
+        return a
+
+    def _store(self, n, a):
+        """
+        Adds frame n to the cache, dropping the least recently used frames
+        to stay within the cache size.
+        """
+        with self._lock:
+            if n in self._cache: return
+            self._cache[n] = a
+            self._cache_bytes += a.nbytes
+            while self._cache_bytes > self.cache_size and len(self._cache) > 1:
+                self._cache_bytes -= self._cache.popitem(last=False)[1].nbytes
+
+    def _get(self, n):
+        """
+        Returns frame n from the cache, the background decoder, or disk.
+        """
+        with self._lock:
+            if n in self._cache:
+                self._cache.move_to_end(n)
+                return self._cache[n]
+            f = self._pending.get(n)
+
+        if f is not None: return f.result()
+
+        a = self._decode(n)
+        self._store(n, a)
+        return a
+
+    def _background(self, n):
+        """
+        Decodes and caches frame n in a worker thread.
+        """
+        try:
+            a = self._decode(n)
+            self._store(n, a)
+            return a
+        finally:
+            with self._lock: self._pending.pop(n, None)
+
+    def _prefetch(self, n, step=1):
+        """
+        Queues background decoding of the frames following frame n.
+        """
+        if not self.prefetch or self._pool is None: return
+        with self._lock:
+            for m in range(n+step, n+step*(self.prefetch+1), step):
+                if m < 0 or m >= len(self) or m in self._cache or m in self._pending: continue
+                self._pending[m] = self._pool.submit(self._background, m)
+
+    def clear_cache(self):
+        """
+        Empties the frame cache.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._cache_bytes = 0
+
+    def close(self):
+        """
+        Stops the background threads and closes the video file, if any.
+        """
+        if self._pool is None: return
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pool = None
+        if self._reader is not None:
+            with self._reader_lock: self._reader.close()
+        self.clear_cache()
+
+def _image_intensity_map(a):
+    """
+    Returns the 2D (float) intensity of image array a, summing over the
+    color channels (ignoring alpha) if there are any.
+    """
+    if a.ndim == 3: return a[:,:,0:3].sum(axis=2, dtype=float)
+    else:           return _n.asarray(a, dtype=float)
+
+def image_intensity(a):
+    """
+    Reducer for reduce_images(): total intensity of image array a.
+    """
+    return _image_intensity_map(a).sum()
+
+def image_centroid(a):
+    """
+    Reducer for reduce_images(): intensity-weighted centroid of image array
+    a, returned as dict(x=column, y=row) in pixels.
+    """
+    I = _image_intensity_map(a)
+    total = I.sum()
+    if total == 0: return dict(x=_n.nan, y=_n.nan)
+    return dict(x = _n.dot(I.sum(axis=0), _n.arange(I.shape[1]))/total,
+                y = _n.dot(I.sum(axis=1), _n.arange(I.shape[0]))/total)
+
+def image_roi_sum(x1, x2, y1, y2):
+    """
+    Returns a reducer for reduce_images() that sums the intensity over the
+    pixel columns x1:x2 and rows y1:y2.
+    """
+    def roi_sum(a): return _image_intensity_map(a[y1:y2, x1:x2]).sum()
+    return roi_sum
+
+def image_radial_profile(center=None, bins=50, radius=None):
+    """
+    Returns a reducer for reduce_images() that computes the average
+    intensity in bins of distance from the specified center.
+
+    Parameters
+    ----------
+    center=None
+        [x, y] center in pixels. None means the center of the image.
+    bins=50
+        Number of radial bins.
+    radius=None
+        Outer radius of the last bin in pixels. None means the distance from
+        the center to the farthest corner.
+    """
+    # Bin index of every pixel, computed once per image shape
+    cache = dict()
+    def radial_profile(a):
+        I = _image_intensity_map(a)
+        if not I.shape in cache:
+            if center is None: x0, y0 = 0.5*(I.shape[1]-1), 0.5*(I.shape[0]-1)
+            else:              x0, y0 = center
+            y, x = _n.indices(I.shape)
+            r = _n.hypot(x-x0, y-y0)
+            R = r.max() if radius is None else radius
+            i = _n.where(r <= R, _n.minimum((r*(bins/R)).astype(int), bins-1), bins).ravel()
+            cache[I.shape] = i, _n.bincount(i, minlength=bins+1)[0:bins]
+        i, N = cache[I.shape]
+        with _n.errstate(invalid='ignore', divide='ignore'):
+            return _n.bincount(i, I.ravel(), minlength=bins+1)[0:bins]/N
+    return radial_profile
+
+def _reduce_image(item, reducers):
+    """
+    Loads (if necessary) and reduces a single image, returning a dictionary
+    of the reducer outputs, or the exception raised trying.
+    """
+    try:
+        if isinstance(item, str): a = load_image(item)
+        else:                     a = _n.asarray(item)
+        return dict([(k, reducers[k](a)) for k in reducers])
+    except Exception as e: return e
+
+def reduce_images(paths=None, reducers=None, workers=None):
+    """
+    Streams through a sequence of images, reducing each frame to a few
+    numbers, and returns a databox with one row per frame. Frames are
+    decoded and reduced in worker threads, and only a few are in memory at
+    any time, so memory use does not grow with the number of frames.
+
+    Parameters
+    ----------
+    paths=None
+        Any iterable of image paths (e.g., a generator), or of image arrays
+        (e.g., an image_sequence). If None, a dialog will pop up.
+
+    reducers=None : dict
+        Dictionary of name:function pairs. Each function receives the frame
+        array and returns a number, an array of numbers (stored in columns
+        name_0, name_1, ...), or a dictionary of numbers (stored in columns
+        name_key). Built-in options are image_intensity, image_centroid,
+        image_roi_sum() and image_radial_profile(). None means
+        dict(intensity=image_intensity, centroid=image_centroid).
+
+    workers=None : int
+        Number of worker threads. None means one per CPU.
+
+    Returns
+    -------
+    Databox with a 'frame' column (index in the sequence) and the reducer
+    columns. Frames that fail are reported and skipped.
+    """
+    if paths == None: paths = _s.dialogs.load_multiple()
+    if paths == None: return
+
+    if reducers is None: reducers = dict(intensity=image_intensity, centroid=image_centroid)
+    if workers  is None: workers  = _os.cpu_count() or 1
+
+    # Columns of results
+    columns = _collections.OrderedDict(frame=[])
+
+    items = enumerate(paths)
+    for (frame, item), r in _imap(lambda x: _reduce_image(x[1], reducers), items, workers):
+
+        if isinstance(r, Exception):
+            print('ERROR: Could not reduce frame '+str(frame)+': '+repr(r))
+            continue
+
+        # Flatten the outputs into named values
+        row = dict(frame=frame)
+        for k in reducers:
+            v = r[k]
+            if   isinstance(v, dict): row.update([(k+'_'+str(j), v[j]) for j in v])
+            elif _n.ndim(v) > 0:      row.update([(k+'_'+str(j), x) for j, x in enumerate(_n.ravel(v))])
+            else:                     row[k] = v
+
+        # New columns are backfilled with nan
+        for k in row:
+            if not k in columns: columns[k] = [_n.nan]*len(columns['frame'])
+        for k in columns: columns[k].append(row.get(k, _n.nan))
+
+    d = _s.data.databox()
+    for k in columns: d[k] = columns[k]
+    d.h(reducers=list(reducers.keys()))
+    return d
+
+if __name__ == '__main__': _sys.exit(_main())
@@ -1,7 +1,13 @@
 import numpy as _n
+import collections as _collections
 from scipy.special import wofz as _wofz
 from scipy.special import erf  as _erf
+from scipy.special import erfc as _erfc
 from scipy.special import erfcx as _erfcx
+from scipy.special import gammaln  as _gammaln
+from scipy.special import gammainc  as _gammainc
+from scipy.special import gammaincc as _gammaincc
+from scipy.special import xlogy     as _xlogy
 import scipy.stats as _stats
 
 
@@ -10,7 +16,7 @@ _ROOT2   = 2.0**0.5
 _ROOT2PI = (2.0*_n.pi)**0.5
 
 
-def gaussian(x, sigma=1):
+def gaussian(x, sigma=1, out=None, dtype=None):
     """
     Gaussian probability distribution normalized so that the area is 1, and
     the standard deviation is sigma. Specifically:
@@ -23,10 +29,39 @@ def gaussian(x, sigma=1):
         Distance from the center of the peak.
     sigma:
         Standard deviation of the Gaussian distribution.
+    out=None:
+        Optional array (e.g., reused between calls) in which to evaluate
+        the function without allocating any full-size temporaries.
+    dtype=None:
+        Data type of the result if out is None, e.g., numpy.float32 to halve
+        the memory and bandwidth. By default, float64 (or float32 for
+        float32 x).
     """
-    return _n.exp(-0.5*(x/sigma)**2)/(sigma*_ROOT2PI)
+    y = _output(out, dtype, x, sigma)
+    _n.divide(x, sigma, out=y)
+    _n.square(y, out=y)
+    y *= -0.5
+    _n.exp(y, out=y)
+    y /= _n.multiply(sigma, _ROOT2PI)
+    return y if out is not None else y[()]
 
-def gaussian_cdf(x, sigma=1):
+def gaussian_jacobian(x, sigma=1):
+    """
+    Returns the partial derivatives (df/dx, df/dsigma) of f = gaussian(x,sigma).
+    For a peak A*f(x-x0), the remaining derivatives are d/dA = f and
+    d/dx0 = -A*df/dx.
+
+    Parameters
+    ----------
+    x:
+        Distance from the center of the peak.
+    sigma:
+        Standard deviation of the Gaussian distribution.
+    """
+    g = gaussian(x, sigma)
+    return -x/sigma**2*g, (x*x-sigma*sigma)/sigma**3*g
+
+def gaussian_cdf(x, sigma=1, out=None, dtype=None):
     """
     Cumulative distribution function of a Gaussian distribution having area
     1 and standard deviation sigme (i.e., the running integral of gaussian(x,sigma)).
@@ -37,17 +72,176 @@ def gaussian_cdf(x, sigma=1):
         Distance from the center of the peak.
     sigma:
         Standard deviation of the underlying Gaussian distribution.
+    out=None, dtype=None:
+        Optional output array or data type, as in gaussian().
+    """
+    y = _output(out, dtype, x, sigma)
+    _n.divide(x, _n.multiply(sigma, _ROOT2), out=y)
+    _erf(y, out=y)
+    y *= 0.5
+    y += 0.5
+    return y if out is not None else y[()]
+
+
+def _output(out, dtype, *args):
+    """
+    Returns out if specified, or a new array having the broadcast shape of
+    args and the specified dtype (by default float64, or the floating point
+    type of args).
+    """
+    if out is not None: return out
+    args = [_n.asarray(a) if isinstance(a, (list, tuple)) else a for a in args]
+    if dtype is None: dtype = _n.result_type(*args, 1.0)
+    return _n.empty(_n.broadcast_shapes(*[_n.shape(a) for a in args]), dtype)
+
+def _em_gaussian_kernel(u, k, out, tail=None):
+    """
+    Writes exp(-0.5*u**2)*erfcx(z) into out, where u is the (tau-signed)
+    distance from the center in units of sigma, k=sigma/|tau|, and
+    z=(k-u)/sqrt(2). On the exponential tail (z<0), erfcx(z) overflows
+    while the Gaussian underflows, so there the identity
+    erfcx(z) = 2*exp(z**2)-erfcx(-z) is used to write the value as
+    2*exp(0.5*k**2-k*u) - exp(-0.5*u**2)*erfcx(-z). This exact form is
+    chosen element by element, wherever z<0 and either the Gaussian
+    exponent below is clipped or erfcx(z) would overflow, so each value
+    does not depend on the rest of the array.
+    Exponents are clipped just above the log of the smallest normal number
+    of out.dtype to stay out of the (slow) denormal range, so values below
+    that (~1e-304 for float64, ~1e-38 for float32) are not resolved.
+
+    The array u is overwritten, and k must broadcast against u. The tail
+    term needs a third array, which is allocated only if tail is None and
+    some element needs the exact form.
+    """
+    f    = _n.finfo(out.dtype)
+    low  =  0.99*_n.log(f.tiny)
+    zmin = -0.99*_n.sqrt(_n.log(f.max/2))
+
+    # Gaussian part
+    _n.multiply(u, u, out=out)
+    out *= -0.5
+    exact = out < low
+    _n.maximum(out, low, out=out)
+    _n.exp(out, out=out)
+
+    # u -> z
+    _n.subtract(k, u, out=u)
+    u *= 1/_ROOT2
+
+    # Exponential tail elements whose Gaussian was clipped or whose erfcx(z)
+    # would overflow
+    exact |= u < zmin
+    exact &= u < 0
+
+    # Nothing needs the exact form
+    if not exact.any():
+        _erfcx(u, out=u)
+        out *= u
+        return out
+
+    # Exponential tail term 2*exp(sqrt(2)*k*z-0.5*k**2), only where exact
+    if tail is None: tail = _n.empty_like(out)
+    _n.multiply(u, _ROOT2*k, out=tail)
+    tail -= 0.5*k*k
+    _n.clip(tail, low, 0, out=tail)
+    _n.exp(tail, out=tail)
+    tail *= 2
+    tail *= exact
+
+    # Gaussian*erfcx(z), or tail - Gaussian*erfcx(-z) where exact
+    _n.negative(u, out=u, where=exact)
+    _erfcx(u, out=u)
+    out *= u
+    _n.negative(out, out=out, where=exact)
+    out += tail
+    return out
+
+def _bins(edges, cdf, sf):
+    """
+    Returns the probability in each bin from the cumulative distribution
+    and survival function evaluated at the edges (last axis). Bins above
+    x=0 use the survival function, so the far right tail does not lose
+    precision subtracting numbers close to 1.
+    """
+    p = cdf[...,1:] - cdf[...,:-1]
+    q = sf[...,:-1] - sf[...,1:]
+    p = _n.where(_n.broadcast_to(edges, p.shape[:-1]+edges.shape[-1:])[...,:-1] >= 0, q, p)
+    return _n.maximum(p, 0, out=p)
+
+def gaussian_bins(edges, sigma=1):
+    """
+    Returns the probability of each bin for gaussian(x,sigma), i.e., the
+    exact integral over each bin rather than the value at its center, which
+    is biased for peaks only a few bins wide.
+
+    Parameters
+    ----------
+    edges:
+        Bin edges (distance from the center of the peak) along the last
+        axis. N edges produce N-1 bins.
+    sigma:
+        Standard deviation of the Gaussian distribution. This broadcasts
+        against the leading axes of edges, so, e.g., P values of sigma with
+        N edges produce a (P,N-1) array.
+    """
+    e = _n.asarray(edges, dtype=float)
+    u = e/(_ROOT2*_n.asarray(sigma)[...,None])
+    return _bins(e, 0.5*_erfc(-u), 0.5*_erfc(u))
+
+def em_gaussian_cdf(x, sigma=1, tau=1):
+    """
+    Cumulative distribution function of em_gaussian(x,sigma,tau). This has
+    the closed form
+
+        gaussian_cdf(x,sigma) - tau*em_gaussian(x,sigma,tau)
+
+    for either sign of tau.
+
+    Parameters
+    ----------
+    x:
+        Distance from the center of the peak.
+    sigma:
+        Standard deviation of Gaussian ~ exp(-x**2/(2*sigma**2))
+    tau:
+        Length scale of exponential ~ exp(x/tau).
+    """
+    return gaussian_cdf(x, sigma) - tau*em_gaussian(x, sigma, tau)
 
+def em_gaussian_bins(edges, sigma=1, tau=1):
     """
-    return 0.5*_erf(x/(_ROOT2*sigma)) + 0.5
+    Returns the probability of each bin for em_gaussian(x,sigma,tau), from
+    differences of em_gaussian_cdf() (or the survival function on the right).
 
+    Parameters
+    ----------
+    edges:
+        Bin edges (distance from the center of the peak) along the last
+        axis. N edges produce N-1 bins.
+    sigma:
+        Standard deviation of Gaussian ~ exp(-x**2/(2*sigma**2))
+    tau:
+        Length scale of exponential ~ exp(x/tau). sigma and tau broadcast
+        against the leading axes of edges, so, e.g., P values of sigma and
+        tau with N edges produce a (P,N-1) array.
+    """
+    e = _n.asarray(edges, dtype=float)
+    s = _n.asarray(sigma)[...,None]
+    t = _n.asarray(tau)  [...,None]
+    f = t*em_gaussian(e, s, t)
+    u = e/(_ROOT2*s)
+    return _bins(e, 0.5*_erfc(-u)-f, 0.5*_erfc(u)+f)
 
-def em_gaussian(x, sigma=1, tau=1):
+def em_gaussian(x, sigma=1, tau=1, out=None, dtype=None):
     """
     Returns an exponentially modified Gaussian (a convolution of an exponential
     cutoff at x=0 and Gaussian) having standard deviation sigma and exponential
     decay length tau. This function is normalized to have unity area.
 
+    All arguments broadcast against each other, so, e.g., a grid of
+    (x, sigma, tau) values can be evaluated in one call with
+    em_gaussian(x[:,None,None], sigma[:,None], tau).
+
     Parameters
     ----------
     x:
@@ -56,20 +250,144 @@ def em_gaussian(x, sigma=1, tau=1):
         Standard deviation of Gaussian ~ exp(-x**2/(2*sigma**2))
     tau:
         Length scale of exponential ~ exp(x/tau). Positive tau skews the peak
-        to higher values and negative tau skews to lower values.
+        to higher values and negative tau skews to lower values. tau=0
+        returns the Gaussian.
+    out=None, dtype=None:
+        Optional output array or data type, as in gaussian(). One full-size
+        scratch array of the same type is still needed (two far out on
+        the exponential tail).
     """
-    t = abs(tau)
+    y   = _output(out, dtype, x, sigma, tau)
+    x   = _n.asarray(x)
+    s   = _n.asarray(sigma, dtype=float)
+    tau = _n.asarray(tau,   dtype=float)
+
+    # Mirror negative tau, and use a dummy tau where tau=0
+    zero = tau == 0
+    t = _n.where(zero, s, abs(tau))
+    u = _n.multiply(x, _n.where(tau < 0, -1/s, 1/s), out=_n.empty_like(y))
+
+    _em_gaussian_kernel(u, s/t, y)
+    y *= 0.5/t
+    if zero.any():
+        zero = _n.broadcast_to(zero, y.shape)
+        y[zero] = gaussian(_n.broadcast_to(x, y.shape)[zero], _n.broadcast_to(s, y.shape)[zero])
+    return y if out is not None else y[()]
+
+def em_gaussian_jacobian(x, sigma=1, tau=1):
+    """
+    Returns the partial derivatives (df/dx, df/dsigma, df/dtau) of
+    f = em_gaussian(x,sigma,tau). For a peak A*f(x-x0), the remaining
+    derivatives are d/dA = f and d/dx0 = -A*df/dx.
+
+    These follow from writing f = exp(s**2/(2*t**2)-x/t)*erfc(z)/(2*t), with
+    z = (s/t-x/s)/sqrt(2), and noting that the derivative of erfc(z) brings
+    back the Gaussian g = gaussian(x,sigma), e.g., df/dx = (g-f)/t.
+
+    Parameters
+    ----------
+    x:
+        Distance from the center of the peak.
+    sigma:
+        Standard deviation of Gaussian ~ exp(-x**2/(2*sigma**2))
+    tau:
+        Length scale of exponential ~ exp(x/tau). As in em_gaussian(), the
+        sign sets the direction of the tail.
+    """
+    # Negative tau is the mirror image of positive tau
+    sign = _n.where(_n.asarray(tau) < 0, -1.0, 1.0)
     s = sigma
+    t = abs(tau)
+    x = sign*x
+
+    f = em_gaussian(x, s, t)
+    g = gaussian   (x, s)
 
-    if tau >= 0: return 0.5/t*_n.exp(-0.5*( x/s)**2)*_erfcx((s/t - x/s)*0.5**0.5)
-    else:        return 0.5/t*_n.exp(-0.5*(-x/s)**2)*_erfcx((s/t + x/s)*0.5**0.5)
+    dx = sign*(g-f)/t
+    ds = s/t**2*(f-g) - x/(s*t)*g
+    dt = sign*(f*(x/t**2 - s*s/t**3 - 1/t) + s*s/t**3*g)
+    return dx, ds, dt
 
-def voigt(x, sigma=1, gamma=1):
+def _humlicek_w4(x, y):
+    """
+    Humlicek's W4 rational approximation (JQSRT 27, 437 (1982)) of the
+    Faddeeva function w(x+iy) for y >= 0, evaluated region by region.
+    """
+    x, y = _n.broadcast_arrays(x, y)
+    t = y - 1j*x
+    s = abs(x) + y
+    w = _n.empty(t.shape, dtype=complex)
+
+    # Far from the center
+    r = s >= 15
+    u = t[r]
+    w[r] = u*0.5641896/(0.5+u*u)
+
+    r2 = (s >= 5.5) & ~r
+    u = t[r2]
+    v = u*u
+    w[r2] = u*(1.410474+v*0.5641896)/(0.75+v*(3.0+v))
+
+    # Near the center
+    r3 = (s < 5.5) & (y >= 0.195*abs(x)-0.176)
+    u = t[r3]
+    w[r3] = (16.4955+u*(20.20933+u*(11.96482+u*(3.778987+u*0.5642236)))) / \
+            (16.4955+u*(38.82363+u*(39.27121+u*(21.69274+u*(6.699398+u)))))
+
+    r4 = (s < 5.5) & ~r3
+    u = t[r4]
+    v = u*u
+    w[r4] = _n.exp(v) - u*(36183.31-v*(3321.9905-v*(1540.787-v*(219.0313-v*(35.76683-v*(1.320522-v*0.56419)))))) / \
+                         (32066.6-v*(24322.84-v*(9022.228-v*(2186.181-v*(364.2191-v*(61.57037-v*(1.841439-v)))))))
+    return w
+
+def voigt(x, sigma=1, gamma=1, fast=False, out=None, dtype=None):
     """
     Returns a Voigt function (a convolution of a Lorentzian and Gaussian)
     centered at x=0 with Gaussian standard deviation sigma and Lorentzian
     half-width gamma. The function is normalized to have unity area.
 
+    Parameters
+    ----------
+    x:
+        Distance from center of peak.
+    sigma = 1:
+        Standard deviation of Gaussian ~ exp(-x**2/(2*sigma**2))
+    gamma = 1:
+        Halfwidth of Lorentzian ~ 1/(1+x**2/gamma**2)
+    fast = False:
+        If True, use Humlicek's W4 rational approximation instead of
+        scipy.special.wofz(), which is about 3 times faster. Its relative
+        error is below 1e-4 for gamma >= 1e-6*sigma (measured over
+        gamma/sigma = 1e-6 to 1e4 and |x| < 1e4*sigma). For smaller gamma the
+        same holds wherever the value is above 1e-9 of the peak height, and
+        the error never exceeds 4e-5 of the peak height.
+    out = None, dtype = None:
+        Optional output array or data type, as in gaussian(). The Faddeeva
+        function is still evaluated in a complex temporary of matching
+        precision (complex64 for float32).
+    """
+    y = _output(out, dtype, x, sigma, gamma)
+
+    if fast: _n.copyto(y, _humlicek_w4(_n.divide(x, _n.multiply(sigma, _ROOT2)), _n.divide(gamma, _n.multiply(sigma, _ROOT2))).real, casting='same_kind')
+    else:
+        z = _n.empty(y.shape, dtype=_n.result_type(y.dtype, 1j))
+        z.real = x
+        z.imag = gamma
+        z /= _n.multiply(sigma, _ROOT2)
+        _wofz(z, out=z)
+        _n.copyto(y, z.real, casting='same_kind')
+
+    y /= _n.multiply(sigma, _ROOT2PI)
+    return y if out is not None else y[()]
+
+def voigt_jacobian(x, sigma=1, gamma=1):
+    """
+    Returns the partial derivatives (df/dx, df/dsigma, df/dgamma) of
+    f = voigt(x,sigma,gamma), using the Faddeeva function derivative
+    w'(z) = -2*z*w(z) + 2i/sqrt(pi). For a peak A*f(x-x0), the remaining
+    derivatives are d/dA = f and d/dx0 = -A*df/dx.
+
     Parameters
     ----------
     x:
@@ -79,7 +397,22 @@ def voigt(x, sigma=1, gamma=1):
     gamma = 1:
         Halfwidth of Lorentzian ~ 1/(1+x**2/gamma**2)
     """
-    return _n.real(_wofz((x + 1j*gamma)/sigma/_ROOT2)) / sigma / (2*_n.pi)**0.5
+    z  = (x + 1j*gamma)/sigma/_ROOT2
+    w  = _wofz(z)
+    dw = 2j/_n.pi**0.5 - 2*z*w
+
+    c = 1/(sigma*_ROOT2PI)
+    dx =  c*_n.real(dw)/(sigma*_ROOT2)
+    dg = -c*_n.imag(dw)/(sigma*_ROOT2)
+    ds = -c*(_n.real(dw*z) + _n.real(w))/sigma
+    return dx, ds, dg
+
+def _reduced_chi2_log_pdf(x, dof):
+    """
+    Natural log of reduced_chi2(x, dof) in closed form.
+    """
+    k = _n.asarray(dof, dtype=float)
+    return _n.log(k) + _xlogy(0.5*k-1, k*x) - 0.5*k*x - 0.5*k*_n.log(2) - _gammaln(0.5*k)
 
 def reduced_chi2(x, dof):
     """
@@ -94,5 +427,321 @@ def reduced_chi2(x, dof):
     dof
         Degrees of freedom.
     """
-    return dof*_stats.chi2.pdf(x*dof,dof)
+    x = _n.asarray(x, dtype=float)
+    y = _n.exp(_reduced_chi2_log_pdf(_n.maximum(x, 0), dof))
+    return _n.where(x < 0, 0.0, y)[()]
+
+def reduced_chi2_cdf(x, dof):
+    """
+    Returns the cumulative distribution function of reduced_chi2(x, dof),
+    i.e., the probability of a reduced chi^2 below x, interpolated from
+    cached tables (see reduced_chi2_tables).
+
+    Parameters
+    ----------
+    x
+        Value(s) of reduced chi^2.
+
+    dof
+        Degrees of freedom (scalar or array broadcasting against x).
+    """
+    return _reduced_chi2_tables.cdf(x, dof)
+
+def reduced_chi2_sf(x, dof):
+    """
+    Returns the survival function of reduced_chi2(x, dof), i.e., the p-value
+    of reduced chi^2 values x, interpolated from cached tables (see
+    reduced_chi2_tables).
+
+    Parameters
+    ----------
+    x
+        Value(s) of reduced chi^2.
+
+    dof
+        Degrees of freedom (scalar or array broadcasting against x).
+    """
+    return _reduced_chi2_tables.sf(x, dof)
+
+class reduced_chi2_tables():
+    """
+    Evaluates the reduced chi^2 distribution many times for a handful of
+    degrees of freedom. The density has a closed form (see reduced_chi2()),
+    but the cumulative distribution and survival function (p-value) need
+    incomplete gamma functions, so for each dof these are tabulated once
+    and then interpolated.
+
+    The tables hold log(cdf) and log(sf) versus log(x) as cubic Hermite
+    segments built from the exact values and derivatives, and cover
+    cdf, sf > 1e-300 (and x > 1e-12). The number of segments is doubled
+    until twice the largest error of log(cdf) and log(sf) at the 1/4, 1/2
+    and 3/4 points of every segment is below tolerance. The error of a
+    cubic Hermite segment is a smooth bump peaking near its center, so the
+    factor of 2 covers the points in between, and since the error of
+    log(cdf) is the relative error of cdf (likewise for sf), cdf() and sf()
+    stay within tolerance, including for small p-values. Values outside
+    the tables are computed exactly, as is pdf() (a closed form).
+
+    Parameters
+    ----------
+    max_dofs=16
+        Maximum number of tables kept in memory (about 1 MB or less each for
+        the default tolerance, more for tighter tolerances). The least
+        recently used is dropped beyond this.
+    tolerance=1e-10
+        Maximum relative interpolation error of cdf() and sf().
+    max_segments=2**20
+        Maximum number of segments per table (64 MB). If the tolerance is
+        not met by then, a warning is printed and the table is used as is.
+    """
+    def __init__(self, max_dofs=16, tolerance=1e-10, max_segments=2**20):
+        self.max_dofs     = max_dofs
+        self.tolerance    = tolerance
+        self.max_segments = max_segments
+        self._tables      = _collections.OrderedDict()
+
+    def _get_table(self, dof):
+        """
+        Returns the table for the specified dof, building it if needed.
+        """
+        dof = float(dof)
+        if not dof > 0 or dof == _n.inf: raise ValueError('reduced_chi2_tables: dof must be positive and finite, not '+str(dof)+'.')
+
+        if dof in self._tables: self._tables.move_to_end(dof)
+        else:
+            self._tables[dof] = self._build_table(dof)
+            while len(self._tables) > self.max_dofs: self._tables.popitem(last=False)
+        return self._tables[dof]
+
+    def _build_table(self, dof):
+        """
+        Tabulates log(cdf) and log(sf) on a uniform log(x) grid, doubling
+        the number of points until the tolerance is met (or max_segments is
+        reached). dof must be positive.
+        """
+        k = dof
+        x1 = max(_stats.chi2.ppf(1e-300, k)/k, 1e-12)
+        x2 = _stats.chi2.isf(1e-300, k)/k
+        u1, u2 = _n.log(x1), _n.log(x2)
+
+        N = 64
+        while True:
+            h = (u2-u1)/N
+            u = u1 + h*_n.arange(N+1)
+            x = _n.exp(u)
+            p = _n.exp(_reduced_chi2_log_pdf(x, k))
+            F = _gammainc (0.5*k, 0.5*k*x)
+            S = _gammaincc(0.5*k, 0.5*k*x)
+
+            # Hermite coefficients (in powers of the fractional position) of each segment
+            coefficients = []
+            for y, d in [(_n.log(F), x*p/F), (_n.log(S), -x*p/S)]:
+                y1, y2, d1, d2 = y[:-1], y[1:], d[:-1]*h, d[1:]*h
+                coefficients.append(_n.array([y1, d1, 3*(y2-y1)-2*d1-d2, 2*(y1-y2)+d1+d2]))
+
+            # Check the 1/4, 1/2 and 3/4 points of every segment, with a
+            # safety factor of 2
+            e1 = e2 = 0
+            for a in [0.25, 0.5, 0.75]:
+                xa = _n.exp(u[:-1]+a*h)
+                e1 = max(e1, abs(_n.dot([1,a,a*a,a*a*a], coefficients[0]) - _n.log(_gammainc (0.5*k, 0.5*k*xa))).max())
+                e2 = max(e2, abs(_n.dot([1,a,a*a,a*a*a], coefficients[1]) - _n.log(_gammaincc(0.5*k, 0.5*k*xa))).max())
+            if 2*max(e1, e2) <= self.tolerance: break
+
+            # Give up refining
+            if 2*N > self.max_segments:
+                print('WARNING: reduced_chi2_tables could not reach tolerance '+str(self.tolerance)+' for dof='+str(k)+
+                      ' with '+str(N)+' segments; the interpolation error is about '+'%.1e'%max(e1, e2)+'.')
+                break
+
+            N *= 2
+
+        return dict(dof=k, x1=x1, x2=x2, u1=u1, h=h, cdf=coefficients[0], sf=coefficients[1])
+
+    def _interpolate(self, x, dof, which):
+        """
+        Looks up cdf or sf for one dof.
+        """
+        t = self._get_table(dof)
+        c = t[which]
+
+        # Fractional index in the table
+        inside = (x > t['x1']) & (x < t['x2'])
+        u = _n.log(x[inside] if not inside.all() else x)
+        u -= t['u1']
+        u /= t['h']
+        i  = _n.minimum(u.astype(int), c.shape[1]-1)
+        u -= i
+
+        # Horner
+        y = c[3].take(i)
+        y *= u; y += c[2].take(i)
+        y *= u; y += c[1].take(i)
+        y *= u; y += c[0].take(i)
+        _n.exp(y, out=y)
+        if inside.all(): return y
+
+        # Exact values outside the table
+        z = _n.empty(x.shape)
+        z[inside] = y
+        f = _gammainc if which == 'cdf' else _gammaincc
+        z[~inside] = f(0.5*dof, 0.5*dof*_n.maximum(x[~inside], 0))
+        return z
+
+    def _evaluate(self, x, dof, which):
+        """
+        Evaluates cdf or sf, grouping by dof if it is an array.
+        """
+        x = _n.asarray(x, dtype=float)
+        if _n.ndim(dof) == 0: return self._interpolate(x.ravel(), dof, which).reshape(x.shape)[()]
+
+        x, dof = _n.broadcast_arrays(x, _n.asarray(dof))
+
+        y = _n.empty(x.shape)
+        for d in _n.unique(dof):
+            m = dof == d
+            y[m] = self._interpolate(x[m], d, which)
+        return y
+
+    def pdf(self, x, dof):
+        """
+        Returns reduced_chi2(x, dof).
+        """
+        return reduced_chi2(x, dof)
+
+    def cdf(self, x, dof):
+        """
+        Returns the probability of a reduced chi^2 below x for the specified
+        dof (scalar or array broadcasting against x).
+        """
+        return self._evaluate(x, dof, 'cdf')
+
+    def sf(self, x, dof):
+        """
+        Returns the survival function (p-value), i.e., the probability of a
+        reduced chi^2 above x for the specified dof (scalar or array
+        broadcasting against x).
+        """
+        return self._evaluate(x, dof, 'sf')
+
+    def clear(self):
+        """
+        Drops all cached tables.
+        """
+        self._tables.clear()
+
+class multi_peak():
+    """
+    Evaluates the sum of many peaks of the same shape in one broadcast pass,
+    for example when fitting a spectrum with several em_gaussian() peaks.
+    The (peaks, x) scratch arrays are kept between calls, so repeated
+    evaluation with the same number of peaks and x-values (e.g., the
+    inner loop of a fit) does not allocate new temporaries.
+
+    Parameters
+    ----------
+    shape='em_gaussian'
+        Peak shape, one of 'gaussian', 'em_gaussian', or 'voigt'.
+    fast=False
+        If True, voigt peaks use the faster approximation described in
+        voigt().
+
+    Example
+    -------
+    f = multi_peak('em_gaussian')
+    y = f(x, centers=[10,20], sigmas=[1,2], areas=[100,50], taus=[-2,-3])
+    """
+    def __init__(self, shape='em_gaussian', fast=False):
+
+        if not shape in ['gaussian', 'em_gaussian', 'voigt']:
+            raise Exception('multi_peak shape must be gaussian, em_gaussian, or voigt, not '+repr(shape))
+
+        self.shape = shape
+        self.fast  = fast
+        self._buffers = None
+
+    def _get_buffers(self, P, N):
+        """
+        Returns the (P,N) scratch arrays, reallocating only if the size changed.
+        """
+        if self._buffers is None or self._buffers[0].shape != (P,N):
+            if self.shape == 'voigt': self._buffers = (_n.empty((P,N)), _n.empty((P,N), dtype=complex), None)
+            else:                     self._buffers = (_n.empty((P,N)), _n.empty((P,N)), _n.empty((P,N)))
+        return self._buffers
+
+    def __call__(self, x, centers, sigmas, areas=1, taus=1, gammas=1, components=False):
+        """
+        Returns the sum of the peaks evaluated at x.
+
+        Parameters
+        ----------
+        x
+            Array of x-values.
+        centers, sigmas
+            Array of peak centers and Gaussian standard deviations (one per peak).
+        areas=1
+            Area of each peak (scalar or array).
+        taus=1
+            Exponential length scale of each peak (em_gaussian only). As
+            in em_gaussian(), the sign sets the direction of the tail.
+        gammas=1
+            Lorentzian half-width of each peak (voigt only).
+        components=False
+            If True, return the (peaks, x) array of individual peaks
+            rather than their sum. This array is the internal scratch
+            buffer, so copy it if it must survive the next call.
+        """
+        x = _n.asarray(x, dtype=float)
+        c = _n.atleast_1d(_n.asarray(centers, dtype=float))
+        s = _n.broadcast_to(_n.asarray(sigmas, dtype=float), c.shape)
+        w = _n.broadcast_to(_n.asarray(areas,  dtype=float), c.shape)
+        a, b, scratch = self._get_buffers(len(c), x.size)
+
+        # Distance from each center in units of sigma
+        _n.subtract(x.ravel(), c[:,None], out=a)
+        a /= s[:,None]
+
+        if self.shape == 'gaussian':
+            _n.multiply(a, a, out=b)
+            b *= -0.5
+            _n.exp(b, out=b)
+            w = w/(s*_ROOT2PI)
+
+        elif self.shape == 'em_gaussian':
+            t    = _n.broadcast_to(_n.asarray(taus, dtype=float), c.shape)
+            zero = t == 0
+            if zero.any(): g = _n.exp(-0.5*a[zero]**2)
+
+            # Flip peaks with negative tau, and use a dummy k for tau=0
+            a *= _n.where(t < 0, -1.0, 1.0)[:,None]
+            k  = s/_n.where(zero, s, abs(t))
+            _em_gaussian_kernel(a, k[:,None], b, scratch)
+
+            # tau=0 is just a Gaussian
+            with _n.errstate(divide='ignore'): w = _n.where(zero, w/(s*_ROOT2PI), 0.5*w/abs(t))
+            if zero.any(): b[zero] = g
+
+        elif self.fast:
+            g = _n.broadcast_to(_n.asarray(gammas, dtype=float), c.shape)
+            a *= 1/_ROOT2
+            b  = _humlicek_w4(a, (g/s/_ROOT2)[:,None]).real
+            w  = w/(s*_ROOT2PI)
+
+        else:
+            g = _n.broadcast_to(_n.asarray(gammas, dtype=float), c.shape)
+            b.real = a
+            b.imag = (g/s)[:,None]
+            b *= 1/_ROOT2
+            _wofz(b, out=b)
+            b = b.real
+            w = w/(s*_ROOT2PI)
+
+        if components:
+            b *= w[:,None]
+            return b.reshape((len(c),)+x.shape)
+
+        return _n.dot(w, b).reshape(x.shape)
+
 
+# Shared tables for reduced_chi2_cdf() and reduced_chi2_sf()
+_reduced_chi2_tables = reduced_chi2_tables()
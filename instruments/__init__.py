@@ -27,6 +27,7 @@ adalm2000     = _adalm2000.adalm2000
 from . import _sillyscope
 sillyscope_api = _sillyscope.sillyscope_api
 sillyscope     = _sillyscope.sillyscope
+sillyscope_waveforms = _sillyscope.sillyscope_waveforms
 
 from . import _keithley_dmm
 keithley_dmm_api = _keithley_dmm.keithley_dmm_api
@@ -1,5 +1,7 @@
 import numpy   as _n
 import time    as _t
+import traceback as _traceback
+import os      as _os
 import spinmob as _s
 import spinmob.egg as _egg
 _g = _egg.gui
@@ -11,6 +13,170 @@ except: _visa_tools = _mp.instruments._visa_tools
 _mp._debug_enabled = False
 _debug = _mp._debug
 
+class sillyscope_waveforms():
+    """
+    Compact storage for sillyscope waveforms, as returned by
+    sillyscope_api.get_waveform(compact=True). For each channel, this holds
+    the raw 8-bit samples exactly as they came from the scope (int8 for
+    Tektronix, uint8 for RIGOL) along with the header information, and
+    computes voltages and times only when asked, for all or some of the
+    points.
+
+    For channel N, the 8-bit counts are raw_zeroN + raw_signN*raw, and the
+    voltages and times follow the usual header conventions (see
+    sillyscope_api.get_waveform()):
+
+         y = yzeroN + ymultiplierN*counts
+         x = xmultiplierN*n
+
+    Attributes
+    ----------
+    channels
+        List of channels, in the order they were added.
+    raw
+        Dictionary of raw sample arrays, by channel.
+    headers
+        Dictionary of header information, as it will appear in a databox.
+    x
+        Optional array of times to use instead of xmultiplierN*n (e.g., the
+        simulated data). None by default.
+    """
+
+    def __init__(self):
+        self.channels = []
+        self.raw      = dict()
+        self.headers  = dict()
+        self.x        = None
+
+    def __len__(self):
+        """
+        Number of points in the longest channel.
+        """
+        if len(self.channels) == 0: return 0
+        return max([len(self.raw[c]) for c in self.channels])
+
+    def __repr__(self):
+        return '<sillyscope_waveforms: channels '+str(self.channels)+', '+str(len(self))+' points, '+str(self.nbytes())+' bytes>'
+
+    def add_channel(self, channel, raw, headers, raw_zero=0, raw_sign=1):
+        """
+        Adds (or replaces) the raw samples of the specified channel, updating
+        self.headers with the supplied dictionary (which should contain
+        xmultiplierN, yzeroN and ymultiplierN) and the raw to counts
+        conversion.
+        """
+        c = str(channel)
+        if not channel in self.channels: self.channels.append(channel)
+        self.raw[channel] = raw
+        self.headers.update(headers)
+        self.headers['raw_zero'+c] = raw_zero
+        self.headers['raw_sign'+c] = raw_sign
+        return self
+
+    def update(self, other):
+        """
+        Adds (or replaces) all the channels and headers of another
+        sillyscope_waveforms object.
+        """
+        for channel in other.channels:
+            if not channel in self.channels: self.channels.append(channel)
+            self.raw[channel] = other.raw[channel]
+        self.headers.update(other.headers)
+        if other.x is not None: self.x = other.x
+        return self
+
+    def nbytes(self):
+        """
+        Returns the number of bytes used by the raw samples.
+        """
+        return sum([self.raw[c].nbytes for c in self.channels])
+
+    def get_counts(self, channel=1, n1=0, n2=None):
+        """
+        Returns the 8-bit counts of the specified channel for points n1 to n2,
+        as int8 for Tektronix and int16 otherwise.
+        """
+        c = str(channel)
+        z = self.headers['raw_zero'+c]
+        v = self.raw[channel][n1:n2]
+
+        # No conversion necessary
+        if z == 0 and self.headers['raw_sign'+c] == 1: return v
+
+        return z + self.headers['raw_sign'+c]*_n.int16(v)
+
+    def get_y(self, channel=1, n1=0, n2=None, dtype=_n.float64, out=None):
+        """
+        Returns the voltages of the specified channel for points n1 to n2.
+
+        Parameters
+        ----------
+        channel=1
+            Which channel.
+        n1=0, n2=None
+            Range of points (as for slicing).
+        dtype=numpy.float64
+            Data type of the result.
+        out=None
+            Optional array in which to store the result.
+        """
+        c = str(channel)
+        m = self.headers['ymultiplier'+c]
+        v = self.raw[channel][n1:n2]
+
+        # Voltage = offset + scale * raw
+        scale  = m*self.headers['raw_sign'+c]
+        offset = self.headers['yzero'+c] + m*self.headers['raw_zero'+c]
+
+        if out is None: out = _n.empty(len(v), dtype)
+        _n.multiply(v, scale, out=out, casting='same_kind')
+        out += offset
+        return out
+
+    def get_x(self, channel=None, n1=0, n2=None, dtype=_n.float64):
+        """
+        Returns the times (or frequencies) for points n1 to n2 of the
+        specified channel. channel=None uses the first channel. If self.x is
+        not None, it is used instead.
+        """
+        if self.x is not None: return _n.asarray(self.x[n1:n2], dtype=dtype)
+
+        if channel is None: channel = self.channels[0]
+        if n2 is None: n2 = len(self.raw[channel])
+
+        x = _n.arange(n1, n2, dtype=dtype)
+        x *= self.headers['xmultiplier'+str(channel)]
+        return x
+
+    def to_databox(self, d=None, convert_to_float=True, include_x=True, dtype=_n.float64):
+        """
+        Fills databox d (e.g., the sillyscope's plot_raw) with the columns 'x',
+        'y1', 'y2', ... and all the header information, returning d. If
+        d=None, creates a databox.
+
+        Parameters
+        ----------
+        convert_to_float=True
+            If True, the y columns are voltages. If False, they are the 8-bit
+            counts (see get_counts()).
+
+        include_x=True
+            Whether to add the x column (based on the first channel).
+
+        dtype=numpy.float64
+            Data type of the converted columns.
+        """
+        if d is None: d = _s.data.databox()
+        d.update_headers(self.headers)
+
+        if include_x and len(self.channels): d['x'] = self.get_x(dtype=dtype)
+
+        for channel in self.channels:
+            if convert_to_float: d['y'+str(channel)] = self.get_y(channel, dtype=dtype)
+            else:                d['y'+str(channel)] = self.get_counts(channel)
+
+        return d
+
 class sillyscope_api(_visa_tools.visa_api_base):
     """
     Class for talking to a Tektronix TDS/TBS 1000 series and Rigol 1000 B/D/E/Z
@@ -45,6 +211,10 @@ class sillyscope_api(_visa_tools.visa_api_base):
         # Simulation settings
         self._simulation_sleep  = 0.01
         self._simulation_points = 1200
+        self._simulation_memory_points = 1200000
+
+        # Points per transfer for deep memory (RIGOLZ allows up to 250000 bytes)
+        self.chunk_size = 250000
 
         # Set up the info
         self.t_duty_cycle = 0
@@ -54,6 +224,7 @@ class sillyscope_api(_visa_tools.visa_api_base):
         self.previous_header[2] = dict(xzero2=0, xmultiplier2=1, yzero2=0, ymultiplier2=1)
         self.previous_header[3] = dict(xzero3=0, xmultiplier3=1, yzero3=0, ymultiplier3=1)
         self.previous_header[4] = dict(xzero4=0, xmultiplier4=1, yzero4=0, ymultiplier4=1)
+        self.header_fingerprint = dict()
         self.model = None
         self._channel = 1
 
@@ -132,7 +303,7 @@ class sillyscope_api(_visa_tools.visa_api_base):
         if   self.model in ['RIGOLZ']:           self.write(':CLE')
         elif self.model in ['RIGOLB','RIGOLDE']: self.write(':DISP:CLE')
 
-    def get_waveform(self, channel=1, convert_to_float=True, include_x=True, use_previous_header=False, binary=None):
+    def get_waveform(self, channel=1, convert_to_float=True, include_x=True, use_previous_header=False, binary=None, compact=False):
         """
         Queries the device for the currently shown data from the specified channel,
         returning a databox with all the information.
@@ -173,11 +344,19 @@ class sillyscope_api(_visa_tools.visa_api_base):
             If True, this will not query the waveform preamble / header information,
             which is actually several times longer than the data query. The
             header information from the previous query is stored in the
-            dictionary self.previous_header[channel].
+            dictionary self.previous_header[channel]. If 'auto', the previous
+            header is used only if a single cheap query says the scope
+            settings have not changed (see get_header_cached()).
 
         binary=None
             Can be set to any of the allowed databox (numpy), e.g. binary='float32',
             which will set the databox to this binary mode.
+
+        compact=False
+            If True, return a sillyscope_waveforms object holding the raw
+            8-bit samples and the header instead of a databox, deferring
+            the conversion (convert_to_float, include_x and binary are
+            then ignored).
         """
         _debug('get_waveform()')
 
@@ -187,6 +366,9 @@ class sillyscope_api(_visa_tools.visa_api_base):
         # For easy coding
         c = str(channel)
 
+        # Storage for the raw data and header
+        w = sillyscope_waveforms()
+
         # Simulation mode
         if self.instrument == None:
 
@@ -203,13 +385,6 @@ class sillyscope_api(_visa_tools.visa_api_base):
             # For duty cycle calculation
             t2 = _t.time()
 
-            # Rename the columns to simulate the scope output
-            d.rename_column(0, 'x')
-            d.rename_column(1, 'y'+c)
-
-            # Shorten the bitdepth
-            d[1] = _n.float16(_n.int8(d[1]))
-
             # Get the fake header info.
             d.insert_header('xzero'+c, 1)
             d.insert_header('xoffset'+c, 0)
@@ -221,19 +396,14 @@ class sillyscope_api(_visa_tools.visa_api_base):
             # Remember this for next time.
             self.previous_header[channel].update(d.headers)
 
-            # If we're converting to float voltages
-            if convert_to_float:
-                d['y'+c] = d.h('yzero'+c) + d.h('ymultiplier'+c)*(d['y'+c])
-
-            # Pop the time column if necessary
-            if not include_x: d.pop(0)
-
-
+            # Shorten the bitdepth, keeping the simulated times
+            w.add_channel(channel, _n.int8(d[1]), d.headers)
+            w.x = d[0]
 
         # Real deal
         else:
 
-            # Databox to fill
+            # Databox for the header
             d = _s.data.databox()
 
             # Set the source channel
@@ -254,26 +424,25 @@ class sillyscope_api(_visa_tools.visa_api_base):
 
             # Get the waveform header
 
+            # If the previous header is still valid, use it
+            if use_previous_header == 'auto': self.get_header_cached(d)
+
             # If we're using the previous header, just load in the values
-            if use_previous_header:
+            elif use_previous_header:
                 d.update_headers(self.previous_header[channel])
 
             # Otherwise, get a new header from the instrument.
             else: self.get_header(d)
 
-            # If we're supposed to include time, add the time column
-            if include_x:
-                d['x'] = _n.arange(0, len(v), 1)
-                d['x'] = d.h('xmultiplier'+c)*(d['x'])
+            # Store it all
+            w.add_channel(channel, v, d.headers, *self._raw_to_counts())
 
-            # If we're converting to float voltages
-            if convert_to_float:
-                d['y'+c] = d.h('yzero'+c) + d.h('ymultiplier'+c)*(v)
-            else:
-                d['y'+c] = v
+        # Build the databox, unless we're keeping it compact
+        if not compact:
+            d = w.to_databox(convert_to_float=convert_to_float, include_x=include_x)
 
         # Set the binary mode
-        if not binary == None: d.h(SPINMOB_BINARY=binary)
+        if not binary == None and not compact: d.h(SPINMOB_BINARY=binary)
 
         # For duty cycle calculation
         t3 = _t.time()
@@ -282,12 +451,289 @@ class sillyscope_api(_visa_tools.visa_api_base):
         else:       print("WARNING: get_waveform() total time == 0")
 
         # Note the duty cycle.
-        d.h(transfer_duty_cycle=self.transfer_duty_cycle)
+        if compact: w.headers['transfer_duty_cycle'] = self.transfer_duty_cycle
+        else:       d.h(transfer_duty_cycle=self.transfer_duty_cycle)
 
         _debug('get_waveform() complete')
         # End of getting arrays and header information
+        if compact: return w
+        else:       return d
+
+    def get_waveforms(self, channels=[1,2,3,4], convert_to_float=True, include_x=True, use_previous_header=False, binary=None, compact=False):
+        """
+        Queries the device for the currently shown data from all the specified
+        channels in one pass, returning a single databox with columns 'x',
+        'y1', 'y2', ... and the header information for every channel (see
+        get_waveform() for the header conventions).
+
+        For Tektronix scopes, the source selection, preamble and curve
+        queries for all channels are sent as one concatenated message and
+        the response is decoded at once, avoiding most of the round trips
+        of calling get_waveform() for each channel. For RIGOL scopes, the
+        per-channel queries are sent back-to-back and decoded at the end
+        (RIGOLZ headers come from a single :WAV:PRE? query).
+
+        This function sets self.t_get_waveforms to the total time of the
+        call in seconds and self.waveforms_per_second to the number of
+        channels transferred per second.
+
+        Parameters
+        ----------
+        channels=[1,2,3,4]
+            List of channels to query.
+
+        convert_to_float=True
+            If True, convert the returned integers to floating point based on the
+            scope range. If False, just return the integers.
+
+        include_x=True
+            Whether to also generate a column of data for the x-values. These
+            are based on the first channel in the list.
+
+        use_previous_header=False
+            If True, this will not query the waveform preamble / header
+            information, using self.previous_header instead. If 'auto', the
+            previous header is used when get_header_cached() finds it still
+            valid. Tektronix headers are always queried in this case, since
+            they ride along in the same message at no extra round trips.
+
+        binary=None
+            Can be set to any of the allowed databox (numpy), e.g. binary='float32',
+            which will set the databox to this binary mode.
+
+        compact=False
+            If True, return a sillyscope_waveforms object instead of a databox
+            (see get_waveform()).
+        """
+        _debug('get_waveforms()', channels)
+
+        # For duty cycle calculation
+        t0 = _t.time()
+
+        # Storage for the raw data and header
+        w = sillyscope_waveforms()
+        channels = list(channels)
+        if len(channels) == 0:
+            if compact: return w
+            else:       return w.to_databox()
+
+        # Simulation mode and the deep-record MDO scopes (which need the
+        # number of points for each channel) get one channel at a time.
+        if self.instrument == None or self.model == 'TEKTRONIX' and 'MDO' in self.idn:
+
+            t1 = _t.time()
+            for channel in channels:
+                w.update(self.get_waveform(channel, use_previous_header=use_previous_header, compact=True))
+            t2 = _t.time()
+
+        # Real deal
+        else:
+
+            # Transfer the waveforms (and headers) for all the channels
+            t1 = _t.time()
+            vs = self._query_and_decode_waveforms(channels, use_previous_header)
+            t2 = _t.time()
+            w.headers.update(dict(seconds_pre_waveform_query=t1, seconds_post_waveform_query=t2))
+
+            # Calibration from the (possibly just updated) previous headers
+            for channel, v in zip(channels, vs):
+                w.add_channel(channel, v, self.previous_header[channel], *self._raw_to_counts())
+
+        # Build the databox, unless we're keeping it compact
+        if not compact:
+            d = w.to_databox(convert_to_float=convert_to_float, include_x=include_x)
+
+            # Set the binary mode
+            if not binary == None: d.h(SPINMOB_BINARY=binary)
+
+        # Timing
+        t3 = _t.time()
+        self.t_get_waveforms = t3-t0
+        if t3-t0>0:
+            self.transfer_duty_cycle   = (t2-t1)/self.t_get_waveforms
+            self.waveforms_per_second = len(channels)/self.t_get_waveforms
+        else: print("WARNING: get_waveforms() total time == 0")
+
+        # Note the duty cycle.
+        if compact:
+            w.headers['transfer_duty_cycle'] = self.transfer_duty_cycle
+            return w
+
+        d.h(transfer_duty_cycle=self.transfer_duty_cycle)
+
+        _debug('get_waveforms() complete')
         return d
 
+    def get_waveform_memory(self, channel=1, path=None, use_previous_header=False, chunk_size=None, progress=None):
+        """
+        Transfers the full acquisition memory (rather than just the screen
+        data) of the specified channel in chunks, returning a
+        sillyscope_waveforms object. For TEKTRONIX, this steps DATA:STAR and
+        DATA:STOP through the record. For RIGOLZ, this stops the scope and
+        uses :WAV:MODE RAW with :WAV:STAR and :WAV:STOP. Afterward, the
+        previous DATA:STAR / DATA:STOP (or :WAV:MODE, :WAV:STAR, :WAV:STOP and
+        run state) are put back, even if the transfer fails. Other models
+        fall back to the screen data from get_waveform(compact=True).
+
+        Returns None if a chunk times out (removing the partial file, if any).
+
+        Parameters
+        ----------
+        channel=1
+            Which channel to transfer.
+
+        path=None
+            If not None, write the samples to this file as they arrive (in the
+            spinmob binary databox format, with all the header information,
+            so spinmob.data.load() or the sillyscope can open it), and return a
+            sillyscope_waveforms object whose samples are memory-mapped from
+            the file. Memory use then stays at about one chunk, regardless of
+            the record length. Otherwise, the samples are decoded into one
+            preallocated array (1 byte per point).
+
+        use_previous_header=False
+            Same as for get_waveform(). RIGOLZ always uses the (raw mode)
+            preamble.
+
+        chunk_size=None
+            Number of points per transfer. None means use self.chunk_size.
+
+        progress=None
+            Optional function called as progress(n, N) after each chunk, where
+            n of the N points have been transferred.
+        """
+        _debug('get_waveform_memory()', channel, path)
+
+        if chunk_size is None: chunk_size = self.chunk_size
+        c = str(channel)
+
+        # Unsupported models
+        if self.instrument != None and not self.model in ['TEKTRONIX', 'RIGOLZ']:
+            print('ERROR: get_waveform_memory() unhandled model '+str(self.model)+', getting the screen data instead.')
+            return self.get_waveform(channel, use_previous_header=use_previous_header, compact=True)
+
+        # Databox for the header
+        h = _s.data.databox()
+
+        # Settings to put back afterward
+        saved = self._get_memory_settings(channel)
+
+        f   = None
+        raw = None
+        try:
+
+            # Simulation mode
+            if self.instrument == None:
+                N = self._simulation_memory_points
+                h.update_headers({'xzero'+c:0, 'xmultiplier'+c:1e-6, 'yzero'+c:0, 'ymultiplier'+c:0.1})
+
+            # Record length and header
+            elif self.model == 'TEKTRONIX':
+                N = int(float(self.query('HOR:RECO?')))
+
+                if   use_previous_header == 'auto': self.get_header_cached(h)
+                elif use_previous_header:           h.update_headers(self.previous_header[channel])
+                else:                               self.get_header(h)
+
+            elif self.model == 'RIGOLZ':
+                self.write(':STOP')
+                self.write(':WAV:MODE RAW')
+
+                # format,type,points,count,xinc,xorigin,xref,yinc,yorigin,yref
+                p = self.query(':WAV:PRE?').split(',')
+                N = int(p[2])
+                h.update_headers({'xzero'+c:0, 'xmultiplier'+c:float(p[4]), 'yzero'+c:self._rigolz_yzero(p), 'ymultiplier'+c:float(p[7])})
+
+            # Raw sample format
+            zero, sign = self._raw_to_counts()
+            if self.model == 'RIGOLZ': dtype = _n.uint8
+            else:                      dtype = _n.int8
+            h.h(**{'raw_zero'+c:zero, 'raw_sign'+c:sign})
+            headers = dict(h.headers)
+
+            # Stream to disk: header, then a single binary column
+            if path:
+                h.h(SPINMOB_BINARY=_n.dtype(dtype).name)
+                h.save_file(path, header_only=True)
+                f = open(path, 'ab')
+                f.write(('SPINMOB_BINARY\n'+'y'+c+'\t'+str((N,))+'\n').encode())
+                offset = f.tell()
+
+            # Transfer it all
+            raw = self._transfer_chunks(N, dtype, chunk_size, f, progress)
+
+        finally:
+            if f:
+                f.close()
+
+                # Don't leave a truncated file behind
+                if raw is None: _os.remove(path)
+
+            self._set_memory_settings(saved)
+
+        if raw is None: return None
+
+        # Finish the file and map it
+        if f:
+            f = open(path, 'ab')
+            f.write(b'\n')
+            f.close()
+            raw = _n.memmap(path, dtype, 'r', offset, (N,))
+
+        _debug('get_waveform_memory() complete')
+        return sillyscope_waveforms().add_channel(channel, raw, headers, zero, sign)
+
+    def _get_memory_settings(self, channel):
+        """
+        Selects the channel and returns a dictionary of the settings that
+        get_waveform_memory() changes (None in simulation mode), for
+        self._set_memory_settings().
+        """
+        if self.instrument == None: return None
+        self.set_channel(channel)
+
+        if self.model == 'TEKTRONIX':
+            return dict(start = int(float(self.query('DATA:STAR?'))),
+                        stop  = int(float(self.query('DATA:STOP?'))))
+
+        elif self.model == 'RIGOLZ':
+            s = dict(status = self.query(':TRIG:STAT?').strip(),
+                     mode   = self.query(':WAV:MODE?').strip(),
+                     start  = int(float(self.query(':WAV:STAR?'))),
+                     stop   = int(float(self.query(':WAV:STOP?'))))
+
+            # Whether to resume with :RUN or re-arm a single trigger
+            if s['status'] != 'STOP': s['sweep'] = self.query(':TRIG:SWE?').strip()
+            return s
+
+    def _set_memory_settings(self, s):
+        """
+        Puts back the settings returned by self._get_memory_settings().
+        """
+        if s is None: return
+
+        if self.model == 'TEKTRONIX':
+            self.write(':DATA:STAR %d;:DATA:STOP %d' % (s['start'], s['stop']))
+
+        elif self.model == 'RIGOLZ':
+            self.write(':WAV:MODE '+s['mode'])
+            self.write(':WAV:STAR %d' % s['start'])
+            self.write(':WAV:STOP %d' % s['stop'])
+
+            # Resume acquisition if it was running
+            if   s['status'] == 'STOP':                 pass
+            elif s['sweep'].upper().startswith('SING'): self.write(':SING')
+            else:                                       self.write(':RUN')
+
+    def _rigolz_yzero(self, p):
+        """
+        Returns the yzero header value for RIGOLZ from the :WAV:PRE? values p
+        (format,type,points,count,xinc,xorigin,xref,yinc,yorigin,yref). The
+        voltage is (raw-yorigin-yref)*yinc, and the counts are raw-127
+        (see _raw_to_counts()).
+        """
+        return -(float(p[8])+float(p[9])-127)*float(p[7])
+
     def trigger_single(self):
         """
         After calling self.set_mode_single_trigger(), you can call this to
@@ -369,35 +815,80 @@ class sillyscope_api(_visa_tools.visa_api_base):
         elif self.model in ['RIGOLZ']:
             _debug('  RIGOLZ')
 
-            # Convert the yoffset to the Tek format
-            xinc = float(self.query(':WAV:XINC?'))
-            yinc = float(self.query(':WAV:YINC?'))
+            # Convert the offsets to the Tek format, from one preamble query
+            # format,type,points,count,xinc,xorigin,xref,yinc,yorigin,yref
+            p = self.query(':WAV:PRE?').split(',')
 
-            d.insert_header('xzero'+c,       0)#-float(self.query(':WAV:XOR?')))
-            d.insert_header('xmultiplier'+c, xinc)
-            d.insert_header('yzero'+c,       -float(self.query(':WAV:YOR?'))*yinc)
-            d.insert_header('ymultiplier'+c, yinc)
+            d.insert_header('xzero'+c,       0)#-float(p[5]))
+            d.insert_header('xmultiplier'+c, float(p[4]))
+            d.insert_header('yzero'+c,       self._rigolz_yzero(p))
+            d.insert_header('ymultiplier'+c, float(p[7]))
 
         else:
             print('ERROR: get_header() unhandled model '+str(self.model))
 
         _debug('  Done with model-specifics.')
 
-        # Remember these settings for later.
+        # Remember these settings for later. The fingerprint (if any) of the
+        # old settings no longer describes them; see get_header_cached().
         self.previous_header[self._channel].update(d.headers)
+        self.header_fingerprint.pop(self._channel, None)
+
+        return d
+
+    def get_header_fingerprint(self):
+        """
+        Returns a string from a single cheap query that changes whenever the
+        header of the current channel (see set_channel()) changes, or None if
+        there is no query cheaper than get_header() for this model.
+
+        TEKTRONIX: waveform ID (coupling, V/div, s/div, points, mode) and
+        vertical offset, in one concatenated query.
+
+        RIGOLZ: the :WAV:PRE? preamble.
+        """
+        _debug('get_header_fingerprint()')
+
+        if   self.model in ['TEKTRONIX']: return self.query(':WFMP:WFID?;:WFMP:YOF?').strip()
+        elif self.model in ['RIGOLZ']:    return self.query(':WAV:PRE?').strip()
+
+        # The RIGOLDE/B headers are themselves just scale and offset queries.
+        else: return None
+
+    def get_header_cached(self, d=None):
+        """
+        Same as get_header(), but first queries get_header_fingerprint() and,
+        if it matches that of the previous get_header_cached() for this channel,
+        loads self.previous_header instead of re-fetching everything.
+        If d=None, creates a databox.
+        """
+        _debug('get_header_cached()')
+
+        if d==None: d = _s.data.databox()
+
+        # Compare with the last one
+        f = self.get_header_fingerprint()
+        if f != None and f == self.header_fingerprint.get(self._channel):
+            d.update_headers(self.previous_header[self._channel])
+
+        # Something changed (or can't tell)
+        else:
+            self.get_header(d)
+            self.header_fingerprint[self._channel] = f
 
         return d
 
 
     def _query_and_decode_waveform(self):
         """
-        Queries and then parses the waveform, returning the array of (int8)
-        voltages. Prior to calling this, make sure the scope is ready to
-        transfer and you've run self.set_channel().
+        Queries and then parses the waveform, returning the array of raw
+        samples (int8 for Tektronix, uint8 for RIGOL; see _raw_to_counts()).
+        Prior to calling this, make sure the scope is ready to transfer and
+        you've run self.set_channel().
         """
         _debug('_query_and_decode_waveform()')
 
-        empty = _n.array([], dtype=_n.float16)
+        empty = _n.array([], dtype=_n.int8)
 
         if self.model in ['TEKTRONIX']:
 
@@ -412,6 +903,15 @@ class sillyscope_api(_visa_tools.visa_api_base):
                 # but header/verbose settings can change length, so look for entry ending with 'points'
                 # and extract number from that.
                 n_pts = int([str for str in query.split(', ') if 'points' in str][0].split(' ')[0])
+
+                # Deep records in chunks, putting DATA:STAR / DATA:STOP back
+                if n_pts > self.chunk_size:
+                    saved = self._get_memory_settings(self._channel)
+                    try:     v = self._transfer_chunks(n_pts, _n.int8, self.chunk_size)
+                    finally: self._set_memory_settings(saved)
+                    if v is None: return empty
+                    else:         return v
+
                 # Set number of points to acquire to be the full waveform
                 self.write('DATA:STAR 1')
                 self.write('DATA:STOP %d' % n_pts)
@@ -433,7 +933,7 @@ class sillyscope_api(_visa_tools.visa_api_base):
             N = int(int(s[2:2+n].decode())/width)
 
             # Convert to an array of integers
-            return _n.float16(_n.frombuffer(s[2+n:2+n+N*width],_n.int8))
+            return _n.frombuffer(s[2+n:2+n+N*width],_n.int8)
 
 
         elif self.model in ['RIGOLDE']:
@@ -453,8 +953,8 @@ class sillyscope_api(_visa_tools.visa_api_base):
             N = int(s[2:2+n].decode())
             _debug(N)
 
-            # Determined from measured results
-            return 125 - _n.float16(_n.frombuffer(s[2+n:2+n+N], _n.uint8))
+            # Raw values; see _raw_to_counts()
+            return _n.frombuffer(s[2+n:2+n+N], _n.uint8)
 
 
         elif self.model in ['RIGOLB']:
@@ -475,8 +975,8 @@ class sillyscope_api(_visa_tools.visa_api_base):
             N = int(s[2:2+n].decode())
             _debug(N)
 
-            # Convert it to integers, this code is based on empirically measuring.
-            return 99 - _n.float16(_n.frombuffer(s[2+n:2+n+N], _n.uint8))
+            # Raw values; see _raw_to_counts()
+            return _n.frombuffer(s[2+n:2+n+N], _n.uint8)
 
 
         elif self.model in ['RIGOLZ']:
@@ -497,10 +997,185 @@ class sillyscope_api(_visa_tools.visa_api_base):
             N = int(s[2:2+n].decode())
             _debug(N)
 
-            # Convert it to an array of integers.
-            # This hits the rails properly on the DS1074Z, but is one step off from
-            # The values reported on the main screen.
-            return _n.float16(_n.frombuffer(s[2+n:2+n+N], _n.uint8)) - 127
+            # Raw values; see _raw_to_counts()
+            return _n.frombuffer(s[2+n:2+n+N], _n.uint8)
+
+    def _raw_to_counts(self):
+        """
+        Returns (raw_zero, raw_sign) for this model, such that the 8-bit
+        counts used by the header conventions are raw_zero + raw_sign*raw.
+        """
+        if   self.model == 'RIGOLDE': return 125, -1 # Determined from measured results
+        elif self.model == 'RIGOLB':  return  99, -1 # Based on empirically measuring
+        elif self.model == 'RIGOLZ':  return -127, 1 # Hits the rails on the DS1074Z, but is one step off from the screen
+        else:                         return 0,    1
+
+    def _query_and_decode_waveforms(self, channels=[1,2,3,4], use_previous_header=False):
+        """
+        Queries all the specified channels (and, unless use_previous_header=True,
+        their headers, which are stored in self.previous_header) and decodes
+        them in one pass, returning a list of raw sample arrays like those of
+        self._query_and_decode_waveform(). use_previous_header='auto' behaves
+        like get_waveforms().
+        """
+        _debug('_query_and_decode_waveforms()', channels)
+
+        empty = _n.array([], dtype=_n.int8)
+
+        # Raw blocks for each channel
+        blocks = []
+
+        # Whether to query the full header
+        get_header = use_previous_header in [False, 'auto']
+
+        if self.model in ['TEKTRONIX']:
+
+            # One message for everything
+            m = []
+            for channel in channels:
+                m.append(':DATA:SOURCE CH%d' % channel)
+                if get_header: m += [':WFMP:YMUL?', ':WFMP:XIN?', ':WFMP:YOF?']
+                m.append(':CURV?')
+
+            # Ask for the waveforms and read the response
+            try:
+                self.write(';'.join(m))
+                s = self.read_raw()
+
+            except:
+                print('ERROR: Timeout getting curves.')
+                return [empty]*len(channels)
+
+            # Step through the semicolon-separated responses
+            i = 0
+            for channel in channels:
+                c = str(channel)
+
+                # Preamble values
+                if get_header:
+                    p = []
+                    for k in range(3):
+                        j = s.index(b';', i)
+                        p.append(float(s[i:j].decode()))
+                        i = j+1
+                    yinc, xinc, yoff = p
+                    self.header_fingerprint.pop(channel, None)
+                    self.previous_header[channel].update({
+                        'xzero'+c       : 0,
+                        'xmultiplier'+c : xinc,
+                        'yzero'+c       : -yoff*yinc,
+                        'ymultiplier'+c : yinc})
+
+                # Curve block, skipping the following semicolon
+                b, i = self._split_block(s, i)
+                blocks.append(b)
+                i += 1
+
+        elif self.model in ['RIGOLDE', 'RIGOLB', 'RIGOLZ']:
+
+            for channel in channels:
+
+                # Select the channel and ask for the data
+                self.set_channel(channel)
+                try:
+                    if self.model == 'RIGOLDE': self.write(':WAV:DATA? CHAN%d' % channel)
+                    else:                       self.write(':WAV:DATA?')
+                    s = self.read_raw()
+
+                except:
+                    print('ERROR: Timeout getting curve.')
+                    s = b'#10'
+                blocks.append(self._split_block(s)[0])
+
+                # Get the header
+                if not get_header: continue
+                if self.model == 'RIGOLZ':
+
+                    # format,type,points,count,xinc,xorigin,xref,yinc,yorigin,yref
+                    # (this is also the fingerprint; see get_header_fingerprint())
+                    f = self.query(':WAV:PRE?').strip()
+                    p = f.split(',')
+                    c = str(channel)
+                    self.header_fingerprint[channel] = f
+                    self.previous_header[channel].update({
+                        'xzero'+c       : 0,
+                        'xmultiplier'+c : float(p[4]),
+                        'yzero'+c       : self._rigolz_yzero(p),
+                        'ymultiplier'+c : float(p[7])})
+
+                elif use_previous_header == 'auto': self.get_header_cached()
+                else:                               self.get_header()
+
+        else:
+            print('ERROR: _query_and_decode_waveforms() unhandled model '+str(self.model))
+            return [empty]*len(channels)
+
+        # Decode everything at the end (see _raw_to_counts())
+        if self.model == 'TEKTRONIX': return [_n.frombuffer(b, _n.int8)  for b in blocks]
+        else:                         return [_n.frombuffer(b, _n.uint8) for b in blocks]
+
+    def _split_block(self, s, i=0):
+        """
+        Finds the binary block '#nN...<data>' starting at index i of the
+        response s, returning the data bytes and the index just after the block.
+        """
+        # Skip anything before the block (e.g. a newline)
+        i = s.index(b'#', i)
+
+        # Number of characters describing the number of points, then the number of points
+        n = int(s[i+1:i+2].decode())
+        N = int(s[i+2:i+2+n].decode())
+
+        return s[i+2+n:i+2+n+N], i+2+n+N
+
+    def _transfer_chunks(self, N, dtype, chunk_size, f=None, progress=None):
+        """
+        Transfers points 1 to N of the current channel chunk_size points at
+        a time (DATA:STAR / DATA:STOP for TEKTRONIX, :WAV:STAR / :WAV:STOP
+        for RIGOLZ, which must already be in the desired :WAV:MODE), decoding
+        them into a preallocated array of the specified dtype or, if f is an
+        open file, writing them to f. Returns the array (True when writing to
+        f), or None if a chunk fails. progress is as for get_waveform_memory().
+        """
+        _debug('_transfer_chunks()', N, chunk_size)
+
+        if f is None: raw = _n.empty(N, dtype)
+
+        for n1 in range(0, N, chunk_size):
+            n2 = min(n1+chunk_size, N)
+
+            # Simulation mode
+            if self.instrument == None:
+                b = _n.random.randint(-100, 100, n2-n1).astype(dtype).tobytes()
+                _t.sleep(self._simulation_sleep)
+
+            # Ask for this chunk
+            else:
+                try:
+                    if self.model == 'TEKTRONIX':
+                        self.write(':DATA:STAR %d;:DATA:STOP %d;:CURV?' % (n1+1, n2))
+                    else:
+                        self.write(':WAV:STAR %d' % (n1+1))
+                        self.write(':WAV:STOP %d' % n2)
+                        self.write(':WAV:DATA?')
+                    b = self._split_block(self.read_raw())[0]
+
+                except:
+                    print('ERROR: Timeout getting points %d to %d.' % (n1+1, n2))
+                    return None
+
+                if len(b) != n2-n1:
+                    print('ERROR: Got %d points instead of %d.' % (len(b), n2-n1))
+                    return None
+
+            # Store it
+            if f is None: raw[n1:n2] = _n.frombuffer(b, dtype)
+            else:         f.write(b)
+
+            if progress: progress(n2, N)
+
+        if f is None: return raw
+        else:         return True
 
 
     def set_binary_encoding(self):
@@ -609,6 +1284,20 @@ class sillyscope(_visa_tools.visa_gui_base):
         # Keep track of previous plot
         self._previous_data = _s.data.databox()
 
+        # All data accessed by the background acquisition thread lives in this
+        # dictionary. If you're using this dictionary, make sure to lock the thread!
+        self._shared = dict(acquiring=False, status=None, shots=[])
+        self._thread_locker = _s.thread.locker()
+        self._signal_thread_done = _s.thread.signal(self._thread_acquire_done)
+        self.timer_drain = _g.Timer(50, signal_tick=self._timer_drain_tick)
+        self._draining   = False
+
+        # Whether the background thread is alive (it owns the scope until
+        # self._thread_acquire_done() is called), and whether it finished
+        # while we were in the middle of processing shots
+        self._thread_running = False
+        self._thread_done_pending = False
+
         # Settings format
         self.settings.set_width(240)
 
@@ -617,7 +1306,14 @@ class sillyscope(_visa_tools.visa_gui_base):
         self.settings.add_parameter('Acquire/Trigger',          False, tip='Halt acquisition and arm / wait for a single trigger.')
         self.settings.add_parameter('Acquire/Get_First_Header', True,  tip='Get the header (calibration) information the first time. Disabling this will return uncalibrated data.')
         self.settings.add_parameter('Acquire/Get_All_Headers',  True,  tip='Get the header (calibration) information EVERY time. Disabling this will use the first header repeatedly.')
+        self.settings.add_parameter('Acquire/Cache_Headers',    True,  tip='When getting all headers, perform one cheap query to see if the scope settings changed, and only then get the header again.')
         self.settings.add_parameter('Acquire/Discard_Identical',False, tip='Do not continue until the data is different.')
+        self.settings.add_parameter('Acquire/Pipelined',        True,  tip='Transfer all enabled channels in one pipelined query / decode pass rather than one at a time.')
+
+        # Background acquisition settings
+        self.settings.add_parameter('Acquire/Background/Enabled',        False, tip='Acquire in a separate thread that owns the scope and queues the shots, while this window plots, saves, and analyzes them at its own pace. The other settings are read when acquisition starts.')
+        self.settings.add_parameter('Acquire/Background/Queue_Size',     4,     bounds=(1,None), tip='How many shots can wait to be processed before the thread pauses.')
+        self.settings.add_parameter('Acquire/Background/Frame_Interval', 0.05,  bounds=(1e-3,10), siPrefix=True, suffix='s', dec=True, tip='How often the window processes the queued shots. Only the last shot of each frame is plotted.')
 
         # Device-specific settings
         self.settings.add_parameter('Acquire/RIGOL1000BDE/Trigger_Delay', 0.05, bounds=(1e-3,10), siPrefix=True, suffix='s', dec=True, tip='How long after "trigger" command to wait before checking status. Some scopes appear to be done for a moment between the trigger command and arming.')
@@ -705,6 +1401,10 @@ class sillyscope(_visa_tools.visa_gui_base):
         """
         Called when someone clicks the Trigger checkbox.
         """
+        # The background thread owns the scope (and has its own copy of the
+        # settings); the new value is applied at the start of the next run.
+        if self._thread_running: return
+
         if self.settings['Acquire/Trigger']:
             self.api.set_mode_single_trigger()
             self.unlock()
@@ -761,6 +1461,12 @@ class sillyscope(_visa_tools.visa_gui_base):
                   or self.settings['Acquire/Get_First_Header'] \
                  and self.number_count.get_value() == 0
 
+        # Only re-fetch when the settings change
+        if self.settings['Acquire/Get_All_Headers'] and self.settings['Acquire/Cache_Headers']:
+            use_previous_header = 'auto'
+        else:
+            use_previous_header = not get_header
+
         # Tell the user we're getting data
         self.button_transfer.set_checked(True)
         self.window.process_events()
@@ -777,53 +1483,28 @@ class sillyscope(_visa_tools.visa_gui_base):
         # Clear the raw plot
         self.plot_raw.clear()
 
-        # If we're supposed to get curve 1
-        if self.button_1.get_value():
+        # Enabled channels
+        channels = [n for n in [1,2,3,4] if getattr(self, 'button_%d'%n).get_value()]
 
-            # Actually get it.
-            d = self.api.get_waveform(1, use_previous_header=not get_header)
+        # Get them all in one go
+        if self.settings['Acquire/Pipelined']:
 
-            # Update the main plot
-            self.plot_raw['x']  = d['x']
-            self.plot_raw['y1'] = d['y1']
-            self.plot_raw.copy_headers(d)
+            w = self.api.get_waveforms(channels, use_previous_header=use_previous_header, compact=True)
+            w.to_databox(self.plot_raw)
             self.window.process_events()
 
-        # If we're supposed to get curve 2
-        if self.button_2.get_value():
-
-            # Actually get it
-            d = self.api.get_waveform(2, use_previous_header=not get_header)
-
-            # Update the main plot
-            self.plot_raw['x']  = d['x']
-            self.plot_raw['y2'] = d['y2']
-            self.plot_raw.copy_headers(d)
-            self.window.process_events()
-
-        # If we're supposed to get curve 2
-        if self.button_3.get_value():
-
-            # Actually get it
-            d = self.api.get_waveform(3, use_previous_header=not get_header)
-
-            # Update the main plot
-            self.plot_raw['x']  = d['x']
-            self.plot_raw['y3'] = d['y3']
-            self.plot_raw.copy_headers(d)
-            self.window.process_events()
-
-        # If we're supposed to get curve 2
-        if self.button_4.get_value():
+        # One at a time
+        else:
+            for n in channels:
 
-            # Actually get it
-            d = self.api.get_waveform(4, use_previous_header=not get_header)
+                # Actually get it.
+                d = self.api.get_waveform(n, use_previous_header=use_previous_header)
 
-            # Update the main plot
-            self.plot_raw['x']  = d['x']
-            self.plot_raw['y4'] = d['y4']
-            self.plot_raw.copy_headers(d)
-            self.window.process_events()
+                # Update the main plot
+                self.plot_raw['x']     = d['x']
+                self.plot_raw['y%d'%n] = d['y%d'%n]
+                self.plot_raw.copy_headers(d)
+                self.window.process_events()
 
         # Tell the user we're done transferring data
         self.button_transfer.set_checked(False)
@@ -923,37 +1604,44 @@ class sillyscope(_visa_tools.visa_gui_base):
                    self.get_waveforms(plot=False)
                    _debug('  got '+str(self.plot_raw))
 
-            _debug('  processing')
+            self._process_shot()
 
-            # Increment the counter, but only if the data is new
-            self.number_count.increment()
+    def _process_shot(self, plot=True):
+        """
+        Counts, plots, saves, and analyzes the shot in self.plot_raw, and
+        checks the end condition.
+        """
+        _debug('  processing')
 
-            # Decrement if it's identical to the previous trace
-            is_identical=False
-            if self.settings['Acquire/Discard_Identical']:
-                is_identical = self.plot_raw.is_same_as(self._previous_data, headers=False)
-                _debug('  Is identical to previous?', is_identical)
-                if is_identical: self.number_count.increment(-1)
+        # Increment the counter, but only if the data is new
+        self.number_count.increment()
 
-            # Transfer all the header info
-            self.settings.send_to_databox_header(self.plot_raw)
+        # Decrement if it's identical to the previous trace
+        is_identical=False
+        if self.settings['Acquire/Discard_Identical']:
+            is_identical = self.plot_raw.is_same_as(self._previous_data, headers=False)
+            _debug('  Is identical to previous?', is_identical)
+            if is_identical: self.number_count.increment(-1)
 
-            # Update the plot
-            _debug('  plotting', len(self.plot_raw[0]), len(self.plot_raw[1]))
-            self.plot_raw.plot()
-            if not is_identical: self.plot_raw.autosave()
+        # Transfer all the header info
+        self.settings.send_to_databox_header(self.plot_raw)
 
-            _debug('  plotting done')
-            self.window.process_events()
+        # Update the plot
+        _debug('  plotting', len(self.plot_raw[0]), len(self.plot_raw[1]))
+        if plot: self.plot_raw.plot()
+        if not is_identical: self.plot_raw.autosave()
+
+        _debug('  plotting done')
+        self.window.process_events()
 
-            # External analysis
-            self.process_data()
+        # External analysis
+        self.process_data()
 
-            # End condition
-            _debug('  checking end condition')
-            N = self.settings['Acquire/Iterations']
-            if self.number_count.get_value() >= N and not N <= 0:
-                self.button_acquire.set_checked(False)
+        # End condition
+        _debug('  checking end condition')
+        N = self.settings['Acquire/Iterations']
+        if self.number_count.get_value() >= N and not N <= 0:
+            self.button_acquire.set_checked(False)
 
     def _post_acquisition(self):
         """
@@ -971,8 +1659,21 @@ class sillyscope(_visa_tools.visa_gui_base):
         """
         _debug('_button_acquire_clicked()')
 
-        # Don't double-loop!
-        if not self.button_acquire.is_checked(): return
+        # Don't double-loop! This also tells the background thread to stop;
+        # it calls self._thread_acquire_done() when it's finished, and until
+        # then, Acquire stays disabled.
+        if not self.button_acquire.is_checked():
+            self._thread_locker.lock()
+            self._shared['acquiring'] = False
+            self._thread_locker.unlock()
+            if self._thread_running: self.button_acquire.disable()
+            return
+
+        # The background thread is still finishing up and owns the scope
+        # (only possible from code, since the button is disabled)
+        if self._thread_running:
+            self.button_acquire.set_checked(False, block_signals=True)
+            return
 
         # Don't proceed if we have no connection
         if self.api == None:
@@ -983,6 +1684,11 @@ class sillyscope(_visa_tools.visa_gui_base):
         # Set up the GUI and scope for acquisition.
         self._setup_acquisition()
 
+        # Let the background thread do the work.
+        if self.settings['Acquire/Background/Enabled']:
+            self._start_background_acquisition()
+            return
+
         _debug('  beginning loop')
 
         # Continue until unchecked
@@ -996,6 +1702,234 @@ class sillyscope(_visa_tools.visa_gui_base):
         self._post_acquisition()
         self.after_acquire_finished()
 
+    def _start_background_acquisition(self):
+        """
+        Passes the acquisition settings to self._shared and starts the
+        background thread and the timer that processes its shots.
+        """
+        _debug('_start_background_acquisition()')
+
+        # Enabled channels
+        channels = [n for n in [1,2,3,4] if getattr(self, 'button_%d'%n).get_value()]
+        if len(channels) == 0:
+            self.button_acquire.set_checked(False)
+            self._post_acquisition()
+            self.after_acquire_finished()
+            return
+
+        # Everything the thread needs to know
+        self._thread_locker.lock()
+        self._shared.update(dict(
+            acquiring = True,
+            status    = None,
+            shots     = [],
+            channels  = channels,
+            settings  = self.settings.get_dictionary(short_keys=True)[1]))
+        self._thread_locker.unlock()
+
+        # Start the consumer and producer
+        self._thread_running = True
+        self.timer_drain.set_interval(int(1000*self.settings['Acquire/Background/Frame_Interval']))
+        self.timer_drain.start()
+        _s.thread.start(self._thread_acquire, priority=2)
+
+    def _thread_acquire(self):
+        """
+        Background acquisition loop. This runs in its own thread, which owns
+        the scope until it finishes. Each shot is triggered / waited for as in
+        self._acquire_and_plot(), transferred as a compact sillyscope_waveforms
+        object, and appended to self._shared['shots'], pausing while the
+        queue is full.
+        """
+        # vvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvv
+        self._thread_locker.lock()
+        s        = self._shared['settings']
+        channels = self._shared['channels']
+        self._thread_locker.unlock()
+        # ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+        api = self.api
+        n   = 0
+        try:
+            while self._thread_status(None, s['Acquire/Background/Queue_Size']):
+
+                # Trigger and wait for it to finish
+                self._thread_status('waiting')
+                w = None
+                if s['Acquire/Trigger']:
+
+                    api.trigger_single() # For RigolZ, this clears the trace
+
+                    # Simulation mode: "wait" for it to finish
+                    if api.instrument == None: _t.sleep(api._simulation_sleep)
+
+                    # Actual scope: wait for it to finish
+                    else:
+                        while self._thread_status():
+                            finished, w = self._thread_is_finished(s, channels, n)
+                            if finished: break
+                            _t.sleep(0.02)
+
+                # Not triggering but RIGOLZ mode: clear the data first and then wait for data
+                elif api.model in ['RIGOLZ']:
+
+                    if s['Acquire/RIGOL1000Z/Always_Clear']: api.write(':CLE')
+
+                    while self._thread_status():
+                        finished, w = self._thread_is_finished(s, channels, n)
+                        if finished: break
+                        _t.sleep(0.005)
+
+                # Canceled
+                if not self._thread_status(): break
+
+                # Get the data if we don't already have it
+                self._thread_status('transfer')
+                if w is None: w = self._thread_get_waveforms(s, channels, n)
+
+                # Queue it up
+                self._thread_locker.lock()
+                self._shared['shots'].append(w)
+                self._thread_locker.unlock()
+                n += 1
+
+                # Done, unless we're waiting for non-identical data
+                N = s['Acquire/Iterations']
+                if N > 0 and n >= N and not s['Acquire/Discard_Identical']: break
+
+        except: _traceback.print_exc()
+
+        # Let the window know
+        self._thread_status(None)
+        self._signal_thread_done.emit(n)
+
+    def _thread_status(self, status=False, queue_size=None):
+        """
+        Thread-safe way to set self._shared['status'] (unless status=False)
+        and get self._shared['acquiring']. If queue_size is not None, first
+        waits until fewer than queue_size shots are queued.
+        """
+        while True:
+            self._thread_locker.lock()
+            if not status is False: self._shared['status'] = status
+            acquiring = self._shared['acquiring']
+            full = queue_size is not None and len(self._shared['shots']) >= queue_size
+            self._thread_locker.unlock()
+
+            if not full or not acquiring: return acquiring
+            _t.sleep(0.002)
+
+    def _thread_is_finished(self, s, channels, n):
+        """
+        Thread version of self.acquisition_is_finished(), returning
+        (finished, waveforms), where waveforms is the already-transferred data
+        for RIGOLZ scopes (otherwise None).
+        """
+        api = self.api
+
+        if api.model == 'TEKTRONIX':
+            return not bool(int(api.query('ACQ:STATE?'))), None
+
+        # If the waveforms are empty (we cleared it!)
+        elif api.model == 'RIGOLZ':
+            w = self._thread_get_waveforms(s, channels, n)
+            return len(w) > 0, w
+
+        elif api.model in ['RIGOLDE', 'RIGOLB']:
+            _t.sleep(s['Acquire/RIGOL1000BDE/Trigger_Delay'])
+            return api.query(':TRIG:STAT?').strip() == 'STOP', None
+
+        return True, None
+
+    def _thread_get_waveforms(self, s, channels, n):
+        """
+        Thread version of self.get_waveforms(), returning the n'th shot
+        as a sillyscope_waveforms object.
+        """
+        # Find out if we should get the header
+        if s['Acquire/Get_All_Headers'] and s['Acquire/Cache_Headers']:
+            use_previous_header = 'auto'
+        else:
+            use_previous_header = not (s['Acquire/Get_All_Headers'] or s['Acquire/Get_First_Header'] and n == 0)
+
+        # Get them all in one go
+        if s['Acquire/Pipelined']:
+            return self.api.get_waveforms(channels, use_previous_header=use_previous_header, compact=True)
+
+        # One at a time
+        w = sillyscope_waveforms()
+        for channel in channels:
+            w.update(self.api.get_waveform(channel, use_previous_header=use_previous_header, compact=True))
+        return w
+
+    def _timer_drain_tick(self, *a):
+        """
+        Processes all the shots queued by the background thread, plotting
+        only the last one.
+        """
+        # Don't re-enter from process_events()
+        if self._draining: return
+        self._draining = True
+
+        # vvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvvv
+        self._thread_locker.lock()
+        shots  = self._shared['shots']
+        status = self._shared['status']
+        self._shared['shots'] = []
+        self._thread_locker.unlock()
+        # ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+        # Update the user
+        self.button_onair   .set_checked(status == 'waiting')
+        self.button_transfer.set_checked(status == 'transfer')
+
+        for i in range(len(shots)):
+
+            # Canceled or finished
+            if not self.button_acquire.is_checked(): break
+
+            # Transfer the current data to the previous
+            self._previous_data.clear()
+            self._previous_data.copy_all(self.plot_raw)
+
+            # Stuff the new data into the plotter
+            self.plot_raw.clear()
+            shots[i].to_databox(self.plot_raw)
+
+            self._process_shot(plot = i == len(shots)-1)
+            self.after_acquire_iteration()
+
+        self._draining = False
+
+        # The thread finished during process_events() above
+        if self._thread_done_pending: self._thread_acquire_done()
+
+    def _thread_acquire_done(self, *a):
+        """
+        Called when the background acquisition thread is finished.
+        """
+        _debug('_thread_acquire_done()', a)
+
+        # Wait for the shots in hand to be processed (see _timer_drain_tick())
+        self._thread_done_pending = self._draining
+        if self._draining: return
+
+        # Process the stragglers
+        self.timer_drain.stop()
+        self._timer_drain_tick()
+
+        self.button_onair   .set_checked(False)
+        self.button_transfer.set_checked(False)
+
+        # The scope is free again
+        self._thread_running = False
+        self.button_acquire.set_checked(False, block_signals=True)
+        if self.api != None: self.button_acquire.enable()
+
+        # Fixes up the GUI and unlocks the scope
+        self._post_acquisition()
+        self.after_acquire_finished()
+
     def after_acquire_iteration(self):
         """
         Dummy function you can overwrite. Called after each acquisition iteration.
@@ -357,7 +357,7 @@ class fitting_statistics_demo():
                 
                 x2  = _n.linspace(min(0.5*(B[1]-B[0]),0.02), max(1.5,max(self.plot_parameters[0])), 400)
                 dof = self.plot_parameters[1][-1]
-                pdf = len(self.plot_parameters[1]) * dof * _stats.chi2.pdf(x2*dof,dof) * (B[1]-B[0])                
+                pdf = len(self.plot_parameters[1]) * _m.functions.reduced_chi2(x2,dof) * (B[1]-B[0])
                 self.axes_histograms[0].plot(x2,pdf,label='Expected ('+str(dof)+ 'DOF)')
                 self.axes_histograms[0].legend()
             
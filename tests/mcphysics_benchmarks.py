@@ -0,0 +1,606 @@
+import os        as _os
+import time      as _t
+import struct    as _struct
+import tempfile  as _tempfile
+import glob      as _glob
+import tracemalloc as _tracemalloc
+import numpy     as _n
+import spinmob   as _s
+import mcphysics as _m
+
+# Fake scope sessions shared with the unit tests
+from mcphysics_tests import fake_tek
+
+# Path to the data folder
+data_path = _os.path.join(_os.path.dirname(_m.__file__), 'tests', 'data')
+def path(filename):
+    """
+    Assembles a path to a particular file.
+    """
+    return _os.path.join(data_path, filename)
+
+def make_chn(chn_path, channels=16384, counts=None, template='signal.Chn'):
+    """
+    Writes a synthetic Maestro CHN file with the specified number of channels,
+    borrowing the header and trailer from one of the test data files.
+
+    Parameters
+    ----------
+    chn_path
+        Where to write the file.
+    channels=16384
+        Number of channels.
+    counts=None
+        Optional array of counts. If None, random Poisson counts are used.
+    template='signal.Chn'
+        Test data file supplying the header and trailer.
+    """
+    with open(path(template), 'rb') as fh: b = fh.read()
+    n = _struct.unpack('<h', b[30:32])[0]
+
+    if counts is None: counts = _n.random.poisson(100, channels)
+
+    with open(chn_path, 'wb') as fh:
+        fh.write(b[0:30] + _struct.pack('<h', channels))
+        fh.write(_n.asarray(counts, dtype='<u4').tobytes())
+        fh.write(b[32+4*n:])
+
+    return chn_path
+
+def timeit(f, repeat=5):
+    """
+    Returns the fastest of repeat calls to f() in seconds.
+    """
+    ts = []
+    for n in range(repeat):
+        t0 = _t.perf_counter()
+        f()
+        ts.append(_t.perf_counter()-t0)
+    return min(ts)
+
+
+
+
+def _load_chn_counts_loop(path):
+    """
+    Reference: the original channel-by-channel struct.unpack() decoder.
+    """
+    with open(path, 'rb') as fh: buffer = fh.read()
+    [channel_offset, channel_count] = _struct.unpack("hh",buffer[28:32])
+    spectrum = _n.zeros(channel_count,dtype=int)
+    for i in range(channel_count): [spectrum[i]] = _struct.unpack("I",buffer[32+4*i:36+4*i])
+    return spectrum
+
+def benchmark_load_chn(channels=16384):
+    """
+    Compares load_chn() against the original per-channel decoding loop.
+    """
+    with _tempfile.TemporaryDirectory() as d:
+        p = make_chn(_os.path.join(d, 'big.Chn'), channels)
+
+        t_loop = timeit(lambda: _load_chn_counts_loop(p))
+        t_new  = timeit(lambda: _m.data.load_chn(p))
+
+    print('load_chn (%d channels)' % channels)
+    print('  struct loop: %8.3f ms' % (1e3*t_loop))
+    print('  load_chn:    %8.3f ms  (%.0fx)' % (1e3*t_new, t_loop/t_new))
+
+def benchmark_load_chn_mmap(files=200, channels=16384, n1=1000, n2=1100):
+    """
+    Sums a small channel range from many files, comparing full loading with
+    the memory-mapped mode of load_chn().
+    """
+    def full(ps):
+        return sum([_m.data.load_chn(p)[1][n1:n2].sum() for p in ps])
+
+    def mapped(ps):
+        total = 0
+        for p in ps:
+            with _m.data.load_chn(p, mmap=True) as c: total += int(c.counts[n1:n2].sum())
+        return total
+
+    with _tempfile.TemporaryDirectory() as d:
+        ps = [make_chn(_os.path.join(d, '%05d.Chn' % n), channels) for n in range(files)]
+
+        t_full   = timeit(lambda: full(ps),   3)
+        t_mapped = timeit(lambda: mapped(ps), 3)
+
+    print('channels %d:%d from %d files' % (n1, n2, files))
+    print('  load_chn:           %8.3f ms' % (1e3*t_full))
+    print('  load_chn(mmap=True):%8.3f ms  (%.0fx)' % (1e3*t_mapped, t_full/t_mapped))
+
+def benchmark_load_chns_workers(files=1000, channels=16384, workers=[1,2,4,8]):
+    """
+    Loads a directory of CHN files with load_chns_directory() using
+    different numbers of thread and process workers.
+    """
+    print('load_chns_directory (%d files, %d channels, %d cpus)' % (files, channels, _os.cpu_count()))
+
+    with _tempfile.TemporaryDirectory() as d:
+        for n in range(files): make_chn(_os.path.join(d, '%05d.Chn' % n), channels)
+
+        for processes in [False, True]:
+            for w in workers:
+                t = timeit(lambda: _m.data.load_chns_directory(d, workers=w, processes=processes), 2)
+                print('  %s x %d: %8.1f ms (%6.0f files/s)' % ('processes' if processes else 'threads  ', w, 1e3*t, files/t))
+
+def benchmark_chn_index(files=2000, channels=16384):
+    """
+    Times building, refreshing, and querying a chn_index, compared with
+    loading every file to read its header.
+    """
+    with _tempfile.TemporaryDirectory() as d:
+        for n in range(files): make_chn(_os.path.join(d, '%05d.Chn' % n), channels)
+
+        t_load = timeit(lambda: [_m.data.load_chn(p).h('live_time') for p in _glob.glob(_os.path.join(d, '*.Chn'))], 1)
+
+        t0 = _t.perf_counter(); index = _m.data.chn_index(d); t_build = _t.perf_counter()-t0
+        t_update = timeit(lambda: _m.data.chn_index(d))
+        t_query  = timeit(lambda: index.query(date='2018-09-25', min_live_time=300))
+
+    print('chn_index (%d files, %d channels)' % (files, channels))
+    print('  load_chn all:   %8.1f ms' % (1e3*t_load))
+    print('  build index:    %8.1f ms' % (1e3*t_build))
+    print('  reopen + check: %8.1f ms' % (1e3*t_update))
+    print('  query:          %8.3f ms' % (1e3*t_query))
+
+def benchmark_chn_archive(files=1000, channels=16384):
+    """
+    Compares loading every spectrum from individual CHN files with reading
+    them back from a chn_archive.
+    """
+    with _tempfile.TemporaryDirectory() as d:
+        ps = [make_chn(_os.path.join(d, '%05d.Chn' % n), channels) for n in range(files)]
+
+        t0 = _t.perf_counter(); a = _m.data.chn_archive(_os.path.join(d, 'archive')).append(ps); t_write = _t.perf_counter()-t0
+
+        t_files   = timeit(lambda: _n.array([_m.data.load_chn(p)[1] for p in ps]), 1)
+        t_archive = timeit(lambda: _n.array(_m.data.chn_archive(_os.path.join(d, 'archive')).counts), 3)
+        t_row     = timeit(lambda: a[files//2])
+        del a
+
+    print('chn_archive (%d files, %d channels)' % (files, channels))
+    print('  write archive:     %8.1f ms' % (1e3*t_write))
+    print('  load_chn stack:    %8.1f ms' % (1e3*t_files))
+    print('  archive stack:     %8.1f ms  (%.0fx)' % (1e3*t_archive, t_files/t_archive))
+    print('  archive row -> databox: %8.3f ms' % (1e3*t_row))
+
+def benchmark_chn_watcher(files=1000, channels=16384):
+    """
+    Times a chn_watcher refresh after one new file arrives in a directory
+    that already holds many, compared with reloading the whole directory.
+    """
+    with _tempfile.TemporaryDirectory() as d:
+        for n in range(files): make_chn(_os.path.join(d, '%05d.Chn' % n), channels)
+
+        t0 = _t.perf_counter(); w = _m.data.chn_watcher(d, settle=0); t_initial = _t.perf_counter()-t0
+        t_reload = timeit(lambda: _m.data.load_chns_directory(d, combine=True), 1)
+
+        make_chn(_os.path.join(d, '%05d.Chn' % files), channels)
+        t0 = _t.perf_counter(); w.update(); t_new = _t.perf_counter()-t0
+        t_none = timeit(w.update)
+
+    print('chn_watcher (%d files, %d channels)' % (files, channels))
+    print('  initial ingest:          %8.1f ms' % (1e3*t_initial))
+    print('  load_chns_directory:     %8.1f ms' % (1e3*t_reload))
+    print('  update with 1 new file:  %8.1f ms' % (1e3*t_new))
+    print('  update with none:        %8.1f ms' % (1e3*t_none))
+
+def benchmark_calibrate_spectra(spectra=2000, channels=16384, bins=4000):
+    """
+    Compares calibrate_spectra() with a per-spectrum loop doing the same
+    calibration, rebinning, and live-time normalization.
+    """
+    counts = _n.random.poisson(10, (spectra, channels)).astype(_n.uint32)
+    live   = _n.random.uniform(100, 200, spectra)
+    coeffs = _n.array([_n.random.uniform(-5, 5, spectra), _n.random.uniform(0.49, 0.51, spectra)]).T
+    edges  = _n.linspace(0, 8000, bins+1)
+
+    def loop():
+        y = _n.empty((spectra, bins)); ey = _n.empty((spectra, bins))
+        for k in range(spectra):
+            E = coeffs[k,0] + coeffs[k,1]*(_n.arange(channels+1)-0.5)
+            cum = _n.concatenate([[0], _n.cumsum(counts[k])])
+            b = _n.diff(_n.interp(edges, E, cum))
+            y[k] = b/live[k]; ey[k] = _n.sqrt(b)/live[k]
+        return y, ey
+
+    t_loop  = timeit(loop, 1)
+    t_batch = timeit(lambda: _m.data.calibrate_spectra(counts, live, coeffs, edges), 1)
+
+    print('calibrate_spectra (%d spectra, %d channels -> %d bins)' % (spectra, channels, bins))
+    print('  per-spectrum loop: %8.1f ms' % (1e3*t_loop))
+    print('  calibrate_spectra: %8.1f ms  (%.1fx, with exact Poisson errors)' % (1e3*t_batch, t_loop/t_batch))
+
+def benchmark_roi_integrator(spectra=2000, channels=16384, rois=20):
+    """
+    Compares roi_integrator with summing channel slices spectrum by spectrum.
+    """
+    counts = _n.random.poisson(10, (spectra, channels)).astype(_n.uint32)
+    n1 = _n.random.randint(0, channels-500, rois)
+    r  = _n.array([n1, n1+_n.random.randint(10, 500, rois)]).T
+
+    t_loop  = timeit(lambda: [[counts[k, a:b].sum() for a,b in r] for k in range(spectra)], 1)
+    t_build = timeit(lambda: _m.data.roi_integrator(counts), 1)
+    i = _m.data.roi_integrator(counts)
+    t_query = timeit(lambda: i.integrate(r))
+
+    print('roi_integrator (%d spectra, %d channels, %d ROIs)' % (spectra, channels, rois))
+    print('  slice sums:   %8.1f ms' % (1e3*t_loop))
+    print('  build tables: %8.1f ms (once)' % (1e3*t_build))
+    print('  query:        %8.3f ms  (%.0fx)' % (1e3*t_query, t_loop/t_query))
+
+def benchmark_load_image_stack(frames=200, workers=[1,2,4,8]):
+    """
+    Compares numpy.array(load_images()) with load_image_stack().
+    """
+    ps = [path('image.jpg')]*frames
+
+    t_list = timeit(lambda: _n.array(_m.data.load_images(ps)), 1)
+    print('load_image_stack (%d frames, %d cpus)' % (frames, _os.cpu_count()))
+    print('  array(load_images()):   %8.1f ms' % (1e3*t_list))
+    for w in workers:
+        t = timeit(lambda: _m.data.load_image_stack(ps, workers=w), 1)
+        print('  load_image_stack(%d):    %8.1f ms' % (w, 1e3*t))
+
+def benchmark_multi_peak(peaks=20, points=16384, shape='em_gaussian'):
+    """
+    Compares multi_peak with summing individual em_gaussian() or voigt() calls.
+    """
+    x = _n.linspace(0, 8000, points)
+    c = _n.random.uniform(1000, 7000, peaks)
+    s = _n.random.uniform(5, 20, peaks)
+    t = _n.random.uniform(-30, -5, peaks)
+    a = _n.random.uniform(10, 1000, peaks)
+
+    if shape == 'voigt': one = lambda n: a[n]*_m.functions.voigt(x-c[n], s[n], -t[n])
+    else:                one = lambda n: a[n]*_m.functions.em_gaussian(x-c[n], s[n], t[n])
+
+    f = _m.functions.multi_peak(shape)
+    with _n.errstate(all='ignore'): t_loop = timeit(lambda: sum([one(n) for n in range(peaks)]))
+    t_multi = timeit(lambda: f(x, c, s, a, taus=t, gammas=-t))
+
+    print('multi_peak %s (%d peaks, %d points)' % (shape, peaks, points))
+    print('  sum of calls: %8.3f ms' % (1e3*t_loop))
+    print('  multi_peak:   %8.3f ms  (%.1fx)' % (1e3*t_multi, t_loop/t_multi))
+
+def benchmark_em_gaussian_jacobian(peaks=8, points=2000):
+    """
+    Fits a sum of em_gaussian() peaks with scipy.optimize.least_squares, using
+    finite differences and then em_gaussian_jacobian().
+    """
+    import scipy.optimize as _opt
+    f = _m.functions
+
+    x  = _n.linspace(0, 400, points)
+    p0 = _n.array([_n.random.uniform(500, 2000, peaks), _n.linspace(50, 350, peaks),
+                   _n.random.uniform(10, 15, peaks), _n.random.uniform(-20, -8, peaks)]).T
+    y  = _n.random.poisson(sum([a*f.em_gaussian(x-c, s, t) for a,c,s,t in p0])+1.0)
+    ey = _n.sqrt(y+1.0)
+
+    def residuals(p):
+        return (sum([a*f.em_gaussian(x-c, s, t) for a,c,s,t in p.reshape(-1,4)])+1.0-y)/ey
+
+    def jacobian(p):
+        J = []
+        for a,c,s,t in p.reshape(-1,4):
+            dx, ds, dt = f.em_gaussian_jacobian(x-c, s, t)
+            J += [f.em_gaussian(x-c, s, t), -a*dx, a*ds, a*dt]
+        return _n.array(J).T/ey[:,None]
+
+    guess = (p0*_n.random.uniform(0.97, 1.03, p0.shape)).ravel()
+    results = dict()
+    def fit(jac): results[jac] = _opt.least_squares(residuals, guess, jac=jacobian if jac == 'analytic' else jac)
+
+    t_numeric  = timeit(lambda: fit('2-point'),  1)
+    t_analytic = timeit(lambda: fit('analytic'), 1)
+
+    print('em_gaussian fit (%d peaks, %d points)' % (peaks, points))
+    for k in results: print('  %-10s %d residual, %d jacobian evaluations' % (k, results[k].nfev, results[k].njev))
+    print('  finite differences: %8.1f ms' % (1e3*t_numeric))
+    print('  analytic jacobian:  %8.1f ms  (%.1fx)' % (1e3*t_analytic, t_numeric/t_analytic))
+
+def benchmark_voigt(points=100000):
+    """
+    Compares the speed and accuracy of voigt(fast=True) with the
+    scipy.special.wofz() implementation over a grid of gamma/sigma.
+    """
+    x = _n.concatenate([-_n.logspace(-4, 4, points//2)[::-1], _n.logspace(-4, 4, points//2)])
+    t_wofz = t_fast = 0
+    worst  = []
+    for gamma in _n.logspace(-6, 4, 41):
+        t_wofz += timeit(lambda: _m.functions.voigt(x, 1, gamma), 3)
+        t_fast += timeit(lambda: _m.functions.voigt(x, 1, gamma, fast=True), 3)
+        v = _m.functions.voigt(x, 1, gamma)
+        worst.append((abs(_m.functions.voigt(x, 1, gamma, fast=True)/v-1).max(), gamma))
+
+    print('voigt (%d points, |x| = 1e-4 to 1e4 sigma, gamma/sigma = 1e-6 to 1e4)' % points)
+    print('  wofz:      %8.1f ms' % (1e3*t_wofz))
+    print('  fast=True: %8.1f ms  (%.1fx)' % (1e3*t_fast, t_wofz/t_fast))
+    print('  max relative error: %.1e (at gamma/sigma = %.1e)' % max(worst))
+
+def benchmark_em_gaussian_grid(points=2000, sigmas=50, taus=50):
+    """
+    Evaluates em_gaussian() on an (x, sigma, tau) grid in one call, compared
+    with looping over the parameters.
+    """
+    f = _m.functions
+    x = _n.linspace(-50, 50, points)
+    S = _n.linspace(0.5, 5, sigmas)
+    T = _n.linspace(-10, 10, taus)
+
+    t_loop = timeit(lambda: _n.array([[f.em_gaussian(x, s, t) for t in T] for s in S]), 1)
+    t_grid = timeit(lambda: f.em_gaussian(x, S[:,None,None], T[:,None]), 1)
+
+    print('em_gaussian grid (%d x, %d sigma, %d tau)' % (points, sigmas, taus))
+    print('  nested loops: %8.1f ms' % (1e3*t_loop))
+    print('  one call:     %8.1f ms  (%.1fx)' % (1e3*t_grid, t_loop/t_grid))
+
+def benchmark_em_gaussian_bins(bins=16384, sigma=1.0, tau=-2.0):
+    """
+    Compares em_gaussian_bins() with evaluating em_gaussian() at bin centers,
+    with and without 10x oversampling, for a peak about one bin wide.
+    """
+    f = _m.functions
+    e = _n.arange(bins+1) - bins/2 - 0.3
+    c = 0.5*(e[1:]+e[:-1])
+    o = (e[:-1,None] + (_n.arange(10)+0.5)/10).ravel()
+
+    exact = f.em_gaussian_bins(e, sigma, tau)
+    t_center = timeit(lambda: f.em_gaussian(c, sigma, tau))
+    t_over   = timeit(lambda: f.em_gaussian(o, sigma, tau).reshape(-1,10).mean(1))
+    t_bins   = timeit(lambda: f.em_gaussian_bins(e, sigma, tau))
+    e_center = abs(f.em_gaussian(c, sigma, tau)-exact).max()/exact.max()
+    e_over   = abs(f.em_gaussian(o, sigma, tau).reshape(-1,10).mean(1)-exact).max()/exact.max()
+
+    print('em_gaussian per bin (%d bins, sigma=%g bins)' % (bins, sigma))
+    print('  bin centers:     %8.3f ms  (max error %.1e of peak)' % (1e3*t_center, e_center))
+    print('  10x oversampled: %8.3f ms  (max error %.1e of peak)' % (1e3*t_over,   e_over))
+    print('  exact bins:      %8.3f ms' % (1e3*t_bins))
+
+def benchmark_functions_out(points=10000000):
+    """
+    Compares the time and peak memory of evaluating the line shapes normally,
+    into a reused out= array, and into a reused float32 array.
+    """
+    f  = _m.functions
+    x  = _n.linspace(-50, 50, points)
+    ys = dict(float64=_n.empty(points), float32=_n.empty(points, dtype=_n.float32))
+
+    def peak(g):
+        _tracemalloc.start()
+        g()
+        p = _tracemalloc.get_traced_memory()[1]
+        _tracemalloc.stop()
+        return p
+
+    # The original one-line expressions, for reference
+    from scipy.special import erfcx, wofz
+    original = dict(
+        gaussian    = lambda: _n.exp(-0.5*(x/2)**2)/(2*(2*_n.pi)**0.5),
+        em_gaussian = lambda: 0.5/3*_n.exp(-0.5*(-x/2)**2)*erfcx((2/3 + x/2)*0.5**0.5),
+        voigt       = lambda: _n.real(wofz((x + 1j)/2/2**0.5)) / 2 / (2*_n.pi)**0.5)
+
+    print('line shapes (%d points)' % points)
+    for name, g in [('gaussian',    lambda **kw: f.gaussian(x, 2, **kw)),
+                    ('em_gaussian', lambda **kw: f.em_gaussian(x, 2, -3, **kw)),
+                    ('voigt',       lambda **kw: f.voigt(x, 2, 1, **kw))]:
+        print('  %-12s %-12s %8.1f ms  %7.1f MB peak' % (name, 'original', 1e3*timeit(original[name], 3), peak(original[name])/1e6))
+        for label, kw in [('new array', dict()), ('out=', dict(out=ys['float64'])), ('out=float32', dict(out=ys['float32']))]:
+            print('  %-12s %-12s %8.1f ms  %7.1f MB peak' % (name, label, 1e3*timeit(lambda: g(**kw), 3), peak(lambda: g(**kw))/1e6))
+
+def benchmark_reduced_chi2(results=100000, calls=2000, dofs=[5,10,50]):
+    """
+    Compares reduced_chi2_sf() (cached tables) with scipy.stats.chi2.sf() for
+    one large array of fit results and for many small calls.
+    """
+    import scipy.stats as _stats
+    f = _m.functions
+    x = _n.random.uniform(0, 3, results)
+
+    t0 = _t.perf_counter()
+    for dof in dofs: f.reduced_chi2_sf(1.0, dof)
+    t_build = _t.perf_counter()-t0
+
+    t_scipy  = timeit(lambda: [_stats.chi2.sf(x*dof, dof) for dof in dofs])
+    t_tables = timeit(lambda: [f.reduced_chi2_sf(x, dof) for dof in dofs])
+    t_small_scipy  = timeit(lambda: [_stats.chi2.sf(x[n:n+3]*dofs[n%3], dofs[n%3]) for n in range(calls)], 3)
+    t_small_tables = timeit(lambda: [f.reduced_chi2_sf(x[n:n+3], dofs[n%3]) for n in range(calls)], 3)
+
+    print('reduced chi^2 p-values (%d dofs)' % len(dofs))
+    print('  build tables:              %8.1f ms (once)' % (1e3*t_build))
+    print('  %d values x %d dofs' % (results, len(dofs)))
+    print('    chi2.sf:                 %8.1f ms' % (1e3*t_scipy))
+    print('    reduced_chi2_sf:         %8.1f ms  (%.1fx)' % (1e3*t_tables, t_scipy/t_tables))
+    print('  %d calls of 3 values' % calls)
+    print('    chi2.sf:                 %8.1f ms' % (1e3*t_small_scipy))
+    print('    reduced_chi2_sf:         %8.1f ms  (%.1fx)' % (1e3*t_small_tables, t_small_scipy/t_small_tables))
+
+
+
+
+def benchmark_sillyscope_transfer(channels=[1,2,3,4], points=2500, latency=4e-3, shots=20):
+    """
+    Compares transferring all channels (with headers) one at a time using
+    sillyscope_api.get_waveform() and in one pass using get_waveforms(),
+    talking to a fake Tektronix scope with the specified latency.
+    """
+    _m._debug_enabled = False # Switched on by some of the experiments
+    api = _m.instruments.sillyscope_api(simulation=True)
+    api.instrument = fake_tek(points, latency)
+    api.model      = 'TEKTRONIX'
+    api.idn        = 'TEKTRONIX,TDS 2024B,0,CF:91.1CT FV:v22.01'
+
+    # Same result both ways
+    d = api.get_waveforms(channels)
+    for n in channels:
+        e = api.get_waveform(n)
+        assert _n.all(d['y%d'%n] == e['y%d'%n]) and d.h('yzero%d'%n) == e.h('yzero%d'%n)
+
+    t_single    = timeit(lambda: [[api.get_waveform(n) for n in channels] for m in range(shots)], 3)
+    t_pipelined = timeit(lambda: [api.get_waveforms(channels)             for m in range(shots)], 3)
+    N = shots*len(channels)
+
+    print('sillyscope transfer (%d channels x %d points, %.0f ms latency)' % (len(channels), points, 1e3*latency))
+    print('  get_waveform() per channel: %8.1f waveforms/s' % (N/t_single))
+    print('  get_waveforms():            %8.1f waveforms/s  (%.1fx)' % (N/t_pipelined, t_single/t_pipelined))
+
+
+def benchmark_sillyscope_headers(channels=[1,2,3,4], points=2500, latency=4e-3, shots=20):
+    """
+    Compares get_waveform() for all channels with use_previous_header=False
+    (full header every time), 'auto' (fingerprint-validated cache) and True
+    (first header only), talking to a fake Tektronix scope.
+    """
+    _m._debug_enabled = False
+    api = _m.instruments.sillyscope_api(simulation=True)
+    api.instrument = fake_tek(points, latency)
+    api.model      = 'TEKTRONIX'
+    api.idn        = 'TEKTRONIX,TDS 2024B,0,CF:91.1CT FV:v22.01'
+
+    # Turning a knob invalidates the cache
+    assert api.get_waveform(1, use_previous_header='auto').h('yzero1') == -api.instrument.offsets[1]*4e-2
+    api.instrument.offsets[1] = 7
+    assert api.get_waveform(1, use_previous_header='auto').h('yzero1') == -7*4e-2
+    assert api.get_waveform(1, use_previous_header=True ).h('yzero1') == -7*4e-2
+
+    N = shots*len(channels)
+    print('sillyscope headers (%d channels x %d points, %.0f ms latency)' % (len(channels), points, 1e3*latency))
+    for h in [False, 'auto', True]:
+        t = timeit(lambda: [[api.get_waveform(n, use_previous_header=h) for n in channels] for m in range(shots)], 3)
+        print('  use_previous_header=%-6s %8.1f waveforms/s' % (repr(h)+':', N/t))
+
+
+def benchmark_sillyscope_decode(points=10000000):
+    """
+    Compares the time and peak memory of decoding and converting one deep
+    8-bit record the original way (via float16) with sillyscope_waveforms,
+    keeping the raw samples (compact) or filling a databox.
+    """
+    s = _n.random.randint(-100, 100, points).astype(_n.int8).tobytes()
+    h = dict(xmultiplier1=4e-9, yzero1=-0.08, ymultiplier1=0.04)
+
+    def peak(g):
+        _tracemalloc.start()
+        g()
+        p = _tracemalloc.get_traced_memory()[1]
+        _tracemalloc.stop()
+        return p
+
+    def original():
+        d = _s.data.databox()
+        v = _n.float16(_n.frombuffer(s, _n.int8))
+        d['x'] = _n.arange(0, len(v), 1)
+        d['x'] = h['xmultiplier1']*(d['x'])
+        d['y1'] = h['yzero1'] + h['ymultiplier1']*(v)
+        return d
+
+    def compact():
+        return _m.instruments.sillyscope_waveforms().add_channel(1, _n.frombuffer(s, _n.int8), h)
+
+    def databox():
+        return compact().to_databox()
+
+    # Same numbers (with numpy 2, the original voltages are only float16)
+    a, b = original(), databox()
+    assert _n.allclose(a['x'], b['x']) and _n.allclose(a['y1'], b['y1'], 1e-3, 1e-3)
+
+    print('sillyscope decode (%d points)' % points)
+    for name, g in [('original', original), ('compact', compact), ('to_databox()', databox)]:
+        print('  %-14s %8.1f ms  %7.1f MB peak' % (name, 1e3*timeit(g, 3), peak(g)/1e6))
+    w = compact()
+    print('  compact storage %d bytes; voltages of 1e5 points: %.2f ms' % (w.nbytes(), 1e3*timeit(lambda: w.get_y(1, 0, 100000))))
+
+
+def benchmark_sillyscope_memory(points=10000000, chunk_size=250000):
+    """
+    Compares transferring a deep record from a fake Tektronix scope (no
+    latency, 1 GB/s) in one CURV? query with get_waveform_memory() in chunks,
+    into memory and streamed to disk.
+    """
+    _m._debug_enabled = False
+    api = _m.instruments.sillyscope_api(simulation=True)
+    api.instrument = fake_tek(points, 0, 1e9)
+    api.model      = 'TEKTRONIX'
+    api.idn        = 'TEKTRONIX,MDO3024,0,CF:91.1CT FV:v1.30'
+    path = _os.path.join(_tempfile.mkdtemp(), 'memory.txt')
+
+    def peak(g):
+        _tracemalloc.start()
+        g()
+        p = _tracemalloc.get_traced_memory()[1]
+        _tracemalloc.stop()
+        return p
+
+    # Everything arrives intact, including through the file
+    w = api.get_waveform_memory(1, path, chunk_size=chunk_size)
+    d = _s.data.load(path)
+    assert _n.all(w.raw[1] == api.instrument.curves[1]) and _n.all(d['y1'] == api.instrument.curves[1])
+    assert d.h('ymultiplier1') == 4e-2
+    del w
+
+    print('sillyscope deep memory (%d points, %d point chunks)' % (points, chunk_size))
+    for name, g in [('one CURV?',  lambda: api.get_waveform_memory(1, chunk_size=points)),
+                    ('chunks',     lambda: api.get_waveform_memory(1, chunk_size=chunk_size)),
+                    ('chunks, disk', lambda: api.get_waveform_memory(1, path, chunk_size=chunk_size))]:
+        print('  %-14s %8.1f ms  %7.1f MB peak' % (name, 1e3*timeit(g, 3), peak(g)/1e6))
+
+
+def benchmark_sillyscope_background(shots=30, channels=2, scope=0.02, analysis=0.02):
+    """
+    Compares the sillyscope acquisition loop on the GUI thread with the
+    background acquisition thread, for a simulated scope taking the specified
+    time per channel and an analysis (process_data2()) taking the specified
+    time per shot.
+    """
+    _m._debug_enabled = False
+    self = _m.instruments.sillyscope(show=False)
+    self.button_connect.set_checked(True)
+    for n in range(1,5): getattr(self, 'button_%d'%n).set_checked(n <= channels)
+    self.api._simulation_sleep = scope
+    self.process_data2 = lambda: _t.sleep(analysis)
+    self.settings['Acquire/Iterations'] = shots
+
+    done = []
+    self.after_acquire_finished = lambda: done.append(_t.perf_counter())
+
+    print('sillyscope acquisition (%d shots, %d channels, %.0f ms/channel scope, %.0f ms/shot analysis)' % (shots, channels, 1e3*scope, 1e3*analysis))
+    for background in [False, True]:
+        self.settings['Acquire/Background/Enabled'] = background
+        done.clear()
+        t0 = _t.perf_counter()
+        self.button_acquire.set_checked(True)
+        while not done:
+            self.window.process_events()
+            _t.sleep(0.001)
+        assert self.number_count.get_value() == shots
+        print('  %-12s %8.1f shots/s' % (['GUI thread', 'background'][background], shots/(done[0]-t0)))
+    print('  (scope limit %.1f shots/s)' % (1/(channels*scope)))
+
+
+
+
+if __name__ == '__main__':
+    benchmark_load_chn()
+    benchmark_load_chn_mmap()
+    benchmark_load_chns_workers()
+    benchmark_chn_index()
+    benchmark_chn_archive()
+    benchmark_chn_watcher()
+    benchmark_calibrate_spectra()
+    benchmark_calibrate_spectra(20000, 1024, 256)
+    benchmark_roi_integrator()
+    benchmark_load_image_stack()
+    benchmark_multi_peak()
+    benchmark_multi_peak(shape='voigt')
+    benchmark_em_gaussian_jacobian()
+    benchmark_voigt()
+    benchmark_em_gaussian_grid()
+    benchmark_em_gaussian_bins()
+    benchmark_functions_out()
+    benchmark_reduced_chi2()
+    benchmark_sillyscope_transfer()
+    benchmark_sillyscope_headers()
+    benchmark_sillyscope_decode()
+    benchmark_sillyscope_memory()
+    benchmark_sillyscope_background()
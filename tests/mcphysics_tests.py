@@ -4,6 +4,8 @@ import spinmob   as _s
 import mcphysics as _m
 import unittest  as _ut
 import shutil    as _sh
+import struct    as _struct
+import time      as _t
 
 # Globals for monkeywork on the command line
 a = b = c = d = e = x = None
@@ -19,6 +21,113 @@ def path(filename):
     return _os.path.join(data_path, filename)
 
 
+class fake_tek():
+    """
+    Minimal stand-in for a Tektronix TDS VISA session, answering the
+    DATA:SOURCE, DATA:STAR(?), DATA:STOP(?), HOR:RECO?, WFMP and CURV? commands used
+    by the sillyscope_api (including semicolon-concatenated messages), with a
+    fixed latency per transaction and a fixed transfer rate.
+
+    Parameters
+    ----------
+    points=2500
+        Number of points per curve.
+    latency=4e-3
+        Seconds per write / read.
+    rate=1e6
+        Bytes per second for the responses.
+    """
+    def __init__(self, points=2500, latency=4e-3, rate=1e6):
+        self.points  = points
+        self.latency = latency
+        self.rate    = rate
+        self.source  = 1
+        self.start   = 1
+        self.stop    = points
+        self.pending = []
+        self.curves  = dict()
+        self.offsets = dict()
+        for n in [1,2,3,4]:
+            self.curves[n]  = _n.int8(_n.random.randint(-100, 100, points))
+            self.offsets[n] = n
+
+    def write(self, message):
+        _t.sleep(self.latency)
+        for m in message.split(';'):
+            m = m.strip(':').upper()
+            if   m.startswith('DATA:SOURCE CH'): self.source = int(m[-1])
+            elif m.startswith('DATA:STAR '):     self.start  = int(m[10:])
+            elif m.startswith('DATA:STOP '):     self.stop   = int(m[10:])
+            elif m == 'DATA:STAR?': self.pending.append(b'%d' % self.start)
+            elif m == 'DATA:STOP?': self.pending.append(b'%d' % self.stop)
+            elif m == 'HOR:RECO?':  self.pending.append(b'%d' % self.points)
+            elif m == 'WFMP:YMUL?': self.pending.append(b'4.0E-2')
+            elif m == 'WFMP:XIN?':  self.pending.append(b'4.0E-6')
+            elif m == 'WFMP:YOF?':  self.pending.append(b'%d.0E0' % self.offsets[self.source])
+            elif m in ['WFMP:WFID?', 'WFMOUTPRE:WFID?']:
+                self.pending.append(b'"Ch%d, DC coupling, 1.0E0 V/div, 1.0E-3 s/div, %d points, Sample mode"' % (self.source, self.points))
+            elif m == 'CURV?':
+                c = self.curves[self.source][self.start-1:self.stop].tobytes()
+                n = str(len(c)).encode()
+                self.pending.append(b'#'+str(len(n)).encode()+n+c)
+
+    def read_raw(self):
+        s = b';'.join(self.pending)+b'\n'
+        self.pending = []
+        _t.sleep(self.latency + len(s)/self.rate)
+        return s
+
+    def read(self):
+        return self.read_raw().decode()
+
+    def query(self, message):
+        self.write(message)
+        return self.read()
+
+
+class fake_rigolz():
+    """
+    Minimal stand-in for a Rigol DS1000Z VISA session, answering the run
+    state, :WAV:MODE, :WAV:STAR, :WAV:STOP, :WAV:PRE? and :WAV:DATA?
+    commands used by sillyscope_api.get_waveform_memory().
+    """
+    def __init__(self, points=5000):
+        self.memory  = _n.uint8(_n.random.randint(0, 256, points))
+        self.status  = 'AUTO'
+        self.sweep   = 'AUTO'
+        self.mode    = 'NORM'
+        self.start   = 1
+        self.stop    = 1200
+        self.yref    = 127
+        self.pending = []
+
+    def write(self, m):
+        m = m.upper()
+        if   m == ':STOP': self.status = 'STOP'
+        elif m == ':RUN':  self.status = 'AUTO'
+        elif m == ':SING': self.status, self.sweep = 'WAIT', 'SING'
+        elif m.startswith(':WAV:MODE '): self.mode  = m[10:]
+        elif m.startswith(':WAV:STAR '): self.start = int(m[10:])
+        elif m.startswith(':WAV:STOP '): self.stop  = int(m[10:])
+        elif m == ':TRIG:STAT?': self.pending.append(self.status)
+        elif m == ':TRIG:SWE?':  self.pending.append(self.sweep)
+        elif m == ':WAV:MODE?':  self.pending.append(self.mode)
+        elif m == ':WAV:STAR?':  self.pending.append(str(self.start))
+        elif m == ':WAV:STOP?':  self.pending.append(str(self.stop))
+        elif m == ':WAV:PRE?':
+            self.pending.append('0,2,%d,1,1.0e-06,-2.5e-03,0,4.0e-02,20,%d' % (len(self.memory), self.yref))
+        elif m == ':WAV:DATA?':
+            b = self.memory[self.start-1:self.stop].tobytes()
+            self.pending.append(b'#9%09d' % len(b) + b + b'\n')
+
+    def read(self):     return self.pending.pop(0)
+    def read_raw(self): return self.pending.pop(0)
+
+    def query(self, m):
+        self.write(m)
+        return self.read()+'\n'
+
+
 class errthing(_ut.TestCase):
     """
     Test class for mcphysics library.
@@ -38,6 +147,141 @@ class errthing(_ut.TestCase):
         d = _m.data.load_chn(path('signal.Chn'))
         self.assertEqual(len(d), 2)
         self.assertEqual(len(d[1]), 1024)
+        self.assertEqual(d.h('live_time'), 379.52)
+
+        # Compare against the channel-by-channel decoding
+        with open(path('signal.Chn'), 'rb') as fh: b = fh.read()
+        counts = [_struct.unpack('I', b[32+4*i:36+4*i])[0] for i in range(1024)]
+        self.assertTrue((d[1] == counts).all())
+
+        # Memory-mapped mode
+        with _m.data.load_chn(path('signal.Chn'), mmap=True) as m:
+            self.assertTrue((m[1] == d[1]).all())
+            self.assertFalse(m.counts.flags.writeable)
+            self.assertEqual(m.h('live_time'), d.h('live_time'))
+            self.assertEqual(m.headers, d.headers)
+        with _m.data.load_chn(path('signal.Chn'), mmap=True, delimiter=',') as m:
+            self.assertEqual(m.to_databox().delimiter, ',')
+            self.assertEqual(m.to_databox(delimiter=';').delimiter, ';')
+
+        # Parallel loading, with a corrupt file in the middle
+        with open('corrupt.Chn', 'wb') as fh: fh.write(b'nope')
+        errors = []
+        ds = _m.data.load_chns([path('signal.Chn'), 'corrupt.Chn', path('background.Chn')], workers=2, errors=errors)
+        self.assertRaises(Exception, _m.data.load_chns, [path('signal.Chn'), 'corrupt.Chn'])
+        _os.remove('corrupt.Chn')
+        self.assertEqual(len(ds), 2)
+        self.assertEqual(ds[1].path, path('background.Chn'))
+        self.assertEqual(errors[0][0], 'corrupt.Chn')
+
+        # Streaming combine
+        for mmap in [False, True]:
+            dc = _m.data.load_chns([path('signal.Chn'), path('background.Chn')], combine=True, mmap=mmap)
+            self.assertTrue((dc[1] == ds[0][1]+ds[1][1]).all())
+            self.assertAlmostEqual(dc.h('live_time'), ds[0].h('live_time')+ds[1].h('live_time'))
+            self.assertEqual(dc.h('start_time_last')['minute'], 27)
+            self.assertEqual(dc.h('files'), 2)
+
+        # Combining a spectrum with a different channel count
+        with open(path('signal.Chn'), 'rb') as fh: b = fh.read()
+        with open('short.Chn', 'wb') as fh: fh.write(b[0:30]+_struct.pack('<h', 512)+b[32:32+4*512]+b[32+4*1024:])
+        self.assertRaises(ValueError, _m.data.load_chns, [path('signal.Chn'), 'short.Chn'], combine=True)
+        errors = []
+        dc = _m.data.load_chns([path('signal.Chn'), 'short.Chn', path('background.Chn')], combine=True, errors=errors)
+        _os.remove('short.Chn')
+        self.assertEqual(dc.h('files'), 2)
+        self.assertTrue(isinstance(errors[0][1], ValueError))
+
+        # Header-only scan and directory index
+        h = _m.data.scan_chn(path('signal.Chn'))
+        self.assertEqual(h['live_time'], ds[0].h('live_time'))
+        self.assertEqual(h['channel_count'], 1024)
+
+        if _os.path.exists('chn_index'): _sh.rmtree('chn_index')
+        _os.mkdir('chn_index')
+        for f in ['signal.Chn', 'background.Chn']: _sh.copy(path(f), 'chn_index')
+        index = _m.data.chn_index('chn_index')
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.update(), 0)
+        self.assertEqual(_m.data.chn_index('chn_index').update(), 0)
+        self.assertEqual(len(index.query(date='2018-09-25')), 2)
+        self.assertEqual(len(index.query(date='2018-09-25', min_live_time=500)), 1)
+        self.assertEqual(len(index.query(after='2018-09-25 09:20:00')), 1)
+        self.assertFalse(_m.data.chn_index('chn_index', filename='missing/chn_index.json').save())
+        _sh.rmtree('chn_index')
+
+        # Columnar archive
+        if _os.path.exists('chn_archive'): _sh.rmtree('chn_archive')
+        a = _m.data.chn_archive('chn_archive').append([path('signal.Chn')])
+        a = _m.data.chn_archive('chn_archive').append(ds[1:])
+        self.assertEqual(a.counts.shape, (2,1024))
+        self.assertTrue((a.counts[1] == ds[1][1]).all())
+        self.assertEqual(a[0].headers, ds[0].headers)
+        self.assertEqual(a[-1].h('start_time'), ds[1].h('start_time'))
+
+        # Generators, and a carriage return in a description
+        d = _m.data.load_chn(path('background.Chn'))
+        d.h(description='one\rtwo')
+        a.append(x for x in [d, ds[0]])
+        self.assertEqual(len(a), 4)
+        self.assertEqual(a[2].h('description'), 'one\rtwo')
+        self.assertEqual(_m.data.chn_archive('chn_archive')[3].headers, ds[0].headers)
+        del a
+        _sh.rmtree('chn_archive')
+
+        # Headless batch conversion
+        if _os.path.exists('chn_convert'): _sh.rmtree('chn_convert')
+        ps = [path('signal.Chn'), path('background.Chn')]
+        self.assertEqual(len(_m.data.convert_chns(ps, 'chn_convert', workers=2)), 2)
+        self.assertEqual(len(_m.data.convert_chns(ps, 'chn_convert', workers=2)), 0)
+        self.assertEqual(len(_m.data.convert_chns(ps, 'chn_convert', binary='int64', workers=1)), 2)
+        self.assertEqual(_s.data.load(_os.path.join('chn_convert', 'background.dat')).h('live_time'), 563.26)
+        _os.mkdir(_os.path.join('chn_convert', 'copy'))
+        _sh.copy(path('signal.Chn'), _os.path.join('chn_convert', 'copy'))
+        self.assertRaises(ValueError, _m.data.convert_chns, [path('signal.Chn'), _os.path.join('chn_convert', 'copy', 'signal.Chn')], 'chn_convert', force=True)
+        self.assertEqual(len(_m.data.convert_chns([path('signal.Chn'), path('signal.Chn')], 'chn_convert', force=True, workers=1)), 1)
+        _sh.rmtree('chn_convert')
+
+        # Watch folder
+        if _os.path.exists('chn_watch'): _sh.rmtree('chn_watch')
+        _os.mkdir('chn_watch')
+        _sh.copy(path('signal.Chn'), 'chn_watch')
+        w = _m.data.chn_watcher('chn_watch', roi=[100,200], settle=0)
+        self.assertEqual(w.update(), 0)
+        _sh.copy(path('background.Chn'), 'chn_watch')
+        self.assertEqual(w.update(), 1)
+        self.assertTrue((w.combined()[1] == ds[0][1]+ds[1][1]).all())
+        self.assertEqual(w.rates()['counts'][1], ds[1][1][100:200].sum())
+
+        # Changed file, and one with the wrong number of channels
+        _sh.copy(path('signal.Chn'), _os.path.join('chn_watch', 'background.Chn'))
+        with open(path('signal.Chn'), 'rb') as fh: b = fh.read()
+        with open(_os.path.join('chn_watch', 'short.Chn'), 'wb') as fh: fh.write(b[0:30]+_struct.pack('<h', 512)+b[32:32+4*512]+b[32+4*1024:])
+        self.assertEqual(w.update(), 1)
+        self.assertTrue((w.combined()[1] == 2*ds[0][1]).all())
+        self.assertEqual(w.combined().h('live_time'), 2*ds[0].h('live_time'))
+        self.assertEqual(list(w.errors), ['short.Chn'])
+        _os.remove(_os.path.join('chn_watch', 'background.Chn'))
+        self.assertEqual(w.update(), 0)
+        self.assertTrue((w.combined()[1] == ds[0][1]).all())
+        self.assertEqual(w.combined().h('files'), 1)
+        _sh.rmtree('chn_watch')
+
+        # Batch calibration and rebinning
+        x, y, ey = _m.data.calibrate_spectra(ds, rebin=4)
+        self.assertEqual(y.shape, (2,256))
+        self.assertAlmostEqual(y[1,10], ds[1][1][40:44].sum()/ds[1].h('live_time'))
+        x, y, ey = _m.data.calibrate_spectra(ds, coefficients=[[0,2],[1,2]], edges=_n.linspace(0,2000,101))
+        self.assertAlmostEqual(y[0].sum()*ds[0].h('live_time'), ds[0][1].sum())
+        self.assertTrue((ey <= _n.sqrt(y*ds[0].h('live_time'))+1e-12).all())
+
+        # Region of interest integrals
+        r = _m.data.roi_integrator(ds)
+        y, ey = r.integrate([[10,20], [500,600]])
+        self.assertEqual(y[1,1], ds[1][1][500:600].sum())
+        y, ey = r.net_area([[500,600]], [[[450,500],[600,650]]], normalize=True)
+        b = (ds[0][1][450:500].sum()+ds[0][1][600:650].sum())
+        self.assertAlmostEqual(y[0,0], (ds[0][1][500:600].sum()-b)/ds[0].h('live_time'))
 
         ds = _m.data.load_chns([path('signal.Chn'), path('background.Chn')])
         self.assertEqual(len(ds), 2)
@@ -65,15 +309,300 @@ class errthing(_ut.TestCase):
         images = _m.data.load_images([path('image.jpg')])
         self.assertEqual(_n.shape(images), (1,612,816,3))
 
+        stack = _m.data.load_image_stack([path('image.jpg')]*3, workers=2)
+        self.assertEqual(stack.shape, (3,612,816,3))
+        self.assertTrue((stack[2] == image).all())
+
+        stack = _m.data.load_image_stack([path('image.jpg')]*2, scratch='scratch.npy')
+        self.assertTrue((_n.load('scratch.npy', mmap_mode='r')[1] == image).all())
+        del stack
+        _os.remove('scratch.npy')
+
+        s = _m.data.image_sequence([path('image.jpg')]*5, cache_size=3*image.nbytes)
+        self.assertEqual(len(s), 5)
+        self.assertTrue((s[-1] == image).all())
+        self.assertEqual(s[1:5:2].shape, (2,612,816,3))
+        self.assertLessEqual(len(s._cache), 3)
+        s.close()
+        s.close()
+
+        # Video file
+        _m._imageio.mimsave('image_sequence.gif', [_n.full((8,8,3), 40*n, _n.uint8) for n in range(4)])
+        with _m.data.image_sequence('image_sequence.gif') as s:
+            self.assertEqual(len(s), 4)
+            self.assertEqual(len(list(s)), 4)
+            self.assertEqual(s[2][0,0,0], 80)
+        self.assertIsNone(s._pool)
+        _os.remove('image_sequence.gif')
+
+        d = _m.data.reduce_images([path('image.jpg')]*3, dict(
+            intensity = _m.data.image_intensity,
+            centroid  = _m.data.image_centroid,
+            roi       = _m.data.image_roi_sum(0, 816, 0, 612),
+            radial    = _m.data.image_radial_profile(bins=10)), workers=2)
+        self.assertEqual(list(d['frame']), [0,1,2])
+        self.assertAlmostEqual(d['intensity'][2], image.sum(dtype=float))
+        self.assertAlmostEqual(d['roi'][0], d['intensity'][0])
+        self.assertTrue('centroid_x' in d.ckeys and 'radial_9' in d.ckeys)
+
 
 
 
     def test_functions(self):
+        f = _m.functions
+        x = _n.linspace(-20, 40, 601)
+
+        # Multi-peak model against the sum of individual peaks
+        c, s, t, a = _n.array([0,10,20.]), _n.array([1,2,1.5]), _n.array([2,-1,0]), _n.array([1,2,3.])
+        y = f.multi_peak()(x, c, s, a, t)
+        r = a[0]*f.em_gaussian(x-c[0],s[0],t[0]) + a[1]*f.em_gaussian(x-c[1],s[1],t[1]) + a[2]*f.gaussian(x-c[2],s[2])
+        self.assertTrue(_n.allclose(y, r))
+        self.assertTrue(_n.isfinite(y).all())
+        self.assertAlmostEqual(y.sum()*0.1, a.sum())
+        y = f.multi_peak('voigt')(x, c, s, a, gammas=t+3)
+        self.assertTrue(_n.allclose(y, sum([a[n]*f.voigt(x-c[n],s[n],t[n]+3) for n in range(3)])))
+        self.assertTrue(_n.allclose(f.multi_peak('voigt', fast=True)(x, c, s, a, gammas=t+3), y, rtol=1e-4, atol=0))
+
+        # Parameter grids
+        S, T = _n.linspace(0.5, 3, 4), _n.array([-2, -0.5, 0, 0.5, 2])
+        g = f.em_gaussian(x[:,None,None], S[:,None], T)
+        self.assertEqual(g.shape, (len(x), 4, 5))
+        self.assertTrue(_n.allclose(g[:,3,0], f.em_gaussian(x, S[3], T[0])))
+        self.assertTrue((g[:,1,2] == f.gaussian(x, S[1])).all())
+        self.assertTrue(_n.allclose(f.voigt(x[:,None], S, 1)[:,2], f.voigt(x, S[2], 1)))
+        self.assertTrue(_n.isfinite(f.em_gaussian(1e4, 1, [1,-1])).all())
+
+        # Tail values do not depend on the rest of the array
+        for x1, t, y1 in [(37.7, 1, 6.986268508675704e-17), (40, 0.2, 1.8567551940509735e-81)]:
+            self.assertAlmostEqual(f.em_gaussian(x1, 1, t)/y1, 1, 12)
+            self.assertEqual(f.em_gaussian([0,x1], 1, t)[1], f.em_gaussian(x1, 1, t))
+            self.assertEqual(f.em_gaussian_cdf([0,x1], 1, t)[1], f.em_gaussian_cdf(x1, 1, t))
+            self.assertEqual(f.em_gaussian_bins([-1,0,x1,x1+1], 1, t)[2], f.em_gaussian_bins([x1,x1+1], 1, t)[0])
+
+        # Caller-owned and float32 outputs
+        y = _n.empty(len(x), dtype=_n.float32)
+        self.assertIs(f.em_gaussian(x, 1.3, -2, out=y), y)
+        self.assertTrue(_n.allclose(y, f.em_gaussian(x, 1.3, -2), rtol=1e-5, atol=1e-7))
+        self.assertEqual(f.voigt(x, 1.3, 1, dtype=_n.float32).dtype, _n.float32)
+        self.assertEqual(f.gaussian(x.astype(_n.float32)).dtype, _n.float32)
+
+        # Bin-integrated line shapes
+        e = _n.linspace(-10, 30, 41)
+        self.assertTrue(_n.allclose(_n.diff(f.em_gaussian_cdf(e, 1.3, -2)), f.em_gaussian_bins(e, 1.3, -2), rtol=1e-12, atol=1e-15))
+        self.assertTrue(_n.allclose(_n.diff(f.gaussian_cdf(e, 1.3)), f.gaussian_bins(e, 1.3), rtol=1e-12, atol=1e-15))
+        self.assertAlmostEqual(f.em_gaussian_bins([-50,0,100], 1.3, 2).sum(), 1)
+        self.assertAlmostEqual(f.em_gaussian_bins(e, 1.3, 2)[15], 0.5*(f.em_gaussian(e[15],1.3,2)+f.em_gaussian(e[16],1.3,2)), 2)
+        self.assertEqual(f.em_gaussian_bins(e, S, T[1:]).shape, (4, 40))
+        self.assertTrue((f.em_gaussian_bins(e, 0.5, -1) >= 0).all())
+
+        # Reduced chi^2 distribution and cached tables
+        from scipy.stats import chi2
+        q = _n.linspace(0, 4, 401)
+        self.assertTrue(_n.allclose(f.reduced_chi2(q, 7), 7*chi2.pdf(7*q, 7), rtol=1e-12, atol=0))
+        self.assertTrue(_n.allclose(f.reduced_chi2_sf(q, 7),  chi2.sf (7*q, 7), rtol=1e-9, atol=0))
+        self.assertTrue(_n.allclose(f.reduced_chi2_cdf(q, 70), chi2.cdf(70*q, 70), rtol=1e-9, atol=0))
+        self.assertTrue(_n.allclose(f.reduced_chi2_sf(q, _n.arange(401)%3+1), chi2.sf(q*(_n.arange(401)%3+1), _n.arange(401)%3+1), rtol=1e-9, atol=0))
+        t = f.reduced_chi2_tables(max_dofs=2)
+        for dof in [5, 6, 5, 7]: t.sf(1.0, dof)
+        self.assertEqual(list(t._tables.keys()), [5, 7])
+        t = f.reduced_chi2_tables(max_segments=128)
+        self.assertEqual(t._get_table(5)['cdf'].shape[1], 128)
+        self.assertAlmostEqual(t.sf(1.0, 5)/chi2.sf(5, 5), 1, 3)
+        self.assertRaises(ValueError, t.sf, 1.0, 0)
+        self.assertRaises(ValueError, t.cdf, 1.0, [3,-1])
+        r = _n.exp(_n.linspace(-8, 2, 20001))
+        for dof in [1, 40]:
+            self.assertLess(abs(f.reduced_chi2_tables().sf(r, dof)/chi2.sf(dof*r, dof)-1).max(), 1e-10)
+
+        # Fast Voigt approximation
+        for gamma in [1e-6, 0.1, 1, 10, 1e4]:
+            v = f.voigt(x, 1.3, gamma)
+            self.assertLess(abs(f.voigt(x, 1.3, gamma, fast=True)/v-1).max(), 1e-4)
+
+        # Analytic derivatives against central differences
+        x = _n.linspace(-10, 20, 301)
+        h = 1e-6
+        for function, jacobian, p in [(f.gaussian,    f.gaussian_jacobian,    [1.3]),
+                                      (f.em_gaussian, f.em_gaussian_jacobian, [1.3, 2.1]),
+                                      (f.em_gaussian, f.em_gaussian_jacobian, [1.3,-0.7]),
+                                      (f.voigt,       f.voigt_jacobian,       [1.3, 0.8])]:
+            J = jacobian(x, *p)
+            for n in range(len(J)):
+                p1 = [x]+p; p1[n] = p1[n]+h
+                p2 = [x]+p; p2[n] = p2[n]-h
+                self.assertTrue(_n.allclose(J[n], (function(*p1)-function(*p2))/(2*h), atol=1e-8))
 
         _s.pylab.figure(2)
         _s.plot.xy.function(['em_gaussian(x,1,2)', 'voigt(x,2,1)', 'erfcx(x)', 'reduced_chi2(x,10)'],
                              1e-6,5,1000,g=_m.functions.__dict__)
 
+    def test_instruments_sillyscope_api(self):
+        _m._debug_enabled = False # Switched on by some of the experiments
+
+        api = _m.instruments.sillyscope_api(simulation=True)
+        api.instrument = fake_tek(2500, 0, 1e9)
+        api.model      = 'TEKTRONIX'
+        api.idn        = 'TEKTRONIX,TDS 2024B,0,CF:91.1CT FV:v22.01'
+        curves         = api.instrument.curves
+
+        # Binary blocks in a concatenated response
+        s = b'1.0E0;#15abcde;#210'+b'x'*10+b'\n'
+        b, i = api._split_block(s)
+        self.assertEqual(b, b'abcde')
+        self.assertEqual(api._split_block(s, i), (b'x'*10, len(s)-1))
+
+        # All channels in one pass, same as one at a time
+        d = api.get_waveforms([1,2,4])
+        self.assertEqual(d.ckeys, ['x', 'y1', 'y2', 'y4'])
+        for n in [1,2,4]:
+            e = api.get_waveform(n)
+            self.assertTrue((d['y%d'%n] == e['y%d'%n]).all())
+            self.assertTrue((d['y%d'%n] == _n.float64(curves[n])*4e-2 - n*4e-2).all())
+            self.assertEqual(d.h('yzero%d'%n), e.h('yzero%d'%n))
+        self.assertTrue((d['x'] == 4e-6*_n.arange(2500)).all())
+
+        # Cached headers follow the knobs, including A -> B -> A with the
+        # header re-read in between by get_header() or get_waveforms()
+        offsets = api.instrument.offsets
+        for reread in [lambda: api.get_waveform(1), lambda: api.get_waveforms([1])]:
+            offsets[1] = 1
+            self.assertEqual(api.get_waveform(1, use_previous_header='auto').h('yzero1'), -1*4e-2)
+            offsets[1] = 7
+            self.assertEqual(api.get_waveform(1, use_previous_header='auto').h('yzero1'), -7*4e-2)
+            offsets[1] = 1
+            reread()
+            offsets[1] = 7
+            self.assertEqual(api.get_waveform(1, use_previous_header='auto').h('yzero1'), -7*4e-2)
+            self.assertEqual(api.get_waveform(1, use_previous_header=True).h('yzero1'), -7*4e-2)
+        self.assertEqual(api.get_waveforms([1,2], use_previous_header='auto').h('yzero2'), -2*4e-2)
+
+        # Compact raw samples, converted only when asked
+        d = api.get_waveforms([1,2])
+        w = api.get_waveforms([1,2], compact=True)
+        self.assertEqual(w.channels, [1,2])
+        self.assertEqual(w.nbytes(), 2*2500)
+        self.assertIs(w.raw[2].dtype, _n.dtype(_n.int8))
+        e = w.to_databox()
+        self.assertEqual(e.ckeys, d.ckeys)
+        for k in d.ckeys: self.assertTrue((e[k] == d[k]).all())
+        self.assertTrue((w.get_y(2, 100, 200) == d['y2'][100:200]).all())
+        self.assertTrue((w.get_x(n1=100, n2=200) == d['x'][100:200]).all())
+        self.assertTrue((w.get_counts(1) == curves[1]).all())
+        self.assertTrue((w.to_databox(convert_to_float=False)['y2'] == curves[2]).all())
+        self.assertTrue(_n.allclose(w.to_databox(dtype=_n.float32)['y1'], d['y1'], 1e-6, 1e-6))
+
+        # Deep memory in chunks, through a file, putting DATA:STAR / STOP back
+        api.instrument = fake_tek(10000, 0, 1e9)
+        api.instrument.stop = 2500
+        p = _os.path.join('sillyscope_memory', 'memory.txt')
+        if not _os.path.exists('sillyscope_memory'): _os.mkdir('sillyscope_memory')
+        n = []
+        w = api.get_waveform_memory(2, p, chunk_size=3000, progress=lambda n1, N: n.append(n1))
+        self.assertEqual(n, [3000, 6000, 9000, 10000])
+        self.assertEqual((api.instrument.start, api.instrument.stop), (1, 2500))
+        self.assertTrue((w.raw[2] == api.instrument.curves[2]).all())
+        d = _s.data.load(p)
+        self.assertTrue((d['y2'] == api.instrument.curves[2]).all())
+        self.assertEqual(d.h('ymultiplier2'), 4e-2)
+        self.assertTrue((w.get_y(2) == api.get_waveform_memory(2, chunk_size=10000).get_y(2)).all())
+        del w
+
+        # A failed chunk leaves no file behind
+        api.instrument.curves[2] = api.instrument.curves[2][0:9000]
+        self.assertIsNone(api.get_waveform_memory(2, p, chunk_size=3000))
+        self.assertFalse(_os.path.exists(p))
+        self.assertEqual((api.instrument.start, api.instrument.stop), (1, 2500))
+        _sh.rmtree('sillyscope_memory')
+
+        # Deep MDO records through get_waveform() also put DATA:STAR / STOP back
+        api.idn = 'TEKTRONIX,MDO3024,0,CF:91.1CT FV:v1.30'
+        api.chunk_size = 3000
+        self.assertTrue((api.get_waveform(1, compact=True).raw[1] == api.instrument.curves[1]).all())
+        self.assertEqual((api.instrument.start, api.instrument.stop), (1, 2500))
+        api.idn = 'TEKTRONIX,TDS 2024B,0,CF:91.1CT FV:v22.01'
+
+        # RIGOLZ raw memory, putting the run state and screen settings back
+        api.instrument = fake_rigolz(5000)
+        api.model      = 'RIGOLZ'
+        for status in ['AUTO', 'STOP']:
+            api.instrument.status = status
+            w = api.get_waveform_memory(1, chunk_size=2000)
+            r = api.instrument
+            self.assertEqual((r.status, r.mode, r.start, r.stop), (status, 'NORM', 1, 1200))
+            self.assertTrue((w.raw[1] == r.memory).all())
+            self.assertTrue(_n.allclose(w.get_y(1), (_n.float64(r.memory)-20-127)*4e-2))
+        api.instrument.write(':SING')
+        api.get_waveform_memory(1)
+        self.assertEqual(api.instrument.status, 'WAIT')
+
+        # Same RIGOLZ voltages with or without the pipelined transfer
+        api.instrument.yref = 125
+        y = (_n.float64(api.instrument.memory[0:1200])-20-125)*4e-2
+        self.assertTrue(_n.allclose(api.get_waveform(1)['y1'], y))
+        self.assertTrue(_n.allclose(api.get_waveforms([1])['y1'], y))
+        self.assertAlmostEqual(api.get_waveform(1).h('yzero1'), api.get_waveforms([1]).h('yzero1'))
+
+        # Simulated times, as before the compact storage
+        sim = _m.instruments.sillyscope_api(simulation=True)
+        sim._simulation_sleep = 0
+        x = _n.linspace(-5, 5, sim._simulation_points)
+        self.assertTrue((sim.get_waveform(2)['x'] == x).all())
+        self.assertTrue((sim.get_waveforms([1,2])['x'] == x).all())
+        self.assertEqual(sim.get_waveform(1, include_x=False).ckeys, ['y1'])
+
+        # Unsigned Rigol samples
+        h = dict(xmultiplier1=1e-3, yzero1=0.5, ymultiplier1=0.1)
+        w = _m.instruments.sillyscope_waveforms().add_channel(1, _n.array([0,125,250], _n.uint8), h, 125, -1)
+        self.assertTrue((w.get_counts(1) == [125,0,-125]).all())
+        self.assertTrue(_n.allclose(w.get_y(1), [13,0.5,-12]))
+
+    def test_instruments_sillyscope_background(self):
+        _m._debug_enabled = False
+
+        g = _m.instruments.sillyscope(show=False)
+        g.button_connect.set_checked(True)
+        g.api._simulation_sleep = 0.002
+        g.settings['Acquire/Background/Enabled'] = True
+        g.settings['Acquire/Background/Frame_Interval'] = 0.01
+        g.settings['Acquire/Trigger'] = False
+
+        done = []
+        g.after_acquire_finished = lambda: done.append(g.number_count.get_value())
+        def wait():
+            while not done: g.window.process_events(); _t.sleep(0.001)
+
+        # Fixed number of shots
+        g.settings['Acquire/Iterations'] = 5
+        g.button_acquire.set_checked(True)
+        wait()
+        self.assertEqual(done, [5])
+        self.assertEqual(len(g.plot_raw['y1']), g.api._simulation_points)
+
+        # Stopping, then trying to restart before the thread is done. The
+        # GUI thread must not touch the scope meanwhile, even if Trigger is
+        # ticked.
+        done.clear()
+        calls = []
+        g.api.set_mode_single_trigger = lambda: calls.append(1)
+        g.settings['Acquire/Iterations'] = 0
+        g.button_acquire.set_checked(True)
+        while g.number_count.get_value() < 2: g.window.process_events()
+        g.settings['Acquire/Trigger'] = True
+        g.settings['Acquire/Trigger'] = False
+        self.assertEqual(calls, [])
+        g.button_acquire.set_checked(False)
+        self.assertFalse(g.button_acquire._widget.isEnabled())
+        g.button_acquire.set_checked(True)
+        self.assertFalse(g.button_acquire.is_checked())
+        wait()
+        for n in range(20): g.window.process_events(); _t.sleep(0.005)
+        self.assertEqual(len(done), 1)
+        self.assertTrue(g.button_acquire._widget.isEnabled())
+        g.settings['Acquire/Trigger'] = True
+        g.settings['Acquire/Trigger'] = False
+        self.assertEqual(calls, [1])
+        g.window.close()
+
     def test_instruments_adalm2000(self):        _m.instruments.adalm2000(block=True)
     def test_instruments_sillyscope(self):       _m.instruments.sillyscope(block=True)
     def test_instruments_keithley_dmm(self):     _m.instruments.keithley_dmm(block=True)